@@ -0,0 +1,140 @@
+# Admin API for the in-memory caches: what they hold, how well they hit,
+# and targeted invalidation, plus the password hashing pool's metrics and
+# the rate limit counters. The caches and the pool live in each worker
+# process, so the endpoints act on the worker that serves the request,
+# identified by "pid" in every response.
+#
+# Access needs the is_admin flag on the user's account. It can't be set
+# through the API, grant it from a shell on the server:
+#     python -m backend.admin grant <username>
+#     python -m backend.admin revoke <username>
+
+import os
+import sys
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from .auth import Principal, get_admin_user, get_password_hash_stats
+from .database import SessionLocal
+from .models import User
+from .rate_limiter import rate_limit_key_counters
+from .services import domain_checker, price_matrix
+from .services.domain_names import InvalidDomain
+
+router = APIRouter(prefix="/api/admin", tags=["admin"])
+
+
+@router.get("/caches")
+async def get_cache_stats(
+    top: int = Query(20, ge=0, le=500),
+    admin: Principal = Depends(get_admin_user),
+):
+    """
+    Entry counts, hit/miss/eviction counters, age histogram and most-hit
+    keys of the domain cache, plus the state of the TLD pricing caches and
+    the price matrix built from them.
+    """
+    return {
+        "pid": os.getpid(),
+        "domains": domain_checker.cache_stats(top=top),
+        "pricing": price_matrix.pricing_cache_stats(),
+    }
+
+
+@router.delete("/caches/domains")
+async def invalidate_domain_cache(
+    domain: Optional[str] = None,
+    tld: Optional[str] = None,
+    outcome: Optional[Literal["available", "taken"]] = None,
+    older_than: Optional[float] = Query(None, ge=0, description="Seconds"),
+    newer_than: Optional[float] = Query(None, ge=0, description="Seconds"),
+    all: bool = False,
+    admin: Principal = Depends(get_admin_user),
+):
+    """
+    Drop domain cache entries matching all given filters. Without filters
+    nothing is dropped unless all=true.
+    """
+    if all:
+        invalidated = len(domain_checker.DOMAIN_CACHE)
+        domain_checker.clear_cache()
+        return {"pid": os.getpid(), "invalidated": invalidated}
+
+    if domain is None and tld is None and outcome is None and older_than is None and newer_than is None:
+        raise HTTPException(status_code=400, detail="Give at least one filter, or all=true")
+    try:
+        invalidated = domain_checker.invalidate_cache(
+            domain=domain,
+            tld=tld,
+            outcome=outcome,
+            older_than=older_than,
+            newer_than=newer_than,
+        )
+    except InvalidDomain as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"pid": os.getpid(), "invalidated": invalidated}
+
+
+@router.delete("/caches/pricing")
+async def invalidate_pricing_cache(
+    provider: Optional[Literal["porkbun", "dynadot", "namesilo"]] = None,
+    tld: Optional[str] = None,
+    admin: Principal = Depends(get_admin_user),
+):
+    """
+    Drop cached TLD pricing, for one provider and/or TLD or all of it, and
+    rebuild the price matrix without it.
+    """
+    return {
+        "pid": os.getpid(),
+        "invalidated": price_matrix.invalidate_pricing(provider=provider, tld=tld),
+    }
+
+
+@router.get("/password-hashing")
+async def get_password_hashing_stats(admin: Principal = Depends(get_admin_user)):
+    """Queue depth, outcome counters and average wait of the password hashing pool."""
+    return {"pid": os.getpid(), **get_password_hash_stats()}
+
+
+@router.get("/rate-limits")
+def get_rate_limit_counters(
+    prefix: str = "",
+    limit: int = Query(100, ge=1, le=1000),
+    admin: Principal = Depends(get_admin_user),
+):
+    """
+    Allowed, denied and failed-open totals per rate limit key, most denied
+    first. The counters are shared by all workers; empty unless the limits
+    are kept in the SQLite store. A plain def, so the query runs off the
+    event loop.
+    """
+    return {"pid": os.getpid(), "keys": rate_limit_key_counters(prefix=prefix, limit=limit)}
+
+
+def set_admin(username: str, is_admin: bool) -> bool:
+    """
+    Set or clear a user's admin flag. Web processes pick the change up once
+    their cached principal expires, after PRINCIPAL_CACHE_TTL at most.
+
+    Returns:
+        False if there is no such user
+    """
+    with SessionLocal() as db:
+        user = db.query(User).filter(User.username == username).first()
+        if user is None:
+            return False
+        user.is_admin = is_admin
+        db.commit()
+        return True
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] not in ("grant", "revoke"):
+        print("Usage: python -m backend.admin grant|revoke <username>")
+        sys.exit(2)
+    action, username = sys.argv[1], sys.argv[2]
+    if not set_admin(username, action == "grant"):
+        print(f"No user named {username}")
+        sys.exit(1)
+    print(f"Admin access {'granted to' if action == 'grant' else 'revoked from'} {username}")
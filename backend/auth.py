@@ -1,10 +1,17 @@
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, Callable, Dict, Optional, Tuple
 from jose import JWTError, jwt
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from backend.database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.database import AsyncSessionLocal
 from backend.models import User
 import os
 from dotenv import load_dotenv
@@ -12,6 +19,8 @@ from passlib.context import CryptContext
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # JWT Configuration
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key")
 ALGORITHM = "HS256"
@@ -21,6 +30,79 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# bcrypt costs hundreds of milliseconds of CPU per call. Hashing and
+# verification run on their own small thread pool (bcrypt releases the GIL)
+# so a burst of logins queues up there instead of stalling the event loop.
+# Past PASSWORD_HASH_MAX_PENDING waiting calls, new ones are rejected.
+PASSWORD_HASH_CONCURRENCY = int(
+    os.getenv("PASSWORD_HASH_CONCURRENCY", str(min(4, os.cpu_count() or 1)))
+)
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+
+_password_executor = ThreadPoolExecutor(
+    max_workers=PASSWORD_HASH_CONCURRENCY, thread_name_prefix="password-hash"
+)
+_password_hash_stats = {
+    "pending": 0, "running": 0, "completed": 0, "failed": 0, "cancelled": 0, "rejected": 0, "wait_seconds": 0.0,
+}
+# Guards the fields the executor threads update
+_password_hash_stats_lock = threading.Lock()
+
+# Authenticated requests resolve the token subject through this cache instead
+# of loading the User row every time. The cache is per process, so a change
+# made through another worker shows up here after PRINCIPAL_CACHE_TTL at most.
+PRINCIPAL_CACHE_TTL = int(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
+PRINCIPAL_CACHE_MAX_SIZE = int(os.getenv("PRINCIPAL_CACHE_MAX_SIZE", "10000"))
+
+@dataclass(frozen=True)
+class Principal:
+    """The authenticated user as handlers see it, detached from any session."""
+
+    id: int
+    username: str
+    email: str
+    email_digest: bool = False
+    is_google_user: bool = False
+    is_admin: bool = False
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(
+            id=user.id,
+            username=user.username,
+            email=user.email,
+            email_digest=bool(user.email_digest),
+            is_google_user=bool(user.is_google_user),
+            is_admin=bool(user.is_admin),
+        )
+
+
+_PRINCIPAL_CACHE: Dict[str, Tuple[Principal, float]] = {}  # {username: (principal, ts)}
+
+
+def _get_cached_principal(username: str) -> Optional[Principal]:
+    cached = _PRINCIPAL_CACHE.get(username)
+    if cached is None:
+        return None
+    principal, cached_at = cached
+    if time.time() - cached_at > PRINCIPAL_CACHE_TTL:
+        _PRINCIPAL_CACHE.pop(username, None)
+        return None
+    return principal
+
+
+def _cache_principal(principal: Principal) -> None:
+    _PRINCIPAL_CACHE.pop(principal.username, None)
+    # Dicts keep insertion order, so the first key is the oldest entry
+    while len(_PRINCIPAL_CACHE) >= PRINCIPAL_CACHE_MAX_SIZE:
+        _PRINCIPAL_CACHE.pop(next(iter(_PRINCIPAL_CACHE)))
+    _PRINCIPAL_CACHE[principal.username] = (principal, time.time())
+
+
+def invalidate_principal(username: str) -> None:
+    """Drop a cached principal, call after changing any of its fields."""
+    _PRINCIPAL_CACHE.pop(username, None)
+
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
@@ -30,6 +112,79 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+async def _run_password_op(func: Callable, *args) -> Any:
+    """Run a password hashing call on the bounded executor."""
+    stats = _password_hash_stats
+    # Check and take the queue slot in one step, executor threads update
+    # the same counters
+    with _password_hash_stats_lock:
+        pending = stats["pending"]
+        full = pending >= PASSWORD_HASH_MAX_PENDING
+        if full:
+            stats["rejected"] += 1
+        else:
+            stats["pending"] += 1
+    if full:
+        logger.warning(f"Password hashing queue full ({pending} pending), rejecting request")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many sign-ins in progress, please retry shortly",
+            headers={"Retry-After": "1"},
+        )
+
+    queued_at = time.monotonic()
+
+    def run():
+        with _password_hash_stats_lock:
+            stats["running"] += 1
+            stats["wait_seconds"] += time.monotonic() - queued_at
+        outcome = "failed"
+        try:
+            result = func(*args)
+            outcome = "completed"
+            return result
+        finally:
+            # The call leaves the queue when the thread is done with it,
+            # even if the request awaiting it was cancelled meanwhile
+            with _password_hash_stats_lock:
+                stats["running"] -= 1
+                stats["pending"] -= 1
+                stats[outcome] += 1
+
+    def dropped(future):
+        # Cancelled while still queued, run() never starts
+        if future.cancelled():
+            with _password_hash_stats_lock:
+                stats["pending"] -= 1
+                stats["cancelled"] += 1
+
+    future = _password_executor.submit(run)
+    future.add_done_callback(dropped)
+    return await asyncio.wrap_future(future)
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await _run_password_op(get_password_hash, password)
+
+
+def get_password_hash_stats() -> Dict[str, Any]:
+    """
+    Password executor metrics for monitoring.
+
+    Returns:
+        Dict with pending (queued or running), running, completed, failed,
+        cancelled (before they started) and rejected call counts, and the
+        average queue wait in seconds
+    """
+    with _password_hash_stats_lock:
+        stats = dict(_password_hash_stats)
+    wait_seconds = stats.pop("wait_seconds")
+    started = stats["running"] + stats["completed"] + stats["failed"]
+    stats["average_wait_seconds"] = round(wait_seconds / started, 4) if started else 0.0
+    stats["concurrency"] = PASSWORD_HASH_CONCURRENCY
+    return stats
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -41,30 +196,57 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
-):
+def get_token_subject(token: Optional[str]) -> Optional[str]:
+    """Username in a valid, unexpired token, or None."""
+    if not token:
+        return None
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+    except JWTError:
+        return None
+
+
+async def get_current_user(request: Request, token: str = Depends(oauth2_scheme)) -> Principal:
+    """
+    Resolve the bearer token to a Principal. Cached principals cost no
+    database round trip, and the result is kept on request.state so other
+    lookups within the same request reuse it.
+    """
+    principal = getattr(request.state, "principal", None)
+    if principal is not None:
+        return principal
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-    except JWTError:
+    username = get_token_subject(token)
+    if username is None:
         raise credentials_exception
 
-    user = db.query(User).filter(User.username == username).first()
-    if user is None:
-        raise credentials_exception
-    return user
+    principal = _get_cached_principal(username)
+    if principal is None:
+        async with AsyncSessionLocal() as db:
+            user = await db.scalar(select(User).where(User.username == username))
+        if user is None:
+            raise credentials_exception
+        principal = Principal.from_user(user)
+        _cache_principal(principal)
+
+    request.state.principal = principal
+    return principal
+
+
+async def get_admin_user(current_user: Principal = Depends(get_current_user)) -> Principal:
+    """The current user, if their account has the admin flag set."""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return current_user
 
 
-def authenticate_user(db: Session, username: str, password: str):
-    user = db.query(User).filter(User.username == username).first()
-    if not user or not user.verify_password(password):
+async def authenticate_user(db: AsyncSession, username: str, password: str):
+    user = await db.scalar(select(User).where(User.username == username))
+    if not user or not await _run_password_op(user.verify_password, password):
         return None
     return user
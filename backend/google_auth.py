@@ -4,7 +4,8 @@ from fastapi.templating import Jinja2Templates
 from google.oauth2 import id_token
 from google.auth.transport import requests
 from google_auth_oauthlib.flow import Flow
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 import json
 import os
 from pathlib import Path
@@ -15,7 +16,7 @@ os.environ["OAUTHLIB_INSECURE_TRANSPORT"] = "1"
 
 from .database import get_db
 from .models import User
-from .auth import create_access_token, get_password_hash
+from .auth import create_access_token, get_password_hash_async
 
 router = APIRouter()
 templates = Jinja2Templates(directory="backend/templates")
@@ -79,7 +80,7 @@ async def google_login(request: Request):
 
 
 @router.get("/auth/google/callback")
-async def google_callback(request: Request, db: Session = Depends(get_db)):
+async def google_callback(request: Request, db: AsyncSession = Depends(get_db)):
     """Handles the Google OAuth2 callback"""
     flow = create_flow()
     try:
@@ -122,7 +123,7 @@ async def google_callback(request: Request, db: Session = Depends(get_db)):
             raise ValueError("Could not get email from Google")
 
         # Check if user exists
-        user = db.query(User).filter(User.email == email).first()
+        user = await db.scalar(select(User).where(User.email == email))
 
         if not user:
             print(f"Creating new user for email: {email}")
@@ -131,20 +132,20 @@ async def google_callback(request: Request, db: Session = Depends(get_db)):
             # Make sure username is unique
             base_username = username
             counter = 1
-            while db.query(User).filter(User.username == username).first():
+            while await db.scalar(select(User).where(User.username == username)):
                 username = f"{base_username}{counter}"
                 counter += 1
 
             user = User(
                 email=email,
                 username=username,
-                hashed_password=get_password_hash("GOOGLE_OAUTH_USER"),
+                hashed_password=await get_password_hash_async("GOOGLE_OAUTH_USER"),
                 is_google_user=True,
                 google_user_id=google_id,
             )
             db.add(user)
-            db.commit()
-            db.refresh(user)
+            await db.commit()
+            await db.refresh(user)
         else:
             print(f"Found existing user: {user.username}")
 
@@ -0,0 +1,294 @@
+# Durable job queue stored in the jobs table. Web workers only enqueue;
+# "python -m backend.worker" claims and runs the jobs. A claimed job is
+# invisible to other workers until its visibility timeout passes, so a job
+# whose worker died is picked up again.
+
+import json
+import random
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Union
+from sqlalchemy import or_, and_, func
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from .database import SessionLocal
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# Priorities, lower runs first
+PRIORITY_HIGH = 1
+PRIORITY_NORMAL = 5
+PRIORITY_LOW = 9
+
+DEFAULT_MAX_ATTEMPTS = 5
+
+# Retry backoff: RETRY_BASE_SECONDS * 2^(attempt-1), capped, with jitter
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 3600
+
+# Finished jobs are kept this long for inspection
+FINISHED_JOB_RETENTION = timedelta(days=7)
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class JobType:
+    """Handler and execution limits for one kind of job."""
+
+    def __init__(
+        self,
+        name: str,
+        handler: JobHandler,
+        concurrency: int = 1,
+        visibility_timeout: float = 300,
+    ):
+        self.name = name
+        self.handler = handler
+        self.concurrency = concurrency
+        self.visibility_timeout = visibility_timeout
+
+
+# Registered job types: {job_type: JobType}
+JOB_TYPES: Dict[str, JobType] = {}
+
+
+def job_handler(name: str, concurrency: int = 1, visibility_timeout: float = 300):
+    """
+    Register an async function as the handler for a job type.
+
+    Args:
+        name: Job type name used when enqueuing
+        concurrency: Maximum jobs of this type running at once in a worker
+        visibility_timeout: Seconds a claimed job stays hidden from other
+            workers before it is considered abandoned and retried
+    """
+
+    def decorator(func: JobHandler) -> JobHandler:
+        JOB_TYPES[name] = JobType(name, func, concurrency, visibility_timeout)
+        return func
+
+    return decorator
+
+
+def enqueue(
+    job_type: str,
+    payload: Optional[Dict[str, Any]] = None,
+    priority: int = PRIORITY_NORMAL,
+    delay: float = 0,
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    db: Optional[Union[Session, AsyncSession]] = None,
+) -> Optional[int]:
+    """
+    Add a job to the queue.
+
+    When a session (sync or async) is passed the job is only added to it, so
+    it is committed atomically with the caller's other changes and its id is
+    None until flush.
+    Otherwise the job is committed right away and its id returned.
+    """
+    job = Job(
+        job_type=job_type,
+        payload=json.dumps(payload or {}),
+        priority=priority,
+        status="queued",
+        attempts=0,
+        max_attempts=max_attempts,
+        run_at=datetime.utcnow() + timedelta(seconds=delay),
+    )
+    if db is not None:
+        db.add(job)
+        return job.id
+
+    db = SessionLocal()
+    try:
+        db.add(job)
+        db.commit()
+        return job.id
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def claim_job(job_types: Iterable[str], owner: str) -> Optional[Job]:
+    """
+    Claim the highest-priority runnable job among the given types.
+
+    A job is runnable when it is queued and due, or running with an expired
+    visibility timeout. The claim is a conditional update, so two workers
+    racing for the same job cannot both win it.
+    """
+    job_types = [name for name in job_types if name in JOB_TYPES]
+    if not job_types:
+        return None
+
+    now = datetime.utcnow()
+    runnable = or_(
+        and_(Job.status == "queued", Job.run_at <= now),
+        and_(
+            Job.status == "running",
+            Job.locked_until < now,
+            Job.attempts < Job.max_attempts,
+        ),
+    )
+
+    db = SessionLocal()
+    try:
+        candidates = (
+            db.query(Job.id, Job.job_type)
+            .filter(Job.job_type.in_(job_types), runnable)
+            .order_by(Job.priority, Job.run_at)
+            .limit(5)
+            .all()
+        )
+        for job_id, job_type in candidates:
+            locked_until = now + timedelta(seconds=JOB_TYPES[job_type].visibility_timeout)
+            claimed = (
+                db.query(Job)
+                .filter(Job.id == job_id, runnable)
+                .update(
+                    {
+                        Job.status: "running",
+                        Job.locked_by: owner,
+                        Job.locked_until: locked_until,
+                        Job.attempts: Job.attempts + 1,
+                    },
+                    synchronize_session=False,
+                )
+            )
+            db.commit()
+            if claimed:
+                job = db.get(Job, job_id)
+                db.expunge(job)
+                return job
+        return None
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def complete_job(job_id: int, owner: str) -> None:
+    """Mark a claimed job as done."""
+    db = SessionLocal()
+    try:
+        db.query(Job).filter(Job.id == job_id, Job.locked_by == owner).update(
+            {
+                Job.status: "done",
+                Job.locked_until: None,
+                Job.finished_at: datetime.utcnow(),
+            },
+            synchronize_session=False,
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def retry_delay(attempts: int) -> float:
+    """Backoff in seconds before the next attempt of a job that failed attempts times."""
+    delay = min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def fail_job(job: Job, owner: str, error: str) -> None:
+    """
+    Record a failed attempt. The job is rescheduled with backoff, or marked
+    failed once it has used all of its attempts.
+    """
+    now = datetime.utcnow()
+    if job.attempts >= job.max_attempts:
+        values = {Job.status: "failed", Job.finished_at: now}
+        logger.error(f"Job {job.id} ({job.job_type}) failed permanently: {error}")
+    else:
+        values = {
+            Job.status: "queued",
+            Job.run_at: now + timedelta(seconds=retry_delay(job.attempts)),
+        }
+        logger.warning(
+            f"Job {job.id} ({job.job_type}) failed attempt {job.attempts}, retrying: {error}"
+        )
+    values.update({Job.locked_by: None, Job.locked_until: None, Job.last_error: error})
+
+    db = SessionLocal()
+    try:
+        db.query(Job).filter(Job.id == job.id, Job.locked_by == owner).update(
+            values, synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def release_job(job_id: int, owner: str) -> None:
+    """Put an interrupted job back in the queue without counting the attempt."""
+    db = SessionLocal()
+    try:
+        db.query(Job).filter(Job.id == job_id, Job.locked_by == owner).update(
+            {
+                Job.status: "queued",
+                Job.run_at: datetime.utcnow(),
+                Job.locked_by: None,
+                Job.locked_until: None,
+                Job.attempts: Job.attempts - 1,
+            },
+            synchronize_session=False,
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def purge_finished_jobs(older_than: timedelta = FINISHED_JOB_RETENTION) -> int:
+    """
+    Delete done and failed jobs that finished before the retention window.
+    Abandoned jobs that already used all their attempts are marked failed first.
+    """
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        db.query(Job).filter(
+            Job.status == "running",
+            Job.locked_until < now,
+            Job.attempts >= Job.max_attempts,
+        ).update(
+            {
+                Job.status: "failed",
+                Job.finished_at: now,
+                Job.last_error: "Visibility timeout expired on final attempt",
+            },
+            synchronize_session=False,
+        )
+        deleted = (
+            db.query(Job)
+            .filter(
+                Job.status.in_(["done", "failed"]),
+                Job.finished_at < now - older_than,
+            )
+            .delete(synchronize_session=False)
+        )
+        db.commit()
+        return deleted
+    finally:
+        db.close()
+
+
+def load_payload(job: Job) -> Dict[str, Any]:
+    return json.loads(job.payload or "{}")
+
+
+def queue_depths() -> List:
+    """Count of queued and running jobs per type, for monitoring."""
+    db = SessionLocal()
+    try:
+        return (
+            db.query(Job.job_type, Job.status, func.count(Job.id))
+            .filter(Job.status.in_(["queued", "running"]))
+            .group_by(Job.job_type, Job.status)
+            .all()
+        )
+    finally:
+        db.close()
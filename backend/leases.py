@@ -0,0 +1,153 @@
+# Database leases that let exactly one worker process own each background job.
+# A worker holds a lease while its job_leases row names it as owner and
+# expires_at is in the future, and keeps it by heartbeating. If the owner
+# dies, the lease expires and another worker takes the job over.
+
+import os
+import uuid
+import time
+import socket
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Optional
+from sqlalchemy.exc import IntegrityError
+from .database import SessionLocal
+from .models import JobLease
+
+logger = logging.getLogger(__name__)
+
+# Identifies this process as a lease owner
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+# Default lease timing, a dead leader is replaced after at most LEASE_TTL_SECONDS
+LEASE_TTL_SECONDS = 30
+LEASE_HEARTBEAT_SECONDS = 10
+
+# Names of the periodic leases this process currently holds
+_HELD_LEASES = set()
+
+
+def try_acquire_lease(name: str, ttl_seconds: float, owner: str = WORKER_ID) -> Optional[bool]:
+    """
+    Acquire or renew a lease. Succeeds if the lease is free, expired,
+    or already held by this owner.
+
+    Returns:
+        True if the lease is ours, False if another worker holds it, None if
+        the database couldn't be asked (e.g. "database is locked"), in which
+        case a lease we held stays ours until its expiry
+    """
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=ttl_seconds)
+    db = SessionLocal()
+    try:
+        # Conditional update is atomic, only one worker can win an expired lease
+        updated = (
+            db.query(JobLease)
+            .filter(
+                JobLease.name == name,
+                (JobLease.owner == owner) | (JobLease.expires_at < now),
+            )
+            .update(
+                {
+                    JobLease.owner: owner,
+                    JobLease.expires_at: expires_at,
+                    JobLease.heartbeat_at: now,
+                },
+                synchronize_session=False,
+            )
+        )
+        db.commit()
+        if updated:
+            return True
+
+        # No row updated, either someone else holds it or it doesn't exist yet
+        db.add(JobLease(name=name, owner=owner, expires_at=expires_at, heartbeat_at=now))
+        try:
+            db.commit()
+            return True
+        except IntegrityError:
+            db.rollback()
+            return False
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error acquiring lease {name}: {str(e)}")
+        return None
+    finally:
+        db.close()
+
+
+def release_lease(name: str, owner: str = WORKER_ID) -> None:
+    """Give up a lease so another worker can take it immediately."""
+    db = SessionLocal()
+    try:
+        db.query(JobLease).filter(
+            JobLease.name == name, JobLease.owner == owner
+        ).update({JobLease.expires_at: datetime.utcnow()}, synchronize_session=False)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error releasing lease {name}: {str(e)}")
+    finally:
+        db.close()
+
+
+def release_all_leases() -> None:
+    """Release every periodic lease held by this process, used on shutdown."""
+    for name in list(_HELD_LEASES):
+        release_lease(name)
+        _HELD_LEASES.discard(name)
+
+
+async def run_as_leader(
+    name: str,
+    job: Callable[[], Awaitable[None]],
+    ttl_seconds: float = LEASE_TTL_SECONDS,
+    heartbeat_seconds: float = LEASE_HEARTBEAT_SECONDS,
+) -> None:
+    """
+    Run a long-lived job only while this process holds its lease.
+
+    Every worker calls this; the one that acquires the lease starts the job
+    and heartbeats, the others keep trying and take over if the lease expires.
+    The job is cancelled if this process loses the lease. A renewal that
+    fails with a database error doesn't lose it: the job keeps running until
+    ttl_seconds have passed since the last successful renewal.
+    """
+    task = None
+    held_until = 0.0
+    try:
+        while True:
+            attempted_at = time.monotonic()
+            held = await asyncio.to_thread(try_acquire_lease, name, ttl_seconds)
+            if held:
+                held_until = attempted_at + ttl_seconds
+            elif held is None and task is not None and not task.done():
+                if attempted_at < held_until:
+                    logger.warning(
+                        f"Could not renew lease for {name}, still ours for "
+                        f"{held_until - attempted_at:.0f}s"
+                    )
+                    # Stop the job at the latest when the lease would expire
+                    await asyncio.sleep(min(heartbeat_seconds, held_until - attempted_at))
+                    continue
+                logger.warning(f"Lease for {name} expired without a successful renewal")
+
+            if held:
+                _HELD_LEASES.add(name)
+                if task is None or task.done():
+                    logger.info(f"Worker {WORKER_ID} is now leader for {name}")
+                    task = asyncio.create_task(job())
+            else:
+                _HELD_LEASES.discard(name)
+                if task is not None and not task.done():
+                    logger.warning(f"Worker {WORKER_ID} lost lease for {name}, stopping job")
+                    task.cancel()
+                task = None
+
+            await asyncio.sleep(heartbeat_seconds)
+    finally:
+        if task is not None and not task.done():
+            task.cancel()
+
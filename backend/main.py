@@ -1,5 +1,11 @@
-from fastapi import FastAPI, Request, HTTPException, Depends, status, BackgroundTasks
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi import FastAPI, Request, HTTPException, Depends, Query, status, BackgroundTasks
+from fastapi.responses import (
+    HTMLResponse,
+    RedirectResponse,
+    StreamingResponse,
+    JSONResponse,
+    Response,
+)
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.security import OAuth2PasswordRequestForm
@@ -7,14 +13,16 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.httpsredirect import HTTPSRedirectMiddleware
 
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Literal, Optional, Dict, Any
 from datetime import timedelta
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 import os
 import logging
 import asyncio
+import json
 import time
-from .services.stats_service import StatsService
+from .services.stats_service import StatsService, STATS_CACHE_TTL, flush_counters
 
 
 
@@ -43,6 +51,7 @@ if IS_PRODUCTION:
     RATE_LIMIT_API = {"calls": 40, "period": 60}     # 40 requests per minute
     RATE_LIMIT_DOMAIN = {"calls": 200, "period": 3600}  # 200 requests per hour 
     RATE_LIMIT_SOCIAL = {"calls": 40, "period": 3600}   # 40 requests per hour
+    RATE_LIMIT_SOCIAL_BATCH = {"calls": 20, "period": 3600}  # 20 batches per hour
     RATE_LIMIT_USER = {"calls": 2000, "period": 3600}   # 2000 requests per hour, per user
     RATE_LIMIT_EXTENSIONS = {"calls": 60, "period": 3600}  # 60 requests per hour
 else:
@@ -51,6 +60,7 @@ else:
     RATE_LIMIT_API = {"calls": 20, "period": 60}         # 20 requests per minute
     RATE_LIMIT_DOMAIN = {"calls": 100, "period": 3600}   # 100 requests per hour
     RATE_LIMIT_SOCIAL = {"calls": 20, "period": 3600}    # 20 requests per hour
+    RATE_LIMIT_SOCIAL_BATCH = {"calls": 10, "period": 3600}  # 10 batches per hour
     RATE_LIMIT_USER = {"calls": 1000, "period": 3600}    # 1000 requests per hour, per user
     RATE_LIMIT_EXTENSIONS = {"calls": 30, "period": 3600}  # 30 requests per hour
 
@@ -61,9 +71,8 @@ if not IS_PRODUCTION:
 else:
     logging.info("Running in production mode")
 
-from .database import engine, get_db
+from .database import engine, get_db, AsyncSessionLocal
 from .models import (
-    Base,
     User,
     Favorite,
     WatchlistItem as WatchlistItemModel,
@@ -73,14 +82,29 @@ from .auth import (
     authenticate_user,
     create_access_token,
     get_current_user,
+    invalidate_principal,
+    Principal,
     ACCESS_TOKEN_EXPIRE_MINUTES,
-    get_password_hash,
+    get_password_hash_async,
 )
 from .google_auth import router as google_auth_router
+from .admin import router as admin_router
 from backend.services.domain_generator import DomainGenerator
-from backend.services.social_media_checker import check_social_media
-from backend.schemas import WatchlistItemCreate, WatchlistItem
-from .tasks import check_watchlist_domains
+from backend.services.social_media_checker import (
+    check_social_media,
+    check_social_media_batch,
+    MAX_BATCH_USERNAMES,
+)
+from backend.schemas import (
+    WatchlistItemCreate,
+    WatchlistItem,
+    FavoritePage,
+    WatchlistPage,
+)
+from .pagination import keyset_page, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from .leases import release_all_leases
+from .migrations import require_current_schema
+from .write_behind import writer
 from .rate_limiter import (
     limiter,
     _rate_limit_exceeded_handler,
@@ -88,9 +112,9 @@ from .rate_limiter import (
     RateLimitExceeded,
 )
 from backend.services.check_more_extension import check_more_extensions
-
-# Create database tables
-Base.metadata.create_all(bind=engine)
+from backend.services.registrar_scheduler import Lane, registrar_priority
+from backend.services.domain_names import InvalidDomain, join_domain, split_domain
+from slowapi.util import get_remote_address
 
 app = FastAPI(title="Brand Name Generator", version="1.0.0")
 
@@ -161,6 +185,7 @@ else:
 
 # Include Google OAuth routes at the root level
 app.include_router(google_auth_router)
+app.include_router(admin_router)
 
 
 # Error handler for 404 Not Found
@@ -172,8 +197,8 @@ async def not_found_exception_handler(request: Request, exc: HTTPException):
         if request.url.path == "/auth/google/login":
             return await google_auth_router.google_login(request)
         elif request.url.path == "/auth/google/callback":
-            db = next(get_db())
-            return await google_auth_router.google_callback(request, db)
+            async with AsyncSessionLocal() as db:
+                return await google_auth_router.google_callback(request, db)
     return templates.TemplateResponse(
         "index.html",
         {
@@ -244,15 +269,21 @@ class BrandResponse(BaseModel):
     domains: Dict[str, DomainInfo]
 
 
+class SocialMediaBatchRequest(BaseModel):
+    names: List[str] = Field(
+        ..., min_length=1, max_length=MAX_BATCH_USERNAMES
+    )  # Names from one /api/generate response
+
+
 # Authentication endpoints
 @app.post("/token", response_model=Token)
 @rate_limit(calls=RATE_LIMIT_TOKEN["calls"], period=RATE_LIMIT_TOKEN["period"])
 async def login(
     request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -267,22 +298,21 @@ async def login(
 
 
 @app.post("/register")
-async def register(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.username == user.username).first()
+async def register(user: UserCreate, db: AsyncSession = Depends(get_db)):
+    db_user = await db.scalar(select(User).where(User.username == user.username))
     if db_user:
         raise HTTPException(status_code=400, detail="Username already registered")
 
-    db_user = db.query(User).filter(User.email == user.email).first()
+    db_user = await db.scalar(select(User).where(User.email == user.email))
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash_async(user.password)
     db_user = User(
         username=user.username, email=user.email, hashed_password=hashed_password
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
     return {"message": "User created successfully"}
 
 
@@ -290,117 +320,181 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
 @app.post("/favorites")
 async def add_favorite(
     favorite: FavoriteCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
 ):
-    db_favorite = Favorite(
-        user_id=current_user.id,
-        brand_name=favorite.brand_name,
-        domain_name=favorite.domain_name,
-        domain_extension=favorite.domain_extension,
-        price=favorite.price,
-        total_score=favorite.total_score,
-        length_score=favorite.length_score,
-        dictionary_score=favorite.dictionary_score,
-        pronounceability_score=favorite.pronounceability_score,
-        repetition_score=favorite.repetition_score,
-        tld_score=favorite.tld_score,
+    # Committed before answering, the page reloads the list right after
+    db.add(
+        Favorite(
+            user_id=current_user.id,
+            brand_name=favorite.brand_name,
+            domain_name=favorite.domain_name,
+            domain_extension=favorite.domain_extension,
+            price=favorite.price,
+            total_score=favorite.total_score,
+            length_score=favorite.length_score,
+            dictionary_score=favorite.dictionary_score,
+            pronounceability_score=favorite.pronounceability_score,
+            repetition_score=favorite.repetition_score,
+            tld_score=favorite.tld_score,
+        )
     )
-    db.add(db_favorite)
-    db.commit()
-    db.refresh(db_favorite)
+    await db.commit()
     return {"message": "Favorite added successfully"}
 
 
 @app.get("/favorites", response_class=HTMLResponse)
 async def get_favorites(
     request: Request,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
 ):
+    # Only the page shell and counts, the lists are fetched page by page
+    # from /api/favorites and /api/watchlist
     try:
-        print(f"Processing favorites request for user: {current_user.username}")
-
-        # Get user's favorites
-        favorites = db.query(Favorite).filter(Favorite.user_id == current_user.id).all()
-        print(f"Found {len(favorites)} favorites")
-
-        # Get user's watchlist
-        watchlist = (
-            db.query(WatchlistItemModel)
-            .filter(WatchlistItemModel.user_id == current_user.id)
-            .all()
+        favorites_count = await db.scalar(
+            select(func.count()).select_from(Favorite).where(Favorite.user_id == current_user.id)
         )
-        print(f"Found {len(watchlist)} watchlist items")
+        watchlist_count = await db.scalar(
+            select(func.count())
+            .select_from(WatchlistItemModel)
+            .where(WatchlistItemModel.user_id == current_user.id)
+        )
+        return templates.TemplateResponse(
+            "favorites.html",
+            {
+                "request": request,
+                "current_user": current_user,
+                "favorites_count": favorites_count,
+                "watchlist_count": watchlist_count,
+            },
+        )
+    except Exception as e:
+        logging.getLogger(__name__).error(f"Error in get_favorites: {str(e)}")
+        if request.headers.get("X-Requested-With") == "XMLHttpRequest":
+            raise HTTPException(status_code=500, detail=str(e))
+        return RedirectResponse(url="/")
 
-        # Debug print each watchlist item
-        for item in watchlist:
-            print(
-                f"Watchlist item: {item.domain_name}.{item.domain_extension} (ID: {item.id}, Status: {item.status})"
-            )
 
-        # Format dates for both favorites and watchlist
-        for favorite in favorites:
-            favorite.formatted_date = favorite.created_at.strftime("%Y-%m-%d %H:%M")
+# Sort orders for the paginated listings, each backed by an index that
+# starts with user_id. Date order uses the id, which grows with created_at.
+FAVORITE_SORTS = {
+    "date": ((Favorite.id,), True),
+    "score": ((Favorite.total_score, Favorite.id), True),
+    "name": ((Favorite.domain_name, Favorite.id), False),
+}
+WATCHLIST_SORTS = {
+    "date": ((WatchlistItemModel.id,), True),
+    "name": ((WatchlistItemModel.domain_name, WatchlistItemModel.domain_extension), False),
+    "status": ((WatchlistItemModel.status, WatchlistItemModel.id), False),
+}
+
+
+@app.get("/api/favorites", response_model=FavoritePage)
+async def list_favorites(
+    sort: Literal["date", "score", "name"] = "date",
+    tld: Optional[str] = None,
+    min_score: Optional[int] = Query(default=None, ge=0, le=100),
+    cursor: Optional[str] = None,
+    limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    One page of the user's favorites.
 
-        for item in watchlist:
-            item.formatted_date = item.created_at.strftime("%Y-%m-%d %H:%M")
-            item.last_checked_date = item.last_checked.strftime("%Y-%m-%d %H:%M")
-            print(
-                f"Formatted dates for {item.domain_name}: Created: {item.formatted_date}, Last checked: {item.last_checked_date}"
-            )
+    Args:
+        sort: date (newest first), score (highest first) or name
+        tld: Only favorites with this extension, without the dot
+        min_score: Only favorites with at least this total score
+        cursor: next_cursor of the previous page
+        limit: Page size
 
-        # Debug print template context
-        template_context = {
-            "request": request,
-            "current_user": current_user,
-            "favorites": favorites,
-            "watchlist": watchlist,
-        }
-        print(f"Template context - watchlist length: {len(watchlist)}")
+    Returns:
+        Page with items and next_cursor, which is null on the last page
+    """
+    statement = select(
+        Favorite.id,
+        Favorite.domain_name,
+        Favorite.domain_extension,
+        Favorite.price,
+        Favorite.total_score,
+        Favorite.length_score,
+        Favorite.dictionary_score,
+        Favorite.pronounceability_score,
+        Favorite.repetition_score,
+        Favorite.tld_score,
+        Favorite.created_at,
+    ).where(Favorite.user_id == current_user.id)
+    if tld:
+        statement = statement.where(Favorite.domain_extension == tld.lstrip(".").lower())
+    if min_score is not None:
+        statement = statement.where(Favorite.total_score >= min_score)
+
+    sort_columns, descending = FAVORITE_SORTS[sort]
+    return await keyset_page(db, statement, sort_columns, descending, cursor, limit)
+
+
+@app.get("/api/watchlist", response_model=WatchlistPage)
+async def list_watchlist(
+    sort: Literal["date", "name", "status"] = "date",
+    tld: Optional[str] = None,
+    status: Optional[Literal["taken", "available"]] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    One page of the user's watchlist.
 
-        # Check if it's an AJAX request
-        if request.headers.get("X-Requested-With") == "XMLHttpRequest":
-            response = templates.TemplateResponse(
-                "favorites.html",
-                template_context,
-            )
-            print("Rendered AJAX response")
-            return response
-        else:
-            response = templates.TemplateResponse(
-                "favorites.html",
-                template_context,
-            )
-            print("Rendered full page response")
-            return response
-    except Exception as e:
-        print(f"Error in get_favorites: {str(e)}")
-        print(f"Error type: {type(e)}")
-        import traceback
+    Args:
+        sort: date (newest first), name or status
+        tld: Only domains with this extension, without the dot
+        status: Only domains with this status, taken or available
+        cursor: next_cursor of the previous page
+        limit: Page size
 
-        print(f"Traceback: {traceback.format_exc()}")
-        if request.headers.get("X-Requested-With") == "XMLHttpRequest":
-            raise HTTPException(status_code=500, detail=str(e))
-        return RedirectResponse(url="/")
+    Returns:
+        Page with items and next_cursor, which is null on the last page
+    """
+    statement = select(
+        WatchlistItemModel.id,
+        WatchlistItemModel.domain_name,
+        WatchlistItemModel.domain_extension,
+        WatchlistItemModel.status,
+        WatchlistItemModel.notify_when_available,
+        WatchlistItemModel.drop_watch,
+        WatchlistItemModel.created_at,
+        WatchlistItemModel.last_checked,
+    ).where(WatchlistItemModel.user_id == current_user.id)
+    if tld:
+        statement = statement.where(
+            WatchlistItemModel.domain_extension == tld.lstrip(".").lower()
+        )
+    if status:
+        statement = statement.where(WatchlistItemModel.status == status)
+
+    sort_columns, descending = WATCHLIST_SORTS[sort]
+    return await keyset_page(db, statement, sort_columns, descending, cursor, limit)
 
 
 @app.delete("/favorites/{favorite_id}")
 async def delete_favorite(
     favorite_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
 ):
-    favorite = (
-        db.query(Favorite)
-        .filter(Favorite.id == favorite_id, Favorite.user_id == current_user.id)
-        .first()
+    favorite = await db.scalar(
+        select(Favorite).where(
+            Favorite.id == favorite_id, Favorite.user_id == current_user.id
+        )
     )
     if not favorite:
         raise HTTPException(status_code=404, detail="Favorite not found")
 
-    db.delete(favorite)
-    db.commit()
+    await db.delete(favorite)
+    await db.commit()
     return {"message": "Favorite deleted successfully"}
 
 
@@ -412,14 +506,22 @@ async def home(request: Request):
 
 
 @app.get("/api/stats/domains-generated")
-async def get_domains_generated(db: Session = Depends(get_db)):
+async def get_domains_generated(request: Request, db: AsyncSession = Depends(get_db)):
     stats_service = StatsService(db)
     total_count = await stats_service.get_counter_value("domains_generated")
-    return {"total_domains_generated": total_count}
+
+    # Let browsers revalidate cheaply, the count only changes every few seconds
+    etag = f'W/"{total_count}"'
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={STATS_CACHE_TTL}"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse({"total_domains_generated": total_count}, headers=headers)
 
 
 @app.post("/api/generate", response_model=List[BrandResponse])
-async def generate_names(request: BrandRequest, db: Session = Depends(get_db)):
+async def generate_names(
+    request: BrandRequest, http_request: Request, db: AsyncSession = Depends(get_db)
+):
     logger = logging.getLogger(__name__)
     logger.debug(f"Received generate request with keywords: {request.keywords}")
 
@@ -450,16 +552,21 @@ async def generate_names(request: BrandRequest, db: Session = Depends(get_db)):
         total_suggestions = request.num_suggestions + extra_suggestions
 
         logger.debug(f"Generating {total_suggestions} names...")
-        results = await generator.generate_names(
-            request.keywords,
-            request.style,
-            total_suggestions,
-            min_length=request.min_length,
-            max_length=request.max_length,
-            include_word=request.include_word,
-            similar_to=request.similar_to,
-            extensions=request.extensions,
-        )
+        # A user is waiting on these availability checks, they get first
+        # pick of registrar capacity
+        with registrar_priority(
+            Lane.INTERACTIVE, owner=f"ip:{get_remote_address(http_request)}"
+        ):
+            results = await generator.generate_names(
+                request.keywords,
+                request.style,
+                total_suggestions,
+                min_length=request.min_length,
+                max_length=request.max_length,
+                include_word=request.include_word,
+                similar_to=request.similar_to,
+                extensions=request.extensions,
+            )
         logger.debug(f"Generated {len(results)} names")
 
         if not results:
@@ -506,25 +613,59 @@ async def generate_names(request: BrandRequest, db: Session = Depends(get_db)):
 
 
 @app.get("/user/profile")
-async def get_user_profile(current_user: User = Depends(get_current_user)):
-    return {"username": current_user.username, "email": current_user.email}
+async def get_user_profile(current_user: Principal = Depends(get_current_user)):
+    return {
+        "username": current_user.username,
+        "email": current_user.email,
+        "email_digest": bool(current_user.email_digest),
+    }
+
+
+class EmailPreferencesUpdate(BaseModel):
+    email_digest: bool
+
+
+@app.put("/user/email-preferences")
+async def update_email_preferences(
+    preferences: EmailPreferencesUpdate,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Choose between one email per available domain and a single digest per
+    check cycle listing every domain that became available.
+    """
+    await db.execute(
+        update(User)
+        .where(User.id == current_user.id)
+        .values(email_digest=preferences.email_digest)
+    )
+    await db.commit()
+    invalidate_principal(current_user.username)
+    return {"email_digest": preferences.email_digest}
 
 
 @app.post("/watchlist", response_model=WatchlistItem)
 async def add_to_watchlist(
     watchlist_item: WatchlistItemCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
 ):
+    # Stored in canonical form so spellings of one domain are one item
+    try:
+        domain_name, domain_extension = split_domain(
+            join_domain(watchlist_item.domain_name, watchlist_item.domain_extension)
+        )
+    except InvalidDomain as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     # Check if domain is already in user's watchlist
-    existing_item = (
-        db.query(WatchlistItemModel)
-        .filter(
+    existing_item = await db.scalar(
+        select(WatchlistItemModel).where(
             WatchlistItemModel.user_id == current_user.id,
-            WatchlistItemModel.domain_name == watchlist_item.domain_name,
-            WatchlistItemModel.domain_extension == watchlist_item.domain_extension,
+            WatchlistItemModel.domain_name == domain_name,
+            WatchlistItemModel.domain_extension == domain_extension,
         )
-        .first()
     )
 
     if existing_item:
@@ -535,15 +676,15 @@ async def add_to_watchlist(
     # Create new watchlist item with alerts disabled by default
     db_item = WatchlistItemModel(
         user_id=current_user.id,
-        domain_name=watchlist_item.domain_name,
-        domain_extension=watchlist_item.domain_extension,
+        domain_name=domain_name,
+        domain_extension=domain_extension,
         status="taken",
         notify_when_available=False,  # Explicitly set to False
     )
 
     db.add(db_item)
-    db.commit()
-    db.refresh(db_item)
+    await db.commit()
+    await db.refresh(db_item)
 
     # Log the creation of the watchlist item
     logger = logging.getLogger(__name__)
@@ -557,26 +698,46 @@ async def add_to_watchlist(
 @app.delete("/watchlist/{watchlist_id}")
 async def remove_from_watchlist(
     watchlist_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
 ):
-    watchlist_item = (
-        db.query(WatchlistItemModel)
-        .filter(
+    watchlist_item = await db.scalar(
+        select(WatchlistItemModel).where(
             WatchlistItemModel.id == watchlist_id,
             WatchlistItemModel.user_id == current_user.id,
         )
-        .first()
     )
 
     if not watchlist_item:
         raise HTTPException(status_code=404, detail="Watchlist item not found")
 
-    db.delete(watchlist_item)
-    db.commit()
+    await db.delete(watchlist_item)
+    await db.commit()
     return {"message": "Domain removed from watchlist"}
 
 
+async def _set_watchlist_flag(db: AsyncSession, watchlist_item, column: str, value: bool) -> bool:
+    """
+    Set a boolean watchlist column and commit it.
+
+    The update only matches while the column still holds another value, so
+    of two concurrent requests setting the same value only one reports a
+    change.
+
+    Returns:
+        True if this request changed the value
+    """
+    flag = getattr(WatchlistItemModel, column)
+    result = await db.execute(
+        update(WatchlistItemModel)
+        .where(WatchlistItemModel.id == watchlist_item.id, flag.is_not(value))
+        .values({column: value})
+    )
+    await db.commit()
+    await db.refresh(watchlist_item)
+    return result.rowcount == 1
+
+
 class NotifyUpdate(BaseModel):
     notify_when_available: bool
 
@@ -585,78 +746,144 @@ class NotifyUpdate(BaseModel):
 async def update_watchlist_notification(
     watchlist_id: int,
     notify_update: NotifyUpdate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
 ):
-    watchlist_item = (
-        db.query(WatchlistItemModel)
-        .filter(
+    watchlist_item = await db.scalar(
+        select(WatchlistItemModel).where(
             WatchlistItemModel.id == watchlist_id,
             WatchlistItemModel.user_id == current_user.id,
         )
-        .first()
     )
 
     if not watchlist_item:
         raise HTTPException(status_code=404, detail="Watchlist item not found")
 
-    # Track the change in alert settings
-    was_enabled = watchlist_item.notify_when_available
-    watchlist_item.notify_when_available = notify_update.notify_when_available
-
-    # Create an alert history entry when alerts are enabled
-    if not was_enabled and notify_update.notify_when_available:
-        alert = AlertHistory(
-            watchlist_item_id=watchlist_id,
-            alert_type="alerts_enabled",
-            message=f"Alerts enabled for domain {watchlist_item.domain_name}.{watchlist_item.domain_extension}",
-            delivered=True,
+    # Committed right away and only if the setting actually flips, so two
+    # quick toggles can't both record the same change
+    changed = await _set_watchlist_flag(
+        db, watchlist_item, "notify_when_available", notify_update.notify_when_available
+    )
+
+    # The history row is buffered, the write-behind writer commits it
+    if changed and notify_update.notify_when_available:
+        await writer.insert(
+            AlertHistory,
+            dict(
+                watchlist_item_id=watchlist_id,
+                alert_type="alerts_enabled",
+                message=f"Alerts enabled for domain {watchlist_item.domain_name}.{watchlist_item.domain_extension}",
+                delivered=True,
+            ),
         )
-        db.add(alert)
         logger = logging.getLogger(__name__)
         logger.info(
             f"Alerts enabled for domain {watchlist_item.domain_name}.{watchlist_item.domain_extension}"
         )
-    elif was_enabled and not notify_update.notify_when_available:
-        alert = AlertHistory(
-            watchlist_item_id=watchlist_id,
-            alert_type="alerts_disabled",
-            message=f"Alerts disabled for domain {watchlist_item.domain_name}.{watchlist_item.domain_extension}",
-            delivered=True,
+    elif changed:
+        await writer.insert(
+            AlertHistory,
+            dict(
+                watchlist_item_id=watchlist_id,
+                alert_type="alerts_disabled",
+                message=f"Alerts disabled for domain {watchlist_item.domain_name}.{watchlist_item.domain_extension}",
+                delivered=True,
+            ),
         )
-        db.add(alert)
         logger = logging.getLogger(__name__)
         logger.info(
             f"Alerts disabled for domain {watchlist_item.domain_name}.{watchlist_item.domain_extension}"
         )
 
-    db.commit()
-    db.refresh(watchlist_item)
+    return watchlist_item
+
+
+class DropWatchUpdate(BaseModel):
+    drop_watch: bool
+
+
+@app.put("/watchlist/{watchlist_id}/drop-watch")
+async def update_watchlist_drop_watch(
+    watchlist_id: int,
+    drop_watch_update: DropWatchUpdate,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Opt a watched domain in or out of drop-watch burst polling.
+    Drop-watch only runs while alerts are enabled for the item.
+    """
+    watchlist_item = await db.scalar(
+        select(WatchlistItemModel).where(
+            WatchlistItemModel.id == watchlist_id,
+            WatchlistItemModel.user_id == current_user.id,
+        )
+    )
+
+    if not watchlist_item:
+        raise HTTPException(status_code=404, detail="Watchlist item not found")
+
+    changed = await _set_watchlist_flag(db, watchlist_item, "drop_watch", drop_watch_update.drop_watch)
+
+    # The history row is buffered, the write-behind writer commits it
+    if changed:
+        action = "enabled" if drop_watch_update.drop_watch else "disabled"
+        await writer.insert(
+            AlertHistory,
+            dict(
+                watchlist_item_id=watchlist_id,
+                alert_type=f"drop_watch_{action}",
+                message=f"Drop-watch {action} for domain {watchlist_item.domain_name}.{watchlist_item.domain_extension}",
+                delivered=True,
+            ),
+        )
+        logger = logging.getLogger(__name__)
+        logger.info(
+            f"Drop-watch {action} for domain {watchlist_item.domain_name}.{watchlist_item.domain_extension}"
+        )
+
     return watchlist_item
 
 
 @app.on_event("startup")
 async def startup_event():
+    # Migrations are applied by run.py or python -m backend.migrations
+    require_current_schema(engine)
+
     # Set higher log level for domain checker to reduce verbosity
     logging.getLogger("backend.services.domain_checker").setLevel(logging.INFO)
 
-    # Start the background task
-    asyncio.create_task(check_watchlist_domains())
-    logging.info("Started watchlist domain checking background task")
+    # Watchlist checks, drop-watch and email sending run in the separate
+    # worker process: python -m backend.worker
 
-    # Preload common domains into cache
+    # Preload common domains into this process's cache. The cache is per
+    # process, so every web worker warms its own, a handful of calls each.
     from backend.services.domain_checker import preload_common_domains
 
     asyncio.create_task(preload_common_domains())
     logging.info("Started preloading common domains")
 
+    # Provider prices per TLD. The provider pricing caches are in memory,
+    # so each web process refreshes its own, once per cache TTL
+    from backend.services.price_matrix import start_price_matrix_refresher
+
+    start_price_matrix_refresher()
+
 
 @app.on_event("shutdown")
 async def shutdown_event():
     # Clean up resources
     from backend.services.domain_checker import cleanup_resources
+    from backend.services.price_matrix import stop_price_matrix_refresher
+    from backend.services.registration_data_service import close_session
 
+    # Stopped first, it fetches through the sessions closed below
+    await stop_price_matrix_refresher()
     await cleanup_resources()
+    await close_session()
+    await flush_counters()
+    await writer.close()
+    release_all_leases()
     logging.info("Cleaned up resources on shutdown")
 
 
@@ -705,7 +932,7 @@ async def check_availability(request: Request, domain: str):
     user_specific=True
 )  # User-specific rate limit
 async def get_watchlist(
-    request: Request, current_user: User = Depends(get_current_user)
+    request: Request, current_user: Principal = Depends(get_current_user)
 ):
     # Your existing code here
     pass
@@ -723,6 +950,28 @@ async def check_social_media_endpoint(request: Request, username: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/check-social-media/batch")
+@rate_limit(
+    calls=RATE_LIMIT_SOCIAL_BATCH["calls"],
+    period=RATE_LIMIT_SOCIAL_BATCH["period"],
+)  # One call covers a whole generated result set
+async def check_social_media_batch_endpoint(
+    request: Request, batch: SocialMediaBatchRequest
+):
+    """
+    Check social media availability for every name in a generated result set.
+
+    Results are streamed as newline-delimited JSON, one line per username,
+    in the order they finish.
+    """
+
+    async def stream_results():
+        async for result in check_social_media_batch(batch.names):
+            yield json.dumps(result) + "\n"
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+
 
 @app.get("/api/check-more-extensions/{domain_name}")
 @rate_limit(calls=RATE_LIMIT_EXTENSIONS["calls"], period=RATE_LIMIT_EXTENSIONS["period"])  # Extensions checking endpoint
@@ -756,7 +1005,10 @@ async def check_more_extensions_endpoint(
         logger.info(f"Checking more extensions for domain: {base_name}")
         logger.info(f"Already checked extensions: {already_checked}")
         
-        results = await check_more_extensions(base_name, already_checked)
+        with registrar_priority(
+            Lane.ON_DEMAND, owner=f"ip:{get_remote_address(request)}"
+        ):
+            results = await check_more_extensions(base_name, already_checked)
         return results
     except Exception as e:
         logger.error(f"Error checking more extensions for {domain_name}: {str(e)}")
@@ -1,63 +1,527 @@
-from sqlalchemy import create_engine, text
+import sys
+from datetime import datetime
+from typing import List, Tuple
+from sqlalchemy import (
+    Boolean,
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    Text,
+    create_engine,
+    inspect,
+    select,
+    text,
+)
+from sqlalchemy.schema import CreateIndex
+from sqlalchemy.sql import func
 from backend.database import SQLALCHEMY_DATABASE_URL
+from backend.models import WatchlistItem, Favorite, AlertHistory
+from backend.services.domain_names import InvalidDomain, join_domain, split_domain
+
+
+# Versioned migrations. Each one runs once, in order, inside its own
+# transaction, and is recorded in schema_migrations. Steps stay idempotent
+# so databases set up by the old ad-hoc script can adopt the runner.
+#
+# run.py applies them before it starts the web server and the worker, and
+# both refuse to start on a database that is behind. Run them by hand with
+# python -m backend.migrations when starting the processes another way.
+#
+# Tables are created from the frozen definitions below, never from the
+# current models, so a new database goes through the same steps as an old
+# one. Schema changes get a new migration.
+
+# The schema before versioned migrations
+_baseline = MetaData()
+
+Table(
+    "users",
+    _baseline,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("email", String, unique=True, index=True),
+    Column("username", String, unique=True, index=True),
+    Column("hashed_password", String),
+    Column("is_google_user", Boolean, default=False),
+    Column("google_user_id", String, unique=True, nullable=True),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+)
+
+Table(
+    "favorites",
+    _baseline,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, ForeignKey("users.id")),
+    Column("brand_name", String),
+    Column("domain_name", String),
+    Column("domain_extension", String),
+    Column("price", String),
+    Column("total_score", Integer, default=0),
+    Column("length_score", Integer, default=0),
+    Column("dictionary_score", Integer, default=0),
+    Column("pronounceability_score", Integer, default=0),
+    Column("repetition_score", Integer, default=0),
+    Column("tld_score", Integer, default=0),
+    Column("created_at", DateTime),
+)
+
+Table(
+    "watchlist",
+    _baseline,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, ForeignKey("users.id")),
+    Column("domain_name", String),
+    Column("domain_extension", String),
+    Column("status", String, default="taken"),
+    Column("created_at", DateTime),
+    Column("last_checked", DateTime),
+    Column("notify_when_available", Boolean, default=False),
+)
+
+Table(
+    "alert_history",
+    _baseline,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("watchlist_item_id", Integer, ForeignKey("watchlist.id")),
+    Column("sent_at", DateTime),
+    Column("alert_type", String),
+    Column("message", String),
+    Column("delivered", Boolean, default=False),
+)
+
+Table(
+    "stats_counters",
+    _baseline,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("counter_name", String, unique=True, index=True),
+    Column("counter_value", Integer, default=0),
+    Column("last_updated", DateTime),
+)
+
+# Tables of the background worker: leases, job queue and email outbox
+_worker_tables = MetaData()
+
+Table(
+    "job_leases",
+    _worker_tables,
+    Column("name", String, primary_key=True),
+    Column("owner", String),
+    Column("expires_at", DateTime),
+    Column("heartbeat_at", DateTime),
+)
+
+Table(
+    "jobs",
+    _worker_tables,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("job_type", String, nullable=False),
+    Column("payload", Text),
+    Column("priority", Integer),
+    Column("status", String),
+    Column("attempts", Integer),
+    Column("max_attempts", Integer),
+    Column("run_at", DateTime),
+    Column("locked_by", String, nullable=True),
+    Column("locked_until", DateTime, nullable=True),
+    Column("last_error", Text, nullable=True),
+    Column("created_at", DateTime),
+    Column("finished_at", DateTime, nullable=True),
+    Index("ix_jobs_claim", "status", "job_type", "priority", "run_at"),
+)
+
+Table(
+    "email_outbox",
+    _worker_tables,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("recipient", String, nullable=False),
+    Column("kind", String),
+    Column("payload", Text),
+    Column("alert_ids", Text),
+    Column("status", String),
+    Column("attempts", Integer),
+    Column("next_attempt_at", DateTime),
+    Column("last_error", Text, nullable=True),
+    Column("provider_id", String, nullable=True),
+    Column("created_at", DateTime),
+    Column("sent_at", DateTime, nullable=True),
+    Index("ix_email_outbox_due", "status", "next_attempt_at"),
+)
+
+
+def _existing_columns(conn, table):
+    return {column["name"] for column in inspect(conn).get_columns(table)}
+
+
+def _add_columns(conn, table, columns):
+    existing_columns = _existing_columns(conn, table)
+    for column_name, column_type in columns.items():
+        if column_name not in existing_columns:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column_name} {column_type};"))
+
+
+def _create_tables(conn):
+    # Creates any missing baseline table together with its indexes
+    _baseline.create_all(conn)
+
+
+def _add_favorite_scores(conn):
+    _add_columns(
+        conn,
+        "favorites",
+        {
+            "total_score": "INTEGER DEFAULT 0",
+            "length_score": "INTEGER DEFAULT 0",
+            "dictionary_score": "INTEGER DEFAULT 0",
+            "pronounceability_score": "INTEGER DEFAULT 0",
+            "repetition_score": "INTEGER DEFAULT 0",
+            "tld_score": "INTEGER DEFAULT 0",
+        },
+    )
+
+
+def _add_watchlist_scheduling(conn):
+    _add_columns(
+        conn,
+        "watchlist",
+        {
+            "next_check_at": "TIMESTAMP",
+            "status_changed_at": "TIMESTAMP",
+            "expires_at": "TIMESTAMP",
+            "registration_checked_at": "TIMESTAMP",
+            "pending_delete_since": "TIMESTAMP",
+            "drop_watch": "BOOLEAN DEFAULT FALSE",
+            "drop_watch_calls": "INTEGER DEFAULT 0",
+        },
+    )
+    # Existing items are due for a check straight away
+    conn.execute(
+        text("UPDATE watchlist SET next_check_at = CURRENT_TIMESTAMP WHERE next_check_at IS NULL;")
+    )
+
+
+def _add_email_digest(conn):
+    _add_columns(conn, "users", {"email_digest": "BOOLEAN DEFAULT FALSE"})
+
+
+def _create_model_indexes(conn, model, *names):
+    # IF NOT EXISTS because expression indexes can't be reflected, so
+    # checkfirst would miss the ones create_all already made
+    indexes = {index.name: index for index in model.__table__.indexes}
+    for name in names:
+        conn.execute(CreateIndex(indexes[name], if_not_exists=True))
+
+
+def _add_query_indexes(conn):
+    # Duplicates predate the unique index, keep the oldest row of each
+    duplicates = conn.execute(
+        text(
+            """
+            SELECT id FROM watchlist w
+            WHERE EXISTS (
+                SELECT 1 FROM watchlist older
+                WHERE older.user_id = w.user_id
+                  AND older.domain_name = w.domain_name
+                  AND older.domain_extension = w.domain_extension
+                  AND older.id < w.id
+            );
+            """
+        )
+    ).scalars().all()
+    if duplicates:
+        print(f"Removing {len(duplicates)} duplicate watchlist items")
+        conn.execute(AlertHistory.__table__.delete().where(AlertHistory.watchlist_item_id.in_(duplicates)))
+        conn.execute(WatchlistItem.__table__.delete().where(WatchlistItem.id.in_(duplicates)))
+
+    # Replaced by the partial ix_watchlist_due index
+    conn.execute(text("DROP INDEX IF EXISTS ix_watchlist_next_check_at;"))
+
+    _create_model_indexes(
+        conn,
+        WatchlistItem,
+        "ux_watchlist_user_domain",
+        "ix_watchlist_due",
+        "ix_watchlist_pending_delete",
+        "ix_watchlist_domain_lower",
+    )
+    _create_model_indexes(conn, Favorite, "ix_favorites_user_id_id")
+    _create_model_indexes(conn, AlertHistory, "ix_alert_history_item_sent_at")
+
+
+def _add_listing_indexes(conn):
+    _create_model_indexes(conn, WatchlistItem, "ix_watchlist_user_id_id", "ix_watchlist_user_status")
+    _create_model_indexes(
+        conn, Favorite, "ix_favorites_user_score", "ix_favorites_user_name", "ix_favorites_user_tld"
+    )
+
+
+def _canonicalize_watchlist_domains(conn):
+    # Items are matched on canonical names now. Per user and canonical name
+    # the oldest item is kept and rewritten to the canonical spelling; later
+    # items spelling the same domain are dropped, their alerts moved over.
+    rows = conn.execute(
+        select(
+            WatchlistItem.id,
+            WatchlistItem.user_id,
+            WatchlistItem.domain_name,
+            WatchlistItem.domain_extension,
+        ).order_by(WatchlistItem.id)
+    ).all()
+
+    kept = {}  # {(user_id, name, extension): id of the oldest item}
+    renames = []
+    duplicates = {}  # {dropped item id: kept item id}
+    for row in rows:
+        try:
+            name, extension = split_domain(join_domain(row.domain_name, row.domain_extension))
+        except InvalidDomain:
+            print(f"Leaving invalid watchlist domain {row.domain_name}.{row.domain_extension} as is")
+            continue
+        key = (row.user_id, name, extension)
+        if key in kept:
+            duplicates[row.id] = kept[key]
+            continue
+        kept[key] = row.id
+        if (name, extension) != (row.domain_name, row.domain_extension):
+            renames.append((row.id, name, extension))
+
+    if duplicates:
+        print(f"Removing {len(duplicates)} watchlist items duplicated by canonical names")
+        for duplicate_id, kept_id in duplicates.items():
+            conn.execute(
+                AlertHistory.__table__.update()
+                .where(AlertHistory.watchlist_item_id == duplicate_id)
+                .values(watchlist_item_id=kept_id)
+            )
+        # Before the renames, a dropped item may hold the canonical spelling
+        conn.execute(WatchlistItem.__table__.delete().where(WatchlistItem.id.in_(list(duplicates))))
+
+    for item_id, name, extension in renames:
+        conn.execute(
+            WatchlistItem.__table__.update()
+            .where(WatchlistItem.id == item_id)
+            .values(domain_name=name, domain_extension=extension)
+        )
+
+
+def _add_admin_flag(conn):
+    _add_columns(conn, "users", {"is_admin": "BOOLEAN DEFAULT FALSE"})
+
+
+def _create_worker_tables(conn):
+    # Made by create_all on startup before the runner existed, so mostly
+    # already there
+    _worker_tables.create_all(conn)
+    for table in _worker_tables.tables.values():
+        for index in table.indexes:
+            conn.execute(CreateIndex(index, if_not_exists=True))
+
+
+MIGRATIONS = [
+    (1, "create tables", _create_tables),
+    (2, "favorite score columns", _add_favorite_scores),
+    (3, "watchlist scheduling columns", _add_watchlist_scheduling),
+    (4, "user email digest preference", _add_email_digest),
+    (5, "indexes for watchlist, favorites and alert queries", _add_query_indexes),
+    (6, "indexes for paginated favorites and watchlist listings", _add_listing_indexes),
+    (7, "canonical watchlist domain names", _canonicalize_watchlist_domains),
+    (8, "user admin flag", _add_admin_flag),
+    (9, "lease, job queue and email outbox tables", _create_worker_tables),
+]
+
+SCHEMA_MIGRATIONS_DDL = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    applied_at TIMESTAMP NOT NULL
+);
+"""
+
+
+def pending_migrations(engine) -> List[Tuple[int, str]]:
+    """(version, name) of every migration not applied to the database yet."""
+    with engine.connect() as conn:
+        if not inspect(conn).has_table("schema_migrations"):
+            return [(version, name) for version, name, _ in MIGRATIONS]
+        applied = set(conn.execute(text("SELECT version FROM schema_migrations;")).scalars())
+    return [(version, name) for version, name, _ in MIGRATIONS if version not in applied]
+
+
+def require_current_schema(engine) -> None:
+    """
+    Refuse to run against a database that is missing migrations, instead of
+    failing later on the first query that touches a new column.
+
+    Raises:
+        RuntimeError: Naming the missing migrations and the command to apply them
+    """
+    pending = pending_migrations(engine)
+    if pending:
+        missing = ", ".join(f"{version} ({name})" for version, name in pending)
+        raise RuntimeError(
+            f"Database schema is behind, migrations not applied: {missing}. "
+            f"Run: python -m backend.migrations"
+        )
 
 
 def migrate():
-    # Create engine
     engine = create_engine(SQLALCHEMY_DATABASE_URL)
 
-    with engine.connect() as conn:
+    with engine.begin() as conn:
+        conn.execute(text(SCHEMA_MIGRATIONS_DDL))
+        applied = set(conn.execute(text("SELECT version FROM schema_migrations;")).scalars())
+
+    for version, name, step in MIGRATIONS:
+        if version in applied:
+            continue
         try:
-            # Create watchlist table
-            conn.execute(
-                text(
-                    """
-                CREATE TABLE IF NOT EXISTS watchlist (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    domain_name TEXT NOT NULL,
-                    domain_extension TEXT NOT NULL,
-                    status TEXT DEFAULT 'taken',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    last_checked TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    notify_when_available BOOLEAN DEFAULT TRUE,
-                    FOREIGN KEY (user_id) REFERENCES users (id)
-                );
-                """
+            with engine.begin() as conn:
+                step(conn)
+                conn.execute(
+                    text(
+                        "INSERT INTO schema_migrations (version, name, applied_at) "
+                        "VALUES (:version, :name, :applied_at);"
+                    ),
+                    {"version": version, "name": name, "applied_at": datetime.utcnow()},
                 )
+            print(f"Applied migration {version}: {name}")
+        except Exception as e:
+            print(f"Error during migration {version} ({name}): {str(e)}")
+            raise
+
+    print("Migration completed successfully")
+
+
+# Hot queries and the index each one must use. The statements mirror the
+# ones built in tasks.py, watchlist_scheduler.py and main.py.
+def _plan_checks():
+    from sqlalchemy import func
+    from backend.models import User
+
+    now = datetime.utcnow()
+    return [
+        (
+            "scheduler sweep",
+            select(WatchlistItem.id)
+            .join(User, User.id == WatchlistItem.user_id)
+            .where(
+                WatchlistItem.notify_when_available == True,
+                WatchlistItem.status == "taken",
+                WatchlistItem.next_check_at <= now,
             )
+            .order_by(WatchlistItem.next_check_at),
+            "ix_watchlist_due",
+        ),
+        (
+            "drop-watch candidates",
+            select(WatchlistItem.id).where(
+                WatchlistItem.drop_watch == True,
+                WatchlistItem.notify_when_available == True,
+                WatchlistItem.status == "taken",
+                WatchlistItem.pending_delete_since <= now,
+            ),
+            "ix_watchlist_pending_delete",
+        ),
+        (
+            "watchers of a domain",
+            select(WatchlistItem.id).where(
+                func.lower(WatchlistItem.domain_name) == "example",
+                func.lower(WatchlistItem.domain_extension) == "com",
+            ),
+            "ix_watchlist_domain_lower",
+        ),
+        (
+            "watchlist duplicate check",
+            select(WatchlistItem.id).where(
+                WatchlistItem.user_id == 1,
+                WatchlistItem.domain_name == "example",
+                WatchlistItem.domain_extension == "com",
+            ),
+            "ux_watchlist_user_domain",
+        ),
+        (
+            "favorites of a user",
+            select(Favorite.id).where(Favorite.user_id == 1).order_by(Favorite.id.desc()),
+            "ix_favorites_user_id_id",
+        ),
+        (
+            "favorites page by score",
+            select(Favorite.id)
+            .where(Favorite.user_id == 1, Favorite.total_score < 50)
+            .order_by(Favorite.total_score.desc(), Favorite.id.desc())
+            .limit(51),
+            "ix_favorites_user_score",
+        ),
+        (
+            "favorites page by name",
+            select(Favorite.id)
+            .where(Favorite.user_id == 1, Favorite.domain_name > "example")
+            .order_by(Favorite.domain_name, Favorite.id)
+            .limit(51),
+            "ix_favorites_user_name",
+        ),
+        (
+            "watchlist page by date",
+            select(WatchlistItem.id)
+            .where(WatchlistItem.user_id == 1, WatchlistItem.id < 100)
+            .order_by(WatchlistItem.id.desc())
+            .limit(51),
+            "ix_watchlist_user_id_id",
+        ),
+        (
+            "watchlist page by status",
+            select(WatchlistItem.id)
+            .where(WatchlistItem.user_id == 1, WatchlistItem.status == "taken")
+            .order_by(WatchlistItem.status, WatchlistItem.id)
+            .limit(51),
+            "ix_watchlist_user_status",
+        ),
+        (
+            "alerts of a watchlist item",
+            select(AlertHistory.id)
+            .where(AlertHistory.watchlist_item_id == 1)
+            .order_by(AlertHistory.sent_at),
+            "ix_alert_history_item_sent_at",
+        ),
+    ]
 
-            # Check if columns exist in favorites table
-            result = conn.execute(text("PRAGMA table_info(favorites);"))
-            existing_columns = [row[1] for row in result.fetchall()]
-
-            # Add columns only if they don't exist
-            columns_to_add = {
-                "total_score": "INTEGER DEFAULT 0",
-                "length_score": "INTEGER DEFAULT 0",
-                "dictionary_score": "INTEGER DEFAULT 0",
-                "pronounceability_score": "INTEGER DEFAULT 0",
-                "repetition_score": "INTEGER DEFAULT 0",
-                "tld_score": "INTEGER DEFAULT 0",
-            }
-
-            for column_name, column_type in columns_to_add.items():
-                if column_name not in existing_columns:
-                    conn.execute(
-                        text(
-                            f"""
-                        ALTER TABLE favorites 
-                        ADD COLUMN {column_name} {column_type};
-                        """
-                        )
-                    )
-
-            conn.commit()
-            print("Migration completed successfully")
-        except Exception as e:
-            print(f"Error during migration: {str(e)}")
-            conn.rollback()
+
+def check_query_plans():
+    """
+    Run EXPLAIN QUERY PLAN for the hot queries and fail if any of them no
+    longer uses its index. SQLite only.
+
+    Returns:
+        List of (query name, expected index, plan) for queries that missed
+    """
+    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    if engine.dialect.name != "sqlite":
+        print("Query plan check only runs against SQLite")
+        return []
+
+    failures = []
+    with engine.connect() as conn:
+        for name, statement, index_name in _plan_checks():
+            compiled = statement.compile(engine)
+            plan = " | ".join(
+                row[-1]
+                for row in conn.exec_driver_sql(
+                    f"EXPLAIN QUERY PLAN {compiled}",
+                    tuple(compiled.params[key] for key in compiled.positiontup),
+                )
+            )
+            if index_name not in plan:
+                failures.append((name, index_name, plan))
+                print(f"FAIL {name}: expected {index_name}, got {plan}")
+            else:
+                print(f"ok   {name}: {plan}")
+    return failures
 
 
 if __name__ == "__main__":
     migrate()
+    if "--check-plans" in sys.argv and check_query_plans():
+        sys.exit(1)
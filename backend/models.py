@@ -7,7 +7,10 @@ from sqlalchemy import (
     Table,
     DateTime,
     Float,
+    Text,
+    Index,
 )
+from sqlalchemy import and_
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from passlib.context import CryptContext
@@ -26,6 +29,8 @@ class User(Base):
     hashed_password = Column(String)
     is_google_user = Column(Boolean, default=False)
     google_user_id = Column(String, unique=True, nullable=True)
+    email_digest = Column(Boolean, default=False)  # One email per check cycle
+    is_admin = Column(Boolean, default=False)  # Granted with python -m backend.admin
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     favorites = relationship("Favorite", back_populates="user")
     watchlist = relationship("WatchlistItem", back_populates="user")
@@ -54,6 +59,15 @@ class Favorite(Base):
     tld_score = Column(Integer, default=0)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    # Keyset pagination of a user's favorites, one index per sort order.
+    # Newest first also serves the TLD filter through the id tiebreaker.
+    __table_args__ = (
+        Index("ix_favorites_user_id_id", "user_id", "id"),
+        Index("ix_favorites_user_score", "user_id", "total_score", "id"),
+        Index("ix_favorites_user_name", "user_id", "domain_name", "id"),
+        Index("ix_favorites_user_tld", "user_id", "domain_extension", "id"),
+    )
+
     user = relationship("User", back_populates="favorites")
 
 
@@ -68,11 +82,52 @@ class WatchlistItem(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     last_checked = Column(DateTime, default=datetime.utcnow)
     notify_when_available = Column(Boolean, default=False)
+    next_check_at = Column(DateTime, default=datetime.utcnow)
+    status_changed_at = Column(DateTime, nullable=True)
+    expires_at = Column(DateTime, nullable=True)  # From RDAP/WHOIS
+    registration_checked_at = Column(DateTime, nullable=True)
+    pending_delete_since = Column(DateTime, nullable=True)
+    drop_watch = Column(Boolean, default=False)  # Burst polling once pending delete
+    drop_watch_calls = Column(Integer, default=0)
     user = relationship("User", back_populates="watchlist")
     alerts = relationship(
         "AlertHistory", back_populates="watchlist_item", cascade="all, delete-orphan"
     )
 
+    __table_args__ = (
+        # One row per user and domain, also serves listing by name
+        Index(
+            "ux_watchlist_user_domain",
+            "user_id",
+            "domain_name",
+            "domain_extension",
+            unique=True,
+        ),
+        # Keyset pagination of a user's watchlist, newest first or by status
+        Index("ix_watchlist_user_id_id", "user_id", "id"),
+        Index("ix_watchlist_user_status", "user_id", "status", "id"),
+        # Scheduler sweep: only alert-enabled, still taken items are due
+        Index(
+            "ix_watchlist_due",
+            "next_check_at",
+            sqlite_where=and_(notify_when_available == True, status == "taken"),
+            postgresql_where=and_(notify_when_available == True, status == "taken"),
+        ),
+        # Drop-watch candidates in pending delete
+        Index(
+            "ix_watchlist_pending_delete",
+            "pending_delete_since",
+            sqlite_where=drop_watch == True,
+            postgresql_where=drop_watch == True,
+        ),
+        # Case-insensitive lookup of every watcher of a domain
+        Index(
+            "ix_watchlist_domain_lower",
+            func.lower(domain_name),
+            func.lower(domain_extension),
+        ),
+    )
+
 
 class AlertHistory(Base):
     __tablename__ = "alert_history"
@@ -86,6 +141,11 @@ class AlertHistory(Base):
 
     watchlist_item = relationship("WatchlistItem", back_populates="alerts")
 
+    # Alert history is read per watchlist item in time order
+    __table_args__ = (
+        Index("ix_alert_history_item_sent_at", "watchlist_item_id", "sent_at"),
+    )
+
 # Stats counter for generated domains
 class StatsCounter(Base):
     __tablename__ = "stats_counters"
@@ -94,3 +154,56 @@ class StatsCounter(Base):
     counter_name = Column(String, unique=True, index=True)
     counter_value = Column(Integer, default=0)
     last_updated = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+# Lease rows used to elect a single worker to run each background job
+class JobLease(Base):
+    __tablename__ = "job_leases"
+
+    name = Column(String, primary_key=True)
+    owner = Column(String)
+    expires_at = Column(DateTime)
+    heartbeat_at = Column(DateTime, default=datetime.utcnow)
+
+
+# Durable background job queue, drained by "python -m backend.worker"
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_type = Column(String, nullable=False)
+    payload = Column(Text, default="{}")  # JSON-encoded handler arguments
+    priority = Column(Integer, default=5)  # Lower runs first
+    status = Column(String, default="queued")  # "queued", "running", "done" or "failed"
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=5)
+    run_at = Column(DateTime, default=datetime.utcnow)
+    locked_by = Column(String, nullable=True)
+    locked_until = Column(DateTime, nullable=True)  # Visibility timeout of a running job
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (Index("ix_jobs_claim", "status", "job_type", "priority", "run_at"),)
+
+
+
+# Notification emails waiting to be sent, written in the same transaction
+# as the alerts they deliver
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    recipient = Column(String, nullable=False)
+    kind = Column(String, default="availability")  # "availability" or "digest"
+    payload = Column(Text)  # JSON: {"domains": [{"domain": ..., "price_info": ...}]}
+    alert_ids = Column(Text, default="[]")  # JSON list of AlertHistory ids
+    status = Column(String, default="pending")  # "pending", "sent" or "failed"
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow)
+    last_error = Column(Text, nullable=True)
+    provider_id = Column(String, nullable=True)  # Bulk email id from the provider
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (Index("ix_email_outbox_due", "status", "next_attempt_at"),)
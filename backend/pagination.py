@@ -0,0 +1,80 @@
+# Keyset pagination for per-user listings. Each page is read by seeking
+# past the last row of the previous page on the sort columns, so page N costs
+# the same as page 1 as long as an index covers (filter, sort columns).
+# The cursor handed to clients is the sort key of that last row.
+
+import json
+import base64
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(values)).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except ValueError:
+        values = None
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def _seek(columns, values, descending: bool):
+    """Rows strictly after values in (columns) order, as a chain of ORs."""
+    conditions = []
+    for i, column in enumerate(columns):
+        equal_prefix = [columns[j] == values[j] for j in range(i)]
+        past = column < values[i] if descending else column > values[i]
+        conditions.append(and_(*equal_prefix, past))
+    return or_(*conditions)
+
+
+async def keyset_page(
+    db: AsyncSession,
+    statement,
+    sort_columns: Tuple,
+    descending: bool,
+    cursor: Optional[str],
+    limit: int,
+) -> Dict[str, Any]:
+    """
+    Fetch one page of a select over individual columns.
+
+    Args:
+        db: Database session
+        statement: Select of the columns to return, with filters applied
+        sort_columns: Columns that order the rows uniquely, the last one
+            is normally the primary key
+        descending: Sort direction, shared by all sort columns so a single
+            index can be scanned in either direction
+        cursor: next_cursor from the previous page, or None for the first
+        limit: Page size
+
+    Returns:
+        Dict with items (rows as dicts) and next_cursor (None on the last page)
+    """
+    if cursor:
+        statement = statement.where(
+            _seek(sort_columns, decode_cursor(cursor, len(sort_columns)), descending)
+        )
+    order_by = [column.desc() if descending else column.asc() for column in sort_columns]
+
+    # One extra row tells whether another page exists
+    rows = (await db.execute(statement.order_by(*order_by).limit(limit + 1))).mappings().all()
+    items = [dict(row) for row in rows[:limit]]
+
+    next_cursor = None
+    if len(rows) > limit:
+        last = items[-1]
+        next_cursor = encode_cursor([last[column.key] for column in sort_columns])
+    return {"items": items, "next_cursor": next_cursor}
@@ -0,0 +1,318 @@
+# Rate limit storage shared by every worker process on a host. slowapi's
+# default memory storage keeps one copy of each counter per process, so with
+# N workers a client gets N times the configured limit. This storage keeps
+# the counters in a small SQLite file in WAL mode instead, and registers
+# itself with the limits library under the "sqlite://" scheme.
+#
+# Each check is a single short write transaction touching a fixed number of
+# rows, so it costs the same no matter how busy the key is. Checks run on the
+# event loop, so they wait only a few milliseconds for another worker's write
+# lock; a check that can't get it lets the request through (fails open) and
+# is counted as failed_open for its key.
+#
+# The same file also holds token buckets, which the registrar schedulers use
+# to share one request rate per provider across all processes.
+
+import time
+import sqlite3
+import random
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+from limits.storage import Storage
+from limits.storage.base import SlidingWindowCounterSupport, TimestampedSlidingWindow
+
+logger = logging.getLogger(__name__)
+
+# Expired windows are swept on roughly one call in this many
+SWEEP_EVERY_CALLS = 1000
+
+
+class SQLiteStorage(Storage, SlidingWindowCounterSupport, TimestampedSlidingWindow):
+    """
+    Fixed and sliding window counter storage in a shared SQLite file.
+
+    URI: sqlite:///relative/path.db or sqlite:////absolute/path.db
+
+    Besides the window counters it keeps allowed/denied totals per rate
+    limit key, see key_counters().
+
+    Options:
+        busy_timeout: Seconds a write waits for another process's lock
+    """
+
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri: str, wrap_exceptions: bool = False, busy_timeout: float = 0.005, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self.path = uri.split("://", 1)[1][1:] or "rate_limits.db"
+        # Seconds a write waits for another process's lock before failing
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        # {key: checks let through because the store was busy}, written to
+        # rate_limit_counters by the next check that gets the lock
+        self._failed_open: Dict[str, int] = {}
+        self._failed_open_lock = threading.Lock()
+        # Setup runs once per process at startup, it may wait longer
+        setup = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        # WAL is a property of the file, set once here rather than on every
+        # connection, which would need a lock each time
+        setup.execute("PRAGMA journal_mode=WAL")
+        with _ImmediateTransaction(setup) as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limit_windows ("
+                "key TEXT PRIMARY KEY, count INTEGER NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limit_counters ("
+                "key TEXT PRIMARY KEY, allowed INTEGER NOT NULL DEFAULT 0, "
+                "denied INTEGER NOT NULL DEFAULT 0, failed_open INTEGER NOT NULL DEFAULT 0, "
+                "last_hit_at REAL)"
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(rate_limit_counters)")}
+            if "failed_open" not in columns:
+                conn.execute(
+                    "ALTER TABLE rate_limit_counters ADD COLUMN failed_open INTEGER NOT NULL DEFAULT 0"
+                )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limit_buckets ("
+                "key TEXT PRIMARY KEY, tokens REAL NOT NULL, refilled_at REAL NOT NULL)"
+            )
+        setup.close()
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread, sqlite3 connections aren't shareable
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self):
+        return _ImmediateTransaction(self._connection())
+
+    # Rows are read through these helpers inside an open transaction
+
+    @staticmethod
+    def _count(conn: sqlite3.Connection, key: str, now: float) -> int:
+        row = conn.execute(
+            "SELECT count FROM rate_limit_windows WHERE key = ? AND expires_at > ?",
+            (key, now),
+        ).fetchone()
+        return row[0] if row else 0
+
+    @staticmethod
+    def _incr(conn: sqlite3.Connection, key: str, expiry: float, amount: int, now: float) -> int:
+        # An expired window starts over, a live one keeps its expiry
+        return conn.execute(
+            "INSERT INTO rate_limit_windows (key, count, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET "
+            "count = CASE WHEN expires_at > ? THEN count + excluded.count ELSE excluded.count END, "
+            "expires_at = CASE WHEN expires_at > ? THEN expires_at ELSE excluded.expires_at END "
+            "RETURNING count",
+            (key, amount, now + expiry, now, now),
+        ).fetchone()[0]
+
+    @staticmethod
+    def _record(conn: sqlite3.Connection, key: str, allowed: bool, now: float) -> None:
+        conn.execute(
+            "INSERT INTO rate_limit_counters (key, allowed, denied, last_hit_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET allowed = allowed + excluded.allowed, "
+            "denied = denied + excluded.denied, last_hit_at = excluded.last_hit_at",
+            (key, int(allowed), int(not allowed), now),
+        )
+
+    def _take_failed_open(self) -> Dict[str, int]:
+        with self._failed_open_lock:
+            failed_open, self._failed_open = self._failed_open, {}
+        return failed_open
+
+    def _fail_open(self, key: str, error: sqlite3.Error, failed_open: Dict[str, int]) -> None:
+        """Count a check let through without the store, plus the counts
+        taken for a write that failed with it."""
+        with self._failed_open_lock:
+            if not self._failed_open and not failed_open:
+                logger.warning(f"Rate limit store unavailable, letting requests through: {str(error)}")
+            failed_open[key] = failed_open.get(key, 0) + 1
+            for failed_key, count in failed_open.items():
+                self._failed_open[failed_key] = self._failed_open.get(failed_key, 0) + count
+
+    @staticmethod
+    def _record_failed_open(conn: sqlite3.Connection, failed_open: Dict[str, int], now: float) -> None:
+        for key, count in failed_open.items():
+            conn.execute(
+                "INSERT INTO rate_limit_counters (key, failed_open, last_hit_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET failed_open = failed_open + excluded.failed_open",
+                (key, count, now),
+            )
+
+    def _maybe_sweep(self, conn: sqlite3.Connection, now: float) -> None:
+        if random.randrange(SWEEP_EVERY_CALLS) == 0:
+            conn.execute("DELETE FROM rate_limit_windows WHERE expires_at <= ?", (now,))
+
+    # Fixed window
+
+    def incr(self, key: str, expiry: int, amount: int = 1) -> int:
+        now = time.time()
+        failed_open = self._take_failed_open()
+        try:
+            with self._transaction() as conn:
+                self._maybe_sweep(conn, now)
+                self._record_failed_open(conn, failed_open, now)
+                return self._incr(conn, key, expiry, amount, now)
+        except sqlite3.OperationalError as e:
+            self._fail_open(key, e, failed_open)
+            # Counts as the window's first hit, so the request is let through
+            return amount
+
+    def get(self, key: str) -> int:
+        return self._count(self._connection(), key, time.time())
+
+    def get_expiry(self, key: str) -> float:
+        row = self._connection().execute(
+            "SELECT expires_at FROM rate_limit_windows WHERE key = ?", (key,)
+        ).fetchone()
+        return row[0] if row else time.time()
+
+    # Sliding window counter: the previous window's count, weighted by how
+    # much of it still overlaps the sliding window, plus the current count
+
+    def _sliding_window(
+        self, conn: sqlite3.Connection, key: str, expiry: int, now: float
+    ) -> Tuple[int, float, int, float]:
+        previous_key, current_key = self.sliding_window_keys(key, expiry, now)
+        previous_count = self._count(conn, previous_key, now)
+        current_count = self._count(conn, current_key, now)
+        previous_ttl = (1 - (((now - expiry) / expiry) % 1)) * expiry if previous_count else 0.0
+        current_ttl = (1 - ((now / expiry) % 1)) * expiry + expiry
+        return previous_count, previous_ttl, current_count, current_ttl
+
+    def acquire_sliding_window_entry(self, key: str, limit: int, expiry: int, amount: int = 1) -> bool:
+        now = time.time()
+        failed_open = self._take_failed_open()
+        try:
+            with self._transaction() as conn:
+                self._maybe_sweep(conn, now)
+                previous_count, previous_ttl, current_count, _ = self._sliding_window(conn, key, expiry, now)
+                weighted_count = previous_count * previous_ttl / expiry + current_count
+                # The write lock is held, so no other worker can slip in between
+                # the check and the increment
+                allowed = amount <= limit and int(weighted_count) + amount <= limit
+                if allowed:
+                    _, current_key = self.sliding_window_keys(key, expiry, now)
+                    # Kept for two windows, it becomes the previous window next
+                    self._incr(conn, current_key, 2 * expiry, amount, now)
+                self._record(conn, key, allowed, now)
+                self._record_failed_open(conn, failed_open, now)
+                return allowed
+        except sqlite3.OperationalError as e:
+            self._fail_open(key, e, failed_open)
+            return True
+
+    def get_sliding_window(self, key: str, expiry: int) -> Tuple[int, float, int, float]:
+        return self._sliding_window(self._connection(), key, expiry, time.time())
+
+    def clear_sliding_window(self, key: str, expiry: int) -> None:
+        for window_key in self.sliding_window_keys(key, expiry, time.time()):
+            self.clear(window_key)
+
+    def check(self) -> bool:
+        try:
+            self._connection().execute("SELECT 1")
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self) -> Optional[int]:
+        with self._transaction() as conn:
+            deleted = conn.execute("DELETE FROM rate_limit_windows").rowcount
+            conn.execute("DELETE FROM rate_limit_counters")
+        return deleted
+
+    def clear(self, key: str) -> None:
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM rate_limit_windows WHERE key = ?", (key,))
+
+    def key_counters(self, prefix: str = "", limit: int = 100) -> List[Dict]:
+        """
+        Allowed and denied totals per rate limit key, most denied first.
+
+        Args:
+            prefix: Only keys starting with this, e.g. "LIMITER/user:"
+            limit: Maximum number of keys to return
+
+        Returns:
+            List of dicts with key, allowed, denied, failed_open (let through
+            while the store was busy, including this process's counts not
+            written yet) and last_hit_at
+        """
+        rows = self._connection().execute(
+            "SELECT key, allowed, denied, failed_open, last_hit_at FROM rate_limit_counters "
+            "WHERE key LIKE ? ESCAPE '\\' ORDER BY denied DESC, allowed DESC LIMIT ?",
+            (prefix.replace("%", r"\%").replace("_", r"\_") + "%", limit),
+        ).fetchall()
+        with self._failed_open_lock:
+            unwritten = dict(self._failed_open)
+        return [
+            {
+                "key": key,
+                "allowed": allowed,
+                "denied": denied,
+                "failed_open": failed_open + unwritten.get(key, 0),
+                "last_hit_at": last_hit_at,
+            }
+            for key, allowed, denied, failed_open, last_hit_at in rows
+        ]
+
+    def take_token(self, key: str, rate: float, burst: float, floor: float = 0.0) -> float:
+        """
+        Take one token from a token bucket shared by every process.
+
+        Args:
+            key: Bucket name
+            rate: Tokens added per second
+            burst: Bucket size, a new bucket starts full
+            floor: Tokens that must be left after taking one, kept in
+                reserve for callers with a lower floor
+
+        Returns:
+            0.0 if a token was taken, otherwise seconds until one is available
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT tokens, refilled_at FROM rate_limit_buckets WHERE key = ?", (key,)
+            ).fetchone()
+            tokens = burst if row is None else min(burst, row[0] + max(now - row[1], 0.0) * rate)
+            if tokens - 1 >= floor:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (floor + 1 - tokens) / rate
+            conn.execute(
+                "INSERT INTO rate_limit_buckets (key, tokens, refilled_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, refilled_at = excluded.refilled_at",
+                (key, tokens, now),
+            )
+            return wait
+
+
+class _ImmediateTransaction:
+    """BEGIN IMMEDIATE takes the write lock up front, so concurrent workers
+    queue on busy_timeout instead of failing to upgrade a read lock."""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
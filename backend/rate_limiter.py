@@ -2,11 +2,28 @@ from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 from fastapi import Request
-from typing import Optional
-from .auth import get_current_user
+from typing import Dict, List, Optional
+import os
+from .auth import get_token_subject
+from . import rate_limit_storage  # registers the sqlite:// storage scheme
 
-# Initialize rate limiter
-limiter = Limiter(key_func=get_remote_address)
+# Counters live in a store every worker shares, otherwise each worker
+# enforces its own copy of every limit. The default SQLite file covers
+# workers on one host, point this at redis:// when running several hosts.
+RATE_LIMIT_STORAGE_URI = os.getenv("RATE_LIMIT_STORAGE_URI", "sqlite:///./rate_limits.db")
+
+# Seconds a check waits for another worker's write lock on the SQLite store
+# before letting the request through
+RATE_LIMIT_BUSY_TIMEOUT = float(os.getenv("RATE_LIMIT_BUSY_TIMEOUT", "0.005"))
+
+# Initialize rate limiter. The sliding window counter weights the previous
+# window's hits, so a client can't get twice the limit across a window edge.
+limiter = Limiter(
+    key_func=get_remote_address,
+    storage_uri=RATE_LIMIT_STORAGE_URI,
+    storage_options={"busy_timeout": RATE_LIMIT_BUSY_TIMEOUT} if RATE_LIMIT_STORAGE_URI.startswith("sqlite") else {},
+    strategy="sliding-window-counter",
+)
 
 
 # Rate limit decorators
@@ -21,16 +38,22 @@ def rate_limit(calls: int = 100, period: int = 3600, user_specific: bool = False
     """
 
     def decorator(func):
-        async def get_key(request: Request):
+        # slowapi calls the key function synchronously, so it can't await a
+        # database lookup. The endpoint's get_current_user dependency has
+        # already run and left the principal on request.state, otherwise
+        # the token subject identifies the user just as well.
+        def get_key(request: Request):
             if user_specific:
-                try:
-                    # Get current user from the request
-                    user = await get_current_user(request)
-                    return f"user:{user.id}"
-                except:
-                    # Fallback to IP-based limiting if no user is authenticated
-                    return f"ip:{request.client.host}"
-            return f"ip:{request.client.host}"
+                principal = getattr(request.state, "principal", None)
+                if principal is not None:
+                    return f"user:{principal.username}"
+                authorization = request.headers.get("Authorization", "")
+                scheme, _, token = authorization.partition(" ")
+                username = get_token_subject(token) if scheme.lower() == "bearer" else None
+                if username:
+                    return f"user:{username}"
+                # Fallback to IP-based limiting if no user is authenticated
+            return f"ip:{get_remote_address(request)}"
 
         # Apply rate limiting using slowapi
         return limiter.limit(f"{calls}/{period}second", key_func=get_key)(func)
@@ -38,6 +61,17 @@ def rate_limit(calls: int = 100, period: int = 3600, user_specific: bool = False
     return decorator
 
 
+def rate_limit_key_counters(prefix: str = "", limit: int = 100) -> List[Dict]:
+    """
+    Allowed and denied totals per rate limit key, for tuning the limits.
+    Empty when the configured storage doesn't keep them.
+    """
+    storage = limiter.limiter.storage
+    if not isinstance(storage, rate_limit_storage.SQLiteStorage):
+        return []
+    return storage.key_counters(prefix, limit)
+
+
 # Rate limit configurations
 RATE_LIMITS = {
     "DEFAULT": {"calls": 100, "period": 3600},  # 100 requests per hour
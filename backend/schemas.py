@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 
@@ -70,6 +70,7 @@ class WatchlistItem(WatchlistItemBase):
     status: str
     created_at: datetime
     last_checked: datetime
+    drop_watch: bool = False
 
     class Config:
         from_attributes = True
@@ -77,5 +78,41 @@ class WatchlistItem(WatchlistItemBase):
 
 class WatchlistItemUpdate(BaseModel):
     notify_when_available: Optional[bool] = None
+    drop_watch: Optional[bool] = None
     status: Optional[str] = None
     last_checked: Optional[datetime] = None
+
+
+class FavoriteSummary(BaseModel):
+    id: int
+    domain_name: str
+    domain_extension: str
+    price: Optional[str] = None
+    total_score: int = 0
+    length_score: int = 0
+    dictionary_score: int = 0
+    pronounceability_score: int = 0
+    repetition_score: int = 0
+    tld_score: int = 0
+    created_at: datetime
+
+
+class FavoritePage(BaseModel):
+    items: List[FavoriteSummary]
+    next_cursor: Optional[str] = None
+
+
+class WatchlistItemSummary(BaseModel):
+    id: int
+    domain_name: str
+    domain_extension: str
+    status: str
+    notify_when_available: bool = False
+    drop_watch: bool = False
+    created_at: datetime
+    last_checked: Optional[datetime] = None
+
+
+class WatchlistPage(BaseModel):
+    items: List[WatchlistItemSummary]
+    next_cursor: Optional[str] = None
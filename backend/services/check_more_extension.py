@@ -2,6 +2,7 @@ import logging
 import asyncio
 from typing import Dict, List
 from .domain_checker import check_multiple_domains
+from .domain_names import split_domain
 from .domain_scorer import DomainScorer
 
 logger = logging.getLogger(__name__)
@@ -26,8 +27,9 @@ async def check_more_extensions(domain_name: str, already_checked_extensions: Li
     logger.info(f"Checking more extensions for domain: {domain_name}")
     logger.info(f"Already checked extensions: {already_checked_extensions}")
     
-    # Filter out extensions already checked
-    extensions_to_check = [ext for ext in ALL_EXTENSIONS if ext not in already_checked_extensions]
+    # Filter out extensions already checked, however the client spelled them
+    already_checked = {ext.strip().lstrip(".").lower() for ext in already_checked_extensions}
+    extensions_to_check = [ext for ext in ALL_EXTENSIONS if ext not in already_checked]
     
     if not extensions_to_check:
         logger.info("No additional extensions to check")
@@ -48,7 +50,7 @@ async def check_more_extensions(domain_name: str, already_checked_extensions: Li
         for full_domain, info in results.items():
             try:
                 # Extract the TLD (extension)
-                extension = full_domain.split('.')[-1]
+                extension = split_domain(full_domain)[1]
                 
                 # Calculate the score
                 score = domain_scorer.calculate_total_score(domain_name, extension)
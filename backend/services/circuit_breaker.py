@@ -0,0 +1,190 @@
+# Circuit breaker per registrar provider. Outcomes of recent calls are kept
+# in a rolling time window. Once enough of them failed or were slow, the
+# breaker opens and calls fail immediately instead of each waiting out a
+# timeout. After a cool-down a few probe calls go through (half-open); if
+# they succeed the breaker closes, if one fails it opens again for longer.
+#
+# The breaker also keeps latency statistics (EWMA and recent percentiles)
+# that callers use to pick the fastest healthy provider.
+
+import time
+import logging
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Weight of the newest sample in the latency EWMA
+LATENCY_EWMA_ALPHA = 0.2
+# Latencies kept for percentiles
+LATENCY_SAMPLES = 200
+
+
+class CircuitBreaker:
+    """
+    Rolling-window circuit breaker.
+
+    Args:
+        name: Provider name, used in logs and health output
+        window_seconds: How far back call outcomes count
+        min_calls: Calls needed in the window before the breaker may open
+        failure_rate: Failed share of calls that opens the breaker
+        slow_call_seconds: Calls at least this slow count as slow
+        slow_rate: Slow share of calls that opens the breaker
+        open_seconds: First cool-down, doubled on every failed probe
+        max_open_seconds: Upper bound for the cool-down
+        probe_calls: Successful probes needed to close again
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window_seconds: float = 30,
+        min_calls: int = 10,
+        failure_rate: float = 0.5,
+        slow_call_seconds: float = 4,
+        slow_rate: float = 0.8,
+        open_seconds: float = 15,
+        max_open_seconds: float = 120,
+        probe_calls: int = 3,
+    ):
+        self.name = name
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.probe_calls = probe_calls
+
+        self.state = CLOSED
+        self._calls: Deque[Tuple[float, bool, bool]] = deque()  # (ts, failed, slow)
+        self._failures = 0
+        self._slow = 0
+        self._opened_at = 0.0
+        self._cool_down = open_seconds
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self.latency_ewma: Optional[float] = None
+        self._latencies: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+
+    def _trim(self, now: float) -> None:
+        while self._calls and now - self._calls[0][0] > self.window_seconds:
+            _, failed, slow = self._calls.popleft()
+            self._failures -= failed
+            self._slow -= slow
+
+    def _open(self, now: float, reason: str) -> None:
+        self.state = OPEN
+        self._opened_at = now
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        logger.warning(f"{self.name} circuit opened ({reason}), failing fast for {self._cool_down:.0f}s")
+
+    def _close(self) -> None:
+        self.state = CLOSED
+        self._calls.clear()
+        self._failures = self._slow = 0
+        self._cool_down = self.open_seconds
+        logger.info(f"{self.name} circuit closed, provider recovered")
+
+    def available(self) -> bool:
+        """Whether a call would be let through right now, without taking a probe."""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            return time.monotonic() - self._opened_at >= self._cool_down
+        return self._probes_in_flight < self.probe_calls - self._probe_successes
+
+    def allow(self) -> bool:
+        """Take permission for one call. Every allowed call must be recorded."""
+        if self.state == OPEN and time.monotonic() - self._opened_at >= self._cool_down:
+            self.state = HALF_OPEN
+            logger.info(f"{self.name} circuit half-open, probing")
+        if not self.available():
+            return False
+        if self.state == HALF_OPEN:
+            self._probes_in_flight += 1
+        return True
+
+    def abandon(self) -> None:
+        """An allowed call never reached the provider, hand back its probe."""
+        if self.state == HALF_OPEN:
+            self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    def record(self, failed: bool, latency: Optional[float]) -> None:
+        """
+        Record the outcome of an allowed call.
+
+        Args:
+            failed: Whether the provider failed to answer
+            latency: Seconds the call took, None if it isn't comparable to
+                other calls (e.g. bulk requests)
+        """
+        now = time.monotonic()
+        slow = latency is not None and latency >= self.slow_call_seconds
+        if latency is not None:
+            self._latencies.append(latency)
+            if self.latency_ewma is None:
+                self.latency_ewma = latency
+            else:
+                self.latency_ewma += LATENCY_EWMA_ALPHA * (latency - self.latency_ewma)
+
+        if self.state == HALF_OPEN:
+            self._probes_in_flight = max(0, self._probes_in_flight - 1)
+            if failed:
+                self._cool_down = min(self._cool_down * 2, self.max_open_seconds)
+                self._open(now, "probe failed")
+            else:
+                self._probe_successes += 1
+                if self._probe_successes >= self.probe_calls:
+                    self._close()
+            return
+        if self.state == OPEN:
+            # Calls started before the breaker opened
+            return
+
+        self._calls.append((now, failed, slow))
+        self._failures += failed
+        self._slow += slow
+        self._trim(now)
+
+        calls = len(self._calls)
+        if calls < self.min_calls:
+            return
+        if self._failures / calls >= self.failure_rate:
+            self._open(now, f"{self._failures}/{calls} calls failed")
+        elif self._slow / calls >= self.slow_rate:
+            self._open(now, f"{self._slow}/{calls} calls slower than {self.slow_call_seconds}s")
+
+    def latency_percentile(self, percentile: float, min_samples: int = 20) -> Optional[float]:
+        """Latency at the given percentile (0-1) of recent calls, None with too few samples."""
+        if len(self._latencies) < min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[int(percentile * (len(ordered) - 1))]
+
+    def health(self) -> Dict:
+        """Breaker state and rolling-window rates, for monitoring and routing."""
+        now = time.monotonic()
+        self._trim(now)
+        calls = len(self._calls)
+        retry_in: Optional[float] = None
+        if self.state == OPEN:
+            retry_in = round(max(0.0, self._cool_down - (now - self._opened_at)), 1)
+        p95 = self.latency_percentile(0.95)
+        return {
+            "state": self.state,
+            "available": self.available(),
+            "calls": calls,
+            "failure_rate": round(self._failures / calls, 3) if calls else 0.0,
+            "slow_rate": round(self._slow / calls, 3) if calls else 0.0,
+            "retry_in_seconds": retry_in,
+            "latency_ewma_ms": round(self.latency_ewma * 1000) if self.latency_ewma is not None else None,
+            "latency_p95_ms": round(p95 * 1000) if p95 is not None else None,
+        }
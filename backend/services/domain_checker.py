@@ -3,17 +3,31 @@ import logging
 import os
 import json
 import time
+import math
+import random
 import asyncio
 import ssl
+from collections import Counter, OrderedDict
 from typing import Tuple, Dict, Optional, List
-from .email_service import send_domain_availability_email
-from .porkbun_service import get_porkbun_pricing
+from .email_service import enqueue_domain_availability_email
 from .dynadot_service import (
-    get_dynadot_pricing,
+    DYNADOT_API_KEY,
     check_dynadot_domains,
     check_dynadot_domain,
 )
-from .namesilo_service import get_namesilo_pricing
+from . import price_matrix
+from .domain_names import InvalidDomain, canonical_domain, join_domain, split_domain
+from .registrar_scheduler import (
+    CircuitOpen,
+    Lane,
+    RegistrarBusy,
+    QuotaLevel,
+    dynadot_scheduler,
+    godaddy_scheduler,
+    quota_level,
+    registrar_priority,
+    retry_after_seconds,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -37,10 +51,14 @@ TCP_CONNECTOR = aiohttp.TCPConnector(limit=30, ssl=ssl_context, keepalive_timeou
 # Global session that will be initialized once and reused
 _SESSION = None
 
-# Cache for provider pricing data
-PORKBUN_PRICING = {}
-DYNADOT_PRICING = {}
-NAMESILO_PRICING = {}
+# Hedged availability checks: ask the fastest healthy provider first and the
+# other one only if the answer is slower than the first provider's p95
+HEDGED_AVAILABILITY_CHECKS = os.getenv("HEDGED_AVAILABILITY_CHECKS", "true").lower() == "true"
+HEDGE_PERCENTILE = 0.95
+HEDGE_DEFAULT_DELAY = 1.0  # Seconds, until a provider has latency history
+
+# Hedge requests that lost the race, left to finish so their latency is recorded
+_hedge_stragglers = set()
 
 
 async def get_session():
@@ -63,35 +81,325 @@ async def close_session():
 
 
 # Simple in-memory cache for domain availability results
-# Format: {domain: (result, timestamp)}
+# Format: {domain: (result, timestamp)}, least recently used first
 # Cache results for 24 hours (86400 seconds)
-DOMAIN_CACHE = {}
+DOMAIN_CACHE = OrderedDict()
 CACHE_TTL = 86400  # 24 hours in seconds
+# Entries kept per process, the least recently used go first once full
+DOMAIN_CACHE_MAX_SIZE = int(os.getenv("DOMAIN_CACHE_MAX_SIZE", "50000"))
+# Entries are kept this long so they can still be served while the
+# registrar quotas run low
+CACHE_STALE_TTL = 7 * 86400
+
+# How long past its TTL an entry is still served while one background
+# refresh runs. An "available" answer goes out of date sooner, someone may
+# register the domain in the meantime.
+CACHE_MAX_STALE = {"available": 3600, "taken": 86400}
+
+# Probabilistic early refresh (XFetch): the closer an entry is to expiry, and
+# the slower a refresh is, the likelier a read triggers one. Higher is earlier.
+CACHE_EARLY_REFRESH_BETA = 1.0
+
+# Lookup counters for the admin API, hits per domain for its top keys
+CACHE_STATS = {"hits": 0, "stale_hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+_cache_key_hits = Counter()
+
+# Age buckets of the cache histogram, upper bounds in seconds
+CACHE_AGE_BUCKETS = [
+    ("<1h", 3600),
+    ("1-6h", 6 * 3600),
+    ("6-24h", 86400),
+    ("1-2d", 2 * 86400),
+    ("2-7d", CACHE_STALE_TTL),
+]
+
+# Domains with a background refresh queued or running
+_revalidating = set()
+_revalidation_batch = []
+_revalidation_tasks = set()
+
+# How old a cached result may be at each quota level
+QUOTA_CACHE_TTL = {
+    QuotaLevel.NORMAL: CACHE_TTL,
+    QuotaLevel.CONSERVE: 3 * CACHE_TTL,
+    QuotaLevel.SCARCE: CACHE_STALE_TTL,
+    QuotaLevel.CRITICAL: CACHE_STALE_TTL,
+    QuotaLevel.EXHAUSTED: CACHE_STALE_TTL,
+}
+
+
+def _expires_early(expires_at: float, now: float) -> bool:
+    # Refresh cost is the provider's typical latency
+    refresh_seconds = godaddy_scheduler.breaker.latency_ewma or 1.0
+    return now - refresh_seconds * CACHE_EARLY_REFRESH_BETA * math.log(1.0 - random.random()) >= expires_at
 
 
 def get_from_cache(domain: str) -> Optional[Dict]:
-    """Get domain availability result from cache if it exists and is not expired"""
-    if domain in DOMAIN_CACHE:
-        result, timestamp = DOMAIN_CACHE[domain]
-        if time.time() - timestamp < CACHE_TTL:
-            return result
-        else:
-            del DOMAIN_CACHE[domain]
+    """
+    Get domain availability result from cache.
+
+    Fresh entries are returned as they are, though reads close to expiry may
+    refresh them early in the background. Expired entries are still returned
+    within CACHE_MAX_STALE for their outcome, with one background refresh.
+    """
+    entry = DOMAIN_CACHE.get(domain)
+    if entry is None:
+        CACHE_STATS["misses"] += 1
+        return None
+
+    result, timestamp = entry
+    now = time.time()
+    age = now - timestamp
+    ttl = QUOTA_CACHE_TTL[quota_level()]
+    if age < ttl:
+        if _expires_early(timestamp + ttl, now):
+            _schedule_revalidation(domain)
+        DOMAIN_CACHE.move_to_end(domain)
+        CACHE_STATS["hits"] += 1
+        _cache_key_hits[domain] += 1
+        return result
+    if age >= CACHE_STALE_TTL:
+        _evict(domain)
+        CACHE_STATS["evictions"] += 1
+        CACHE_STATS["misses"] += 1
+        return None
+
+    if age < ttl + CACHE_MAX_STALE[_outcome(result)]:
+        _schedule_revalidation(domain)
+        DOMAIN_CACHE.move_to_end(domain)
+        CACHE_STATS["stale_hits"] += 1
+        _cache_key_hits[domain] += 1
+        return result
+    CACHE_STATS["misses"] += 1
     return None
 
 
+def _outcome(result: Dict) -> str:
+    return "available" if result.get("available") else "taken"
+
+
+def _evict(domain: str) -> None:
+    DOMAIN_CACHE.pop(domain, None)
+    _cache_key_hits.pop(domain, None)
+
+
+def _schedule_revalidation(domain: str) -> None:
+    """Queue a background refresh, batched with others from the same tick."""
+    if domain in _revalidating:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    _revalidating.add(domain)
+    if not _revalidation_batch:
+        loop.call_soon(_start_revalidation)
+    _revalidation_batch.append(domain)
+
+
+def _start_revalidation() -> None:
+    domains = list(_revalidation_batch)
+    _revalidation_batch.clear()
+    task = asyncio.create_task(_revalidate(domains))
+    _revalidation_tasks.add(task)
+    task.add_done_callback(_revalidation_tasks.discard)
+
+
+async def _revalidate(domains: List[str]) -> None:
+    logger.debug(f"Refreshing {len(domains)} cached domains in the background")
+    try:
+        # Shed first when the registrar quotas run low
+        with registrar_priority(Lane.BACKGROUND, owner="revalidate"):
+            await check_multiple_domains(domains, use_cache=False)
+    except Exception as e:
+        logger.error(f"Error refreshing cached domains: {str(e)}")
+    finally:
+        _revalidating.difference_update(domains)
+
+
 def add_to_cache(domain: str, result: Dict) -> None:
     """Add domain availability result to cache"""
+    # A failed check would hide the real answer for the whole TTL, e.g. while
+    # a provider's circuit is open, so only answers are cached
+    if result.get("error"):
+        return
     DOMAIN_CACHE[domain] = (result, time.time())
+    DOMAIN_CACHE.move_to_end(domain)
+    while len(DOMAIN_CACHE) > DOMAIN_CACHE_MAX_SIZE:
+        oldest, _ = DOMAIN_CACHE.popitem(last=False)
+        _cache_key_hits.pop(oldest, None)
+        CACHE_STATS["evictions"] += 1
+
+
+def _fall_back_to_dynadot(domain: str, domain_result: Dict, dynadot_result: Dict) -> Dict:
+    """
+    Use Dynadot's answer when GoDaddy couldn't give one, e.g. while its
+    circuit breaker is open.
+
+    Args:
+        domain: Domain that was checked
+        domain_result: GoDaddy result
+        dynadot_result: Dynadot result for the same domain
+
+    Returns:
+        The GoDaddy result if it's usable, otherwise one built from Dynadot's
+        answer with source set to "dynadot"
+    """
+    if not domain_result.get("error") or dynadot_result.get("error"):
+        return domain_result
+
+    logger.info(f"Using Dynadot's answer for {domain}, GoDaddy: {domain_result['error']}")
+    is_available = dynadot_result.get("available", False)
+    price_info = None
+    if is_available:
+        # Same microdollar format as GoDaddy prices
+        price = float(dynadot_result.get("price") or 0) * 1000000
+        price_info = {"purchase": price, "renewal": price}
+    return {
+        "available": is_available,
+        "price_info": price_info,
+        "error": None,
+        "source": "dynadot",
+    }
+
+
+def _add_provider_prices(
+    domain_result: Dict, extension: str, dynadot_result: Dict, matrix: price_matrix.PriceMatrix
+) -> None:
+    """
+    Add each provider's price for the domain, and the cheapest of them, to
+    its result. Prices are integer micro-dollars, like GoDaddy's.
+
+    Args:
+        domain_result: Result of the availability check, updated in place
+        extension: Canonical TLD of the domain
+        dynadot_result: Dynadot's answer for the domain, its quote replaces
+            the TLD list price
+        matrix: Price matrix snapshot to read TLD prices from
+    """
+    providers = domain_result.setdefault("providers", {})
+    best = matrix.best(extension)
+    providers.update(matrix.offers(extension))
+
+    # GoDaddy's price comes with the answer, unless the answer came from Dynadot
+    if domain_result.get("source") != "dynadot":
+        godaddy_price = (domain_result.get("price_info") or {}).get("purchase", 0)
+        providers["godaddy"] = godaddy_price
+        if godaddy_price and (best is None or godaddy_price < best[1]):
+            best = ("godaddy", godaddy_price)
+
+    dynadot_price = price_matrix.to_micros(dynadot_result.get("price")) if dynadot_result.get("available") else None
+    if dynadot_price is not None:
+        providers["dynadot"] = dynadot_price
+        if best is not None and best[0] == "dynadot" and dynadot_price > best[1]:
+            # Dynadot's list price was the cheapest, its quote may not be
+            best = min(((name, price) for name, price in providers.items() if price), key=lambda offer: offer[1])
+        elif best is None or dynadot_price < best[1]:
+            best = ("dynadot", dynadot_price)
+
+    domain_result["best_offer"] = {"provider": best[0], "price": best[1]} if best else None
 
 
 def clear_cache() -> None:
     """Clear the entire domain cache"""
-    global DOMAIN_CACHE
-    DOMAIN_CACHE = {}
+    DOMAIN_CACHE.clear()
+    _cache_key_hits.clear()
     logger.info("Domain cache cleared")
 
 
+def invalidate_cache(
+    domain: Optional[str] = None,
+    tld: Optional[str] = None,
+    outcome: Optional[str] = None,
+    older_than: Optional[float] = None,
+    newer_than: Optional[float] = None,
+) -> int:
+    """
+    Drop the domain cache entries matching all given filters.
+
+    Args:
+        domain: Exact domain, in any spelling canonical_domain() accepts
+        tld: Public suffix, e.g. "com" or "co.uk"
+        outcome: "available" or "taken"
+        older_than: Only entries cached more than this many seconds ago
+        newer_than: Only entries cached less than this many seconds ago,
+            with older_than this selects a window of bad provider answers
+
+    Returns:
+        Number of entries dropped
+    """
+    if domain is not None:
+        keys = [canonical_domain(domain)]
+    else:
+        keys = list(DOMAIN_CACHE)
+    if tld is not None:
+        tld = tld.strip().lstrip(".").lower()
+
+    now = time.time()
+    matches = []
+    for key in keys:
+        entry = DOMAIN_CACHE.get(key)
+        if entry is None:
+            continue
+        result, timestamp = entry
+        age = now - timestamp
+        if tld is not None and split_domain(key)[1] != tld:
+            continue
+        if outcome is not None and _outcome(result) != outcome:
+            continue
+        if older_than is not None and age <= older_than:
+            continue
+        if newer_than is not None and age >= newer_than:
+            continue
+        matches.append(key)
+
+    for key in matches:
+        _evict(key)
+    CACHE_STATS["invalidations"] += len(matches)
+    logger.info(
+        f"Invalidated {len(matches)} domain cache entries "
+        f"(domain={domain}, tld={tld}, outcome={outcome}, older_than={older_than}, newer_than={newer_than})"
+    )
+    return len(matches)
+
+
+def cache_stats(top: int = 20) -> Dict:
+    """
+    Size, lookup counters, age histogram and most-hit keys of the domain cache.
+
+    Args:
+        top: Number of most-hit keys to return
+
+    Returns:
+        Dict of cache statistics
+    """
+    now = time.time()
+    histogram = {label: 0 for label, _ in CACHE_AGE_BUCKETS}
+    outcomes = {"available": 0, "taken": 0}
+    for result, timestamp in DOMAIN_CACHE.values():
+        age = now - timestamp
+        label = next((label for label, bound in CACHE_AGE_BUCKETS if age < bound), CACHE_AGE_BUCKETS[-1][0])
+        histogram[label] += 1
+        outcomes[_outcome(result)] += 1
+
+    lookups = CACHE_STATS["hits"] + CACHE_STATS["stale_hits"] + CACHE_STATS["misses"]
+    return {
+        "entries": len(DOMAIN_CACHE),
+        "max_entries": DOMAIN_CACHE_MAX_SIZE,
+        "outcomes": outcomes,
+        **CACHE_STATS,
+        "hit_rate": round((CACHE_STATS["hits"] + CACHE_STATS["stale_hits"]) / lookups, 3) if lookups else None,
+        "stale_hit_rate": round(CACHE_STATS["stale_hits"] / lookups, 3) if lookups else None,
+        "refreshing": len(_revalidating),
+        "age_histogram": histogram,
+        "top_keys": [
+            {"domain": key, "hits": hits, "age_seconds": round(now - DOMAIN_CACHE[key][1])}
+            for key, hits in _cache_key_hits.most_common(top)
+            if key in DOMAIN_CACHE
+        ],
+    }
+
+
 class DomainCheckError(Exception):
     def __init__(
         self, message: str, domain: str, error_code: str, details: Optional[Dict] = None
@@ -109,13 +417,15 @@ async def check_domain_availability(
     """
     Check domain availability using GoDaddy's API
     Returns a tuple of (is_available, price_info)
-    If notify_email is provided, sends an email notification when domain is available
+    If notify_email is provided, queues an email notification when domain is available
     """
-    global PORKBUN_PRICING, DYNADOT_PRICING, NAMESILO_PRICING
-
-    full_domain = f"{domain_name}.{extension}"
+    try:
+        full_domain = join_domain(domain_name, extension)
+        extension = split_domain(full_domain)[1]
+    except InvalidDomain as e:
+        logger.warning(str(e))
+        return False, None
     logger.info(f"Checking availability for domain: {full_domain}")
-    logger.debug(f"Current DYNADOT_PRICING: {DYNADOT_PRICING}")
 
     # Check cache first
     cached_result = get_from_cache(full_domain)
@@ -127,14 +437,12 @@ async def check_domain_availability(
         # Send email notification if domain is available and email is provided
         if is_available and notify_email and price_info:
             try:
-                await send_domain_availability_email(
-                    notify_email, full_domain, price_info
-                )
+                await enqueue_domain_availability_email(notify_email, full_domain, price_info)
                 logger.info(
-                    f"Sent availability notification for {full_domain} to {notify_email}"
+                    f"Queued availability notification for {full_domain} to {notify_email}"
                 )
             except Exception as email_error:
-                logger.error(f"Failed to send email notification: {str(email_error)}")
+                logger.error(f"Failed to queue email notification: {str(email_error)}")
 
         return is_available, price_info
 
@@ -161,27 +469,6 @@ async def check_domain_availability(
         godaddy_task = check_single_domain(full_domain, headers, session)
         tasks.append(godaddy_task)
         
-        # Prepare provider pricing tasks
-        pricing_tasks = []
-        
-        # Only get Porkbun pricing if needed
-        if not PORKBUN_PRICING:
-            pricing_tasks.append(get_porkbun_pricing())
-        
-        # Only get Dynadot pricing for this specific extension if needed
-        if extension not in DYNADOT_PRICING or "error" in DYNADOT_PRICING:
-            logger.info(f"Fetching Dynadot pricing only for .{extension}")
-            pricing_tasks.append(get_dynadot_pricing([extension]))
-        else:
-            logger.info(f"Using cached Dynadot pricing for .{extension}: {DYNADOT_PRICING.get(extension)}")
-        
-        # Only get Namesilo pricing for this specific extension if needed
-        if not NAMESILO_PRICING or extension not in NAMESILO_PRICING:
-            logger.info(f"Fetching Namesilo pricing for .{extension}")
-            pricing_tasks.append(get_namesilo_pricing([extension]))
-        else:
-            logger.info(f"Using cached Namesilo pricing for .{extension}")
-        
         # Direct Dynadot domain check
         dynadot_task = check_dynadot_domain(full_domain)
         tasks.append(dynadot_task)
@@ -208,112 +495,15 @@ async def check_domain_availability(
                 "price": None,
                 "error": str(dynadot_result),
             }
-        
-        # If the domain is available, run pricing tasks concurrently and process them
-        if domain_result.get("available", False) and pricing_tasks:
-            logger.info(f"Domain {full_domain} is available, fetching pricing data")
-            pricing_results = await asyncio.gather(*pricing_tasks, return_exceptions=True)
-            
-            # Process pricing results
-            pricing_index = 0
-            if not PORKBUN_PRICING:
-                result = pricing_results[pricing_index]
-                if not isinstance(result, Exception):
-                    PORKBUN_PRICING = result
-                pricing_index += 1
-
-            # Only process Dynadot results if we requested them
-            if extension not in DYNADOT_PRICING or "error" in DYNADOT_PRICING:
-                result = (
-                    pricing_results[pricing_index]
-                    if pricing_index < len(pricing_results)
-                    else None
-                )
-                if result and not isinstance(result, Exception):
-                    # If DYNADOT_PRICING is empty, set it to the result
-                    # Otherwise, update the existing cache with the new data
-                    if not DYNADOT_PRICING:
-                        DYNADOT_PRICING = result
-                    else:
-                        DYNADOT_PRICING.update(result)
-                    logger.debug(f"Updated DYNADOT_PRICING after API call: {DYNADOT_PRICING}")
-                pricing_index += 1
-
-            # Only process Namesilo results if we requested them
-            if not NAMESILO_PRICING or extension not in NAMESILO_PRICING:
-                result = (
-                    pricing_results[pricing_index]
-                    if pricing_index < len(pricing_results)
-                    else None
-                )
-                if result and not isinstance(result, Exception):
-                    # If NAMESILO_PRICING is empty, set it to the result
-                    # Otherwise, update the existing cache with the new data
-                    if not NAMESILO_PRICING:
-                        NAMESILO_PRICING = result
-                    else:
-                        NAMESILO_PRICING.update(result)
-        
-        # Add provider prices to the result
-        if "providers" not in domain_result:
-            domain_result["providers"] = {}
-
-        # Add GoDaddy price to providers
-        godaddy_price = domain_result.get("price_info", {}).get("purchase", 0)
-        domain_result["providers"]["godaddy"] = godaddy_price
-        logger.info(f"Added GoDaddy price: {godaddy_price/1000000:.2f}")
-
-        # Add Porkbun price if available
-        if extension in PORKBUN_PRICING and "error" not in PORKBUN_PRICING:
-            logger.info(f"Found Porkbun pricing for extension .{extension}")
-            porkbun_price = PORKBUN_PRICING.get(extension, {}).get("registration")
-            logger.info(f"Porkbun price for .{extension}: {porkbun_price}")
-
-            if porkbun_price:
-                porkbun_price_converted = (
-                    float(porkbun_price) * 1000000
-                )  # Convert to same format as GoDaddy
-                domain_result["providers"]["porkbun"] = porkbun_price_converted
-                logger.info(
-                    f"Added Porkbun price: {porkbun_price} (converted: {porkbun_price_converted/1000000:.2f})"
-                )
 
-        # Add Dynadot price - prioritize direct check result, fallback to cached pricing
-        if dynadot_result.get("available", False) and dynadot_result.get("price"):
-            dynadot_price = dynadot_result.get("price")
-            logger.info(f"Found Dynadot price for {full_domain}: {dynadot_price}")
-            domain_result["providers"]["dynadot"] = (
-                float(dynadot_price) * 1000000
-            )  # Convert to same format as GoDaddy
-            logger.info(f"Added Dynadot price from direct check: {dynadot_price}")
-        elif extension in DYNADOT_PRICING and not isinstance(DYNADOT_PRICING.get(extension), dict):
-            dynadot_price = DYNADOT_PRICING.get(extension)
-            logger.info(f"Using cached Dynadot price for .{extension}: {dynadot_price}")
-            if dynadot_price is not None:
-                try:
-                    domain_result["providers"]["dynadot"] = (
-                        float(dynadot_price) * 1000000
-                    )  # Convert to same format as GoDaddy
-                    logger.info(f"Added Dynadot price from cache: {dynadot_price}")
-                except (ValueError, TypeError) as e:
-                    logger.error(f"Failed to convert Dynadot price {dynadot_price} to float: {str(e)}")
-            else:
-                logger.warning(f"Dynadot price for .{extension} is None")
-
-        # Add Namesilo price if available
-        if extension in NAMESILO_PRICING and "error" not in NAMESILO_PRICING:
-            logger.info(f"Found Namesilo pricing for extension .{extension}")
-            namesilo_price = NAMESILO_PRICING.get(extension, {}).get("registration")
-            logger.info(f"Namesilo price for .{extension}: {namesilo_price}")
-
-            if namesilo_price and namesilo_price != "N/A":
-                namesilo_price_converted = (
-                    float(namesilo_price) * 1000000
-                )  # Convert to same format as GoDaddy
-                domain_result["providers"]["namesilo"] = namesilo_price_converted
-                logger.info(
-                    f"Added Namesilo price: {namesilo_price} (converted: {namesilo_price_converted/1000000:.2f})"
-                )
+        domain_result = _fall_back_to_dynadot(full_domain, domain_result, dynadot_result)
+        
+        # Provider prices come from the price matrix, missing TLD pricing is
+        # only fetched for domains that can be bought
+        matrix = price_matrix.current()
+        if domain_result.get("available", False):
+            matrix = await price_matrix.ensure_prices([extension])
+        _add_provider_prices(domain_result, extension, dynadot_result, matrix)
 
         # Log the full providers object
         logger.info(f"Final providers object: {domain_result.get('providers', {})}")
@@ -327,14 +517,12 @@ async def check_domain_availability(
         # Send email notification if domain is available and email is provided
         if is_available and notify_email and price_info:
             try:
-                await send_domain_availability_email(
-                    notify_email, full_domain, price_info
-                )
+                await enqueue_domain_availability_email(notify_email, full_domain, price_info)
                 logger.info(
-                    f"Sent availability notification for {full_domain} to {notify_email}"
+                    f"Queued availability notification for {full_domain} to {notify_email}"
                 )
             except Exception as email_error:
-                logger.error(f"Failed to send email notification: {str(email_error)}")
+                logger.error(f"Failed to queue email notification: {str(email_error)}")
 
         return is_available, price_info
 
@@ -343,31 +531,47 @@ async def check_domain_availability(
         return False, None
 
 
-async def check_multiple_domains(domains: List[str]) -> Dict[str, Dict]:
+async def check_multiple_domains(domains: List[str], use_cache: bool = True) -> Dict[str, Dict]:
     """
     Check availability for multiple domains using GoDaddy's API.
     This handles batch requests and provides comprehensive information about each domain.
 
+    Domains are checked and cached by their canonical form, so spellings of
+    the same domain (case, trailing dot, Unicode vs punycode) share one check.
+
     Args:
         domains: List of full domain names to check (e.g. ["example.com", "example.net"])
+        use_cache: False to ask the providers even for cached domains
 
     Returns:
-        Dictionary mapping domain names to their availability info
+        Dictionary mapping domain names, as passed in, to their availability info
     """
+    canonical = {}
+    results = {}
+    for domain in domains:
+        try:
+            canonical[domain] = canonical_domain(domain)
+        except InvalidDomain as e:
+            logger.warning(str(e))
+            results[domain] = {"available": False, "price_info": None, "error": "Invalid domain name"}
+
+    checked = await _check_canonical_domains(list(dict.fromkeys(canonical.values())), use_cache)
+    for domain, key in canonical.items():
+        if key in checked:
+            results[domain] = checked[key]
+    return results
+
+
+async def _check_canonical_domains(domains: List[str], use_cache: bool) -> Dict[str, Dict]:
     if not domains:
         return {}
 
-    global PORKBUN_PRICING, DYNADOT_PRICING, NAMESILO_PRICING
-
     # Extract unique extensions from the domains to check
     extensions_to_check = set()
     for domain in domains:
-        if "." in domain:
-            extension = domain.split(".")[-1]
-            extensions_to_check.add(extension)
+        extensions_to_check.add(split_domain(domain)[1])
     
     logger.info(f"Checking domains with extensions: {extensions_to_check}")
-    logger.debug(f"Current DYNADOT_PRICING state: {DYNADOT_PRICING}")
 
     # Collect results here
     results = {}
@@ -375,7 +579,7 @@ async def check_multiple_domains(domains: List[str]) -> Dict[str, Dict]:
     # Check cache first for all domains
     uncached_domains = []
     for domain in domains:
-        cached_result = get_from_cache(domain)
+        cached_result = get_from_cache(domain) if use_cache else None
         if cached_result:
             logger.debug(f"Cache hit for {domain}")
             results[domain] = cached_result
@@ -414,94 +618,48 @@ async def check_multiple_domains(domains: List[str]) -> Dict[str, Dict]:
         # All uncached results will be stored here
         uncached_results = {}
 
-        # Ensure we have the pricing data from providers, but only for extensions we need
-        pricing_tasks = []
-        
-        # Check if we need Porkbun pricing
-        if not PORKBUN_PRICING:
-            logger.info(f"Fetching all Porkbun pricing")
-            pricing_tasks.append(get_porkbun_pricing())
-            
-        # Check if we need Dynadot pricing for specific extensions
-        dynadot_extensions_needed = [ext for ext in extensions_to_check 
-                                 if ext not in DYNADOT_PRICING or "error" in DYNADOT_PRICING]
-        if dynadot_extensions_needed:
-            logger.info(f"Fetching Dynadot pricing only for extensions: {dynadot_extensions_needed}")
-            pricing_tasks.append(get_dynadot_pricing(dynadot_extensions_needed))
-        else:
-            logger.info("Using cached Dynadot pricing")
-            
-        # Check if we need Namesilo pricing for specific extensions
-        namesilo_extensions_needed = [ext for ext in extensions_to_check 
-                                  if not NAMESILO_PRICING or ext not in NAMESILO_PRICING]
-        if namesilo_extensions_needed:
-            logger.info(f"Fetching Namesilo pricing only for extensions: {namesilo_extensions_needed}")
-            pricing_tasks.append(get_namesilo_pricing(namesilo_extensions_needed))
+        # Fetch pricing missing from the price matrix while the domains are checked
+        pricing_task = asyncio.create_task(price_matrix.ensure_prices(extensions_to_check))
+
+        if HEDGED_AVAILABILITY_CHECKS:
+            # One answer per domain from whichever provider is faster, the
+            # missing Dynadot price falls back to cached TLD pricing below
+            hedged_results = await asyncio.gather(
+                *(hedged_availability_check(domain, headers, session) for domain in uncached_domains),
+                return_exceptions=True,
+            )
+            godaddy_results = [
+                result if isinstance(result, Exception) else result[0] for result in hedged_results
+            ]
+            dynadot_results = [
+                result if isinstance(result, Exception) else result[1] for result in hedged_results
+            ]
         else:
-            logger.info("Using cached Namesilo pricing")
-            
-        # Launch pricing fetching in the background
-        pricing_future = asyncio.gather(*pricing_tasks, return_exceptions=True) if pricing_tasks else None
-        
-        # We'll check all domains with GoDaddy and create direct Dynadot check tasks
-        godaddy_tasks = []
-        dynadot_tasks = []
-        domain_to_index = {}
-        
-        for i, domain in enumerate(uncached_domains):
-            # GoDaddy domain check
-            godaddy_task = asyncio.create_task(check_single_domain(domain, headers, session))
-            godaddy_tasks.append(godaddy_task)
-            
-            # Dynadot domain check
-            dynadot_task = asyncio.create_task(check_dynadot_domain(domain))
-            dynadot_tasks.append(dynadot_task)
-            
-            # Map domain to its index for later processing
-            domain_to_index[domain] = i
-            
-        # Wait for all GoDaddy tasks to complete
-        godaddy_results = await asyncio.gather(*godaddy_tasks, return_exceptions=True)
-        
-        # Wait for all Dynadot tasks to complete
-        dynadot_results = await asyncio.gather(*dynadot_tasks, return_exceptions=True)
-        
-        # Wait for pricing data if it was fetched
-        if pricing_future:
-            pricing_results = await pricing_future
-            
-            # Process pricing results
-            pricing_index = 0
-            
-            # Process Porkbun results if needed
-            if not PORKBUN_PRICING or any(ext not in PORKBUN_PRICING for ext in extensions_to_check):
-                result = pricing_results[pricing_index]
-                if not isinstance(result, Exception):
-                    PORKBUN_PRICING = result
-                pricing_index += 1
-
-            # Process Dynadot results if needed
-            if dynadot_extensions_needed:
-                result = pricing_results[pricing_index]
-                if result and not isinstance(result, Exception):
-                    # Update DYNADOT_PRICING with the new results
-                    if not DYNADOT_PRICING:
-                        DYNADOT_PRICING = result
-                    else:
-                        DYNADOT_PRICING.update(result)
-                    logger.debug(f"Updated DYNADOT_PRICING after bulk check: {DYNADOT_PRICING}")
-                pricing_index += 1
-
-            # Process Namesilo results if needed
-            if namesilo_extensions_needed:
-                result = pricing_results[pricing_index]
-                if result and not isinstance(result, Exception):
-                    # Update NAMESILO_PRICING with the new results
-                    if not NAMESILO_PRICING:
-                        NAMESILO_PRICING = result
-                    else:
-                        NAMESILO_PRICING.update(result)
+            # We'll check all domains with GoDaddy and create direct Dynadot check tasks
+            godaddy_tasks = []
+            dynadot_tasks = []
+
+            for domain in uncached_domains:
+                # GoDaddy domain check
+                godaddy_task = asyncio.create_task(check_single_domain(domain, headers, session))
+                godaddy_tasks.append(godaddy_task)
+
+                # Dynadot domain check
+                dynadot_task = asyncio.create_task(check_dynadot_domain(domain))
+                dynadot_tasks.append(dynadot_task)
+
+            # Wait for all GoDaddy tasks to complete
+            godaddy_results = await asyncio.gather(*godaddy_tasks, return_exceptions=True)
+
+            # Wait for all Dynadot tasks to complete
+            dynadot_results = await asyncio.gather(*dynadot_tasks, return_exceptions=True)
         
+        try:
+            matrix = await pricing_task
+        except Exception as e:
+            logger.error(f"Error fetching provider pricing: {str(e)}")
+            matrix = price_matrix.current()
+
         # Process domain results and combine with provider data
         for i, domain in enumerate(uncached_domains):
             # Process GoDaddy result
@@ -523,58 +681,13 @@ async def check_multiple_domains(domains: List[str]) -> Dict[str, Dict]:
                     "price": None,
                     "error": str(dynadot_result),
                 }
+
+            domain_result = _fall_back_to_dynadot(domain, domain_result, dynadot_result)
             
             # Add provider pricing if domain is available
             if domain_result.get("available", False):
-                # Extract extension from domain
-                parts = domain.split(".")
-                if len(parts) > 1:
-                    extension = parts[-1]
-                    
-                    # Initialize providers dict if not present
-                    if "providers" not in domain_result:
-                        domain_result["providers"] = {}
-                    
-                    # Add GoDaddy price
-                    godaddy_price = domain_result.get("price_info", {}).get("purchase", 0)
-                    domain_result["providers"]["godaddy"] = godaddy_price
-                    
-                    # Add Porkbun price if available
-                    if extension in PORKBUN_PRICING and "error" not in PORKBUN_PRICING:
-                        porkbun_price = PORKBUN_PRICING.get(extension, {}).get("registration")
-                        if porkbun_price:
-                            porkbun_price_converted = float(porkbun_price) * 1000000  # Convert to same format as GoDaddy
-                            domain_result["providers"]["porkbun"] = porkbun_price_converted
-                            logger.info(f"Added Porkbun price for {domain}: ${porkbun_price}")
-                    
-                    # Add Dynadot price - check direct result first then fallback to cached price
-                    if dynadot_result.get("available", False) and dynadot_result.get("price"):
-                        dynadot_price = dynadot_result.get("price")
-                        logger.info(f"Found Dynadot price for {domain}: {dynadot_price}")
-                        domain_result["providers"]["dynadot"] = float(dynadot_price) * 1000000
-                        logger.info(f"Added Dynadot price for {domain}: ${dynadot_price}")
-                    # Otherwise try to get it from cached TLD pricing
-                    elif extension in DYNADOT_PRICING and not isinstance(DYNADOT_PRICING.get(extension), dict):
-                        dynadot_price = DYNADOT_PRICING.get(extension)
-                        if dynadot_price is not None:
-                            try:
-                                price_float = float(dynadot_price)
-                                logger.info(f"Using cached Dynadot price for .{extension}: {price_float}")
-                                domain_result["providers"]["dynadot"] = price_float * 1000000
-                                logger.info(f"Added Dynadot price from cache for {domain}: ${price_float}")
-                            except (ValueError, TypeError) as e:
-                                logger.error(f"Failed to convert cached Dynadot price {dynadot_price} to float: {str(e)}")
-                        else:
-                            logger.warning(f"Cached Dynadot price for .{extension} is None")
-                    
-                    # Add Namesilo price if available
-                    if extension in NAMESILO_PRICING and "error" not in NAMESILO_PRICING:
-                        namesilo_price = NAMESILO_PRICING.get(extension, {}).get("registration")
-                        if namesilo_price and namesilo_price != "N/A":
-                            namesilo_price_converted = float(namesilo_price) * 1000000
-                            domain_result["providers"]["namesilo"] = namesilo_price_converted
-                            logger.info(f"Added Namesilo price for {domain}: ${namesilo_price}")
-            
+                _add_provider_prices(domain_result, split_domain(domain)[1], dynadot_result, matrix)
+
             # Store the result
             uncached_results[domain] = domain_result
             
@@ -614,45 +727,17 @@ async def check_domains_individually(
         headers: API request headers
         session: aiohttp ClientSession to use
     """
-    global PORKBUN_PRICING, DYNADOT_PRICING, NAMESILO_PRICING
-
     logger.info(f"Checking {len(domains)} domains individually")
 
     # Extract unique extensions from domains
     extensions_to_check = set()
     for domain in domains:
-        if "." in domain:
-            extensions_to_check.add(domain.split(".")[-1])
+        extensions_to_check.add(split_domain(domain)[1])
     
     logger.info(f"Extensions to check in individual mode: {extensions_to_check}")
 
-    # Fetch all pricing data needed concurrently
-    pricing_tasks = []
-    
-    # Check if we need Porkbun pricing
-    if not PORKBUN_PRICING:
-        pricing_tasks.append(get_porkbun_pricing())
-        
-    # Check if we need Dynadot pricing for specific extensions
-    dynadot_extensions_needed = [ext for ext in extensions_to_check 
-                               if ext not in DYNADOT_PRICING or "error" in DYNADOT_PRICING]
-    if dynadot_extensions_needed:
-        logger.info(f"Fetching Dynadot pricing only for extensions: {dynadot_extensions_needed}")
-        pricing_tasks.append(get_dynadot_pricing(dynadot_extensions_needed))
-    else:
-        logger.info("Using cached Dynadot pricing")
-        
-    # Check if we need Namesilo pricing for specific extensions
-    namesilo_extensions_needed = [ext for ext in extensions_to_check 
-                                if not NAMESILO_PRICING or ext not in NAMESILO_PRICING]
-    if namesilo_extensions_needed:
-        logger.info(f"Fetching Namesilo pricing only for extensions: {namesilo_extensions_needed}")
-        pricing_tasks.append(get_namesilo_pricing(namesilo_extensions_needed))
-    else:
-        logger.info("Using cached Namesilo pricing")
-
-    # Launch pricing fetching in the background
-    pricing_future = asyncio.gather(*pricing_tasks, return_exceptions=True) if pricing_tasks else None
+    # Fetch pricing missing from the price matrix while the domains are checked
+    pricing_task = asyncio.create_task(price_matrix.ensure_prices(extensions_to_check))
 
     # Create a task for each domain check and for Dynadot checks
     godaddy_tasks = []
@@ -675,45 +760,12 @@ async def check_domains_individually(
     # Wait for all Dynadot tasks to complete
     dynadot_results = await asyncio.gather(*dynadot_tasks, return_exceptions=True)
     
-    # Wait for pricing data if it was fetched
-    if pricing_future:
-        pricing_results = await pricing_future
-        
-        # Process pricing results
-        pricing_index = 0
-        if not PORKBUN_PRICING:
-            result = pricing_results[pricing_index]
-            if not isinstance(result, Exception):
-                PORKBUN_PRICING = result
-            pricing_index += 1
-
-        if dynadot_extensions_needed:
-            result = (
-                pricing_results[pricing_index]
-                if pricing_index < len(pricing_results)
-                else None
-            )
-            if result and not isinstance(result, Exception):
-                # Update DYNADOT_PRICING with the new results
-                if not DYNADOT_PRICING:
-                    DYNADOT_PRICING = result
-                else:
-                    DYNADOT_PRICING.update(result)
-            pricing_index += 1
-
-        if namesilo_extensions_needed:
-            result = (
-                pricing_results[pricing_index]
-                if pricing_index < len(pricing_results)
-                else None
-            )
-            if result and not isinstance(result, Exception):
-                # Update NAMESILO_PRICING with the new results
-                if not NAMESILO_PRICING:
-                    NAMESILO_PRICING = result
-                else:
-                    NAMESILO_PRICING.update(result)
-        
+    try:
+        matrix = await pricing_task
+    except Exception as e:
+        logger.error(f"Error fetching provider pricing: {str(e)}")
+        matrix = price_matrix.current()
+
     # Process domain results
     domain_results = {}
     for i, domain in enumerate(domains):
@@ -736,46 +788,14 @@ async def check_domains_individually(
                 "price": None,
                 "error": str(dynadot_result),
             }
+
+        domain_result = _fall_back_to_dynadot(domain, domain_result, dynadot_result)
         
         # Add provider pricing if domain is available
         if domain_result.get("available", False):
-            # Extract extension from domain
-            parts = domain.split(".")
-            if len(parts) > 1:
-                extension = parts[-1]
-
-                # Add provider prices
-                domain_result["providers"] = {}
-
-                # Add GoDaddy price
-                godaddy_price = domain_result.get("price_info", {}).get("purchase", 0)
-                domain_result["providers"]["godaddy"] = godaddy_price
-                
-                # Add Porkbun price if available
-                if extension in PORKBUN_PRICING and "error" not in PORKBUN_PRICING:
-                    porkbun_price = PORKBUN_PRICING.get(extension, {}).get("registration")
-                    if porkbun_price:
-                        domain_result["providers"]["porkbun"] = float(porkbun_price) * 1000000
-                        logger.info(f"Added Porkbun pricing for {domain}: ${porkbun_price}")
-                
-                # Add Dynadot price if available
-                if dynadot_result.get("available", False) and dynadot_result.get("price"):
-                    dynadot_price = dynadot_result.get("price")
-                    domain_result["providers"]["dynadot"] = float(dynadot_price) * 1000000
-                    logger.info(f"Added Dynadot pricing for {domain}: ${dynadot_price}")
-                elif extension in DYNADOT_PRICING and "error" not in DYNADOT_PRICING:
-                    dynadot_price = DYNADOT_PRICING.get(extension)
-                    if dynadot_price:
-                        domain_result["providers"]["dynadot"] = float(dynadot_price) * 1000000
-                        logger.info(f"Added Dynadot pricing from cache for {domain}: ${dynadot_price}")
-                
-                # Add Namesilo price if available
-                if extension in NAMESILO_PRICING and "error" not in NAMESILO_PRICING:
-                    namesilo_price = NAMESILO_PRICING.get(extension, {}).get("registration")
-                    if namesilo_price and namesilo_price != "N/A":
-                        domain_result["providers"]["namesilo"] = float(namesilo_price) * 1000000
-                        logger.info(f"Added Namesilo pricing for {domain}: ${namesilo_price}")
-        
+            domain_result["providers"] = {}
+            _add_provider_prices(domain_result, split_domain(domain)[1], dynadot_result, matrix)
+
         # Store the result
         domain_results[domain] = domain_result
         
@@ -802,7 +822,7 @@ async def check_single_domain(
     """
     try:
         # For single domain checks, we use a GET request with the domain as a query parameter
-        async with session.get(
+        async with godaddy_scheduler.slot() as call, session.get(
             GODADDY_API_URL,
             params={"domain": domain, "checkType": "FAST"},
             headers=headers,
@@ -831,6 +851,7 @@ async def check_single_domain(
                     }
 
                 except json.JSONDecodeError as json_err:
+                    call.failed()
                     logger.error(f"JSON decode error for {domain}")
                     return {
                         "available": False,
@@ -840,6 +861,7 @@ async def check_single_domain(
 
             elif response.status == 429:
                 logger.warning(f"Rate limit exceeded for domain {domain}")
+                godaddy_scheduler.throttled(retry_after_seconds(response.headers))
                 return {
                     "available": False,
                     "price_info": None,
@@ -847,6 +869,8 @@ async def check_single_domain(
                 }
 
             else:
+                if response.status >= 500:
+                    call.failed()
                 logger.error(f"API error for {domain}: {response.status}")
                 return {
                     "available": False,
@@ -854,6 +878,20 @@ async def check_single_domain(
                     "error": f"API error: {response.status}",
                 }
 
+    except CircuitOpen as e:
+        logger.warning(f"Skipping GoDaddy check for {domain}: {str(e)}")
+        return {
+            "available": False,
+            "price_info": None,
+            "error": "Provider unavailable",
+        }
+    except RegistrarBusy as e:
+        logger.warning(f"Skipping GoDaddy check for {domain}: {str(e)}")
+        return {
+            "available": False,
+            "price_info": None,
+            "error": "Provider busy",
+        }
     except Exception as e:
         logger.error(f"Error checking domain {domain}")
         return {
@@ -863,6 +901,92 @@ async def check_single_domain(
         }
 
 
+def _not_checked() -> Dict:
+    return {"available": False, "price_info": None, "price": None, "error": "Not checked"}
+
+
+def _forget_straggler(task: asyncio.Task) -> None:
+    _hedge_stragglers.discard(task)
+    if not task.cancelled():
+        task.exception()  # Already handled by the check functions
+
+
+async def hedged_availability_check(
+    domain: str, headers: Dict, session: aiohttp.ClientSession
+) -> Tuple[Dict, Dict]:
+    """
+    Ask GoDaddy and Dynadot whether a domain is available, taking the first
+    answer instead of waiting for both.
+
+    The healthy provider with the most quota headroom and the lowest latency
+    EWMA is asked first. The other one is asked as well if the first fails
+    or is still pending after its p95 latency.
+
+    Args:
+        domain: Domain to check
+        headers: GoDaddy API request headers
+        session: aiohttp ClientSession to use for GoDaddy
+
+    Returns:
+        Tuple of (GoDaddy result, Dynadot result). A provider that wasn't
+        asked, or hadn't answered when the other did, gets a "Not checked"
+        error result.
+    """
+    if not DYNADOT_API_KEY:
+        return await check_single_domain(domain, headers, session), _not_checked()
+
+    checks = {
+        "godaddy": (godaddy_scheduler, lambda: check_single_domain(domain, headers, session)),
+        "dynadot": (dynadot_scheduler, lambda: check_dynadot_domain(domain)),
+    }
+    # Unhealthy providers last, then the one with more quota left, then
+    # fastest first. Without history a provider counts as fast so it gets
+    # measured.
+    order = sorted(
+        checks,
+        key=lambda name: (
+            not checks[name][0].available(),
+            checks[name][0].quota.level(),
+            checks[name][0].breaker.latency_ewma or 0.0,
+        ),
+    )
+    results = {name: _not_checked() for name in checks}
+    primary, secondary = order
+
+    pending = {asyncio.create_task(checks[primary][1]()): primary}
+    try:
+        hedge_delay = checks[primary][0].breaker.latency_percentile(HEDGE_PERCENTILE) or HEDGE_DEFAULT_DELAY
+        done, _ = await asyncio.wait(pending, timeout=hedge_delay)
+
+        hedged = False
+        while True:
+            answered = False
+            for task in done:
+                provider = pending.pop(task)
+                try:
+                    results[provider] = task.result()
+                except Exception as e:
+                    results[provider] = {**_not_checked(), "error": str(e)}
+                answered = answered or not results[provider].get("error")
+            if answered:
+                break
+
+            # The first provider is slow or failed
+            if not hedged and checks[secondary][0].available():
+                logger.debug(f"Hedging availability check for {domain} with {secondary}")
+                pending[asyncio.create_task(checks[secondary][1]())] = secondary
+                hedged = True
+            if not pending:
+                break
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        # Losers, or everything if the caller went away
+        for task in pending:
+            _hedge_stragglers.add(task)
+            task.add_done_callback(_forget_straggler)
+    return results["godaddy"], results["dynadot"]
+
+
 async def cleanup_resources():
     """
     Cleanup function to be called when the application shuts down.
@@ -892,6 +1016,11 @@ async def preload_common_domains():
     """
     Preload common domains into the cache to improve performance
     """
+    with registrar_priority(Lane.BACKGROUND, owner="preload"):
+        await _preload_common_domains()
+
+
+async def _preload_common_domains():
     logger.info("Preloading common domains into cache")
 
     # Create headers for API requests
@@ -1,10 +1,12 @@
 import os
 import json
 import logging
+import asyncio
 import aiohttp
-from typing import Tuple, Dict, Optional
+from typing import Tuple, Dict, Optional, List
 from dotenv import load_dotenv
 import ssl
+from .registrar_scheduler import godaddy_scheduler, retry_after_seconds
 
 # Load environment variables
 load_dotenv()
@@ -16,7 +18,91 @@ GODADDY_API_KEY = os.getenv("GODADDY_API_KEY")
 GODADDY_API_SECRET = os.getenv("GODADDY_API_SECRET")
 GODADDY_API_URL = "https://api.ote-godaddy.com/v1/domains/available"
 
-async def check_domain_availability(domain_name: str, extension: str) -> Tuple[bool, Optional[Dict]]:
+# Bulk checking settings
+# GoDaddy accepts up to 500 domains per POST, smaller chunks keep responses fast
+BULK_CHUNK_SIZE = 100
+BULK_CONCURRENCY = 4
+
+
+def _create_ssl_context() -> ssl.SSLContext:
+    # Create SSL context to handle verification issues
+    ssl_context = ssl.create_default_context()
+    ssl_context.check_hostname = False
+    ssl_context.verify_mode = ssl.CERT_NONE
+    return ssl_context
+
+
+def _godaddy_headers() -> Dict:
+    return {
+        "Authorization": f"sso-key {GODADDY_API_KEY}:{GODADDY_API_SECRET}",
+        "Content-Type": "application/json",
+        "Accept": "application/json",
+    }
+
+
+def _price_info_from_result(data: Dict) -> Dict:
+    purchase_price = data.get("price", 0) / 1000000  # Convert from microdollars
+    return {
+        "purchase": purchase_price,
+        "renewal": purchase_price  # Using same price for renewal for simplicity
+    }
+
+
+async def _query_godaddy(
+    session: aiohttp.ClientSession, full_domain: str
+) -> Tuple[bool, Optional[Dict]]:
+    """Run a single GoDaddy availability request on the given session."""
+    # Set up headers for GoDaddy API
+    headers = _godaddy_headers()
+
+    # Make the API request
+    logger.debug(f"Making API request to GoDaddy for domain: {full_domain}")
+    async with godaddy_scheduler.slot() as call, session.get(
+        GODADDY_API_URL,
+        params={"domain": full_domain, "checkType": "FAST"},
+        headers=headers,
+        timeout=10
+    ) as response:
+        if response.status == 200:
+            response_text = await response.text()
+
+            try:
+                data = json.loads(response_text)
+
+                # Extract availability and price information
+                is_available = data.get("available", False)
+
+                if is_available:
+                    # Format price information in a simple way
+                    price_info = _price_info_from_result(data)
+
+                    logger.info(f"Domain {full_domain} is available for ${price_info['purchase']:.2f}")
+                    return True, price_info
+                else:
+                    logger.info(f"Domain {full_domain} is not available")
+                    return False, None
+
+            except json.JSONDecodeError:
+                logger.error(f"Invalid JSON response from GoDaddy API for {full_domain}")
+                return False, None
+
+        elif response.status == 429:
+            logger.warning(f"Rate limit exceeded for GoDaddy API when checking {full_domain}")
+            godaddy_scheduler.throttled(retry_after_seconds(response.headers))
+            return False, None
+
+        else:
+            if response.status >= 500:
+                call.failed()
+            logger.error(f"GoDaddy API error for {full_domain}: Status {response.status}")
+            return False, None
+
+
+async def check_domain_availability(
+    domain_name: str,
+    extension: str,
+    session: Optional[aiohttp.ClientSession] = None,
+) -> Tuple[bool, Optional[Dict]]:
     """
     Simplified domain availability checker that only uses GoDaddy API.
     Returns a tuple of (is_available, price_info)
@@ -24,6 +110,7 @@ async def check_domain_availability(domain_name: str, extension: str) -> Tuple[b
     Args:
         domain_name: The domain name (without extension)
         extension: The domain extension (e.g., 'com', 'net')
+        session: Optional session to reuse instead of opening a new one
         
     Returns:
         Tuple[bool, Optional[Dict]]: A tuple containing availability status and price info
@@ -36,63 +123,116 @@ async def check_domain_availability(domain_name: str, extension: str) -> Tuple[b
             logger.error("GoDaddy API credentials not configured")
             return False, None
         
-        # Create SSL context to handle verification issues
-        ssl_context = ssl.create_default_context()
-        ssl_context.check_hostname = False
-        ssl_context.verify_mode = ssl.CERT_NONE
-        
+        # Reuse the caller's session (e.g. pre-warmed keep-alive connections)
+        if session is not None:
+            return await _query_godaddy(session, full_domain)
+
         # Create aiohttp session
-        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=ssl_context)) as session:
-            # Set up headers for GoDaddy API
-            headers = {
-                "Authorization": f"sso-key {GODADDY_API_KEY}:{GODADDY_API_SECRET}",
-                "Content-Type": "application/json",
-                "Accept": "application/json",
-            }
-            
-            # Make the API request
-            logger.debug(f"Making API request to GoDaddy for domain: {full_domain}")
-            async with session.get(
-                GODADDY_API_URL,
-                params={"domain": full_domain, "checkType": "FAST"},
-                headers=headers,
-                timeout=10
-            ) as response:
-                if response.status == 200:
-                    response_text = await response.text()
-                    
-                    try:
-                        data = json.loads(response_text)
-                        
-                        # Extract availability and price information
-                        is_available = data.get("available", False)
-                        
-                        if is_available:
-                            # Format price information in a simple way
-                            purchase_price = data.get("price", 0) / 1000000  # Convert from microdollars
-                            price_info = {
-                                "purchase": purchase_price,
-                                "renewal": purchase_price  # Using same price for renewal for simplicity
-                            }
-                            
-                            logger.info(f"Domain {full_domain} is available for ${purchase_price:.2f}")
-                            return True, price_info
-                        else:
-                            logger.info(f"Domain {full_domain} is not available")
-                            return False, None
-                    
-                    except json.JSONDecodeError:
-                        logger.error(f"Invalid JSON response from GoDaddy API for {full_domain}")
-                        return False, None
-                
-                elif response.status == 429:
-                    logger.warning(f"Rate limit exceeded for GoDaddy API when checking {full_domain}")
-                    return False, None
-                
-                else:
-                    logger.error(f"GoDaddy API error for {full_domain}: Status {response.status}")
-                    return False, None
+        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=_create_ssl_context())) as session:
+            return await _query_godaddy(session, full_domain)
     
     except Exception as e:
         logger.error(f"Error checking domain {full_domain}: {str(e)}")
-        return False, None 
\ No newline at end of file
+        return False, None
+
+
+async def _check_bulk_chunk(
+    session: aiohttp.ClientSession, domains: List[str]
+) -> Dict[str, Tuple[bool, Optional[Dict]]]:
+    """
+    Check one chunk of domains with a single GoDaddy bulk POST request.
+    Domains missing from the response are left out of the returned mapping.
+    """
+    results = {}
+    async with godaddy_scheduler.slot(measure_latency=False) as call, session.post(
+        GODADDY_API_URL,
+        params={"checkType": "FAST"},
+        json=domains,
+        headers=_godaddy_headers(),
+        timeout=30,
+    ) as response:
+        if response.status == 429:
+            godaddy_scheduler.throttled(retry_after_seconds(response.headers))
+        elif response.status >= 500:
+            call.failed()
+        # 203 means some domains were checked and some returned errors
+        if response.status not in (200, 203):
+            logger.error(f"GoDaddy bulk API error for {len(domains)} domains: Status {response.status}")
+            return results
+
+        data = await response.json(content_type=None)
+        for entry in data.get("domains", []):
+            domain = entry.get("domain", "").lower()
+            if entry.get("available", False):
+                results[domain] = (True, _price_info_from_result(entry))
+            else:
+                results[domain] = (False, None)
+
+        for error in data.get("errors", []):
+            logger.warning(f"GoDaddy bulk check error for {error.get('domain')}: {error.get('message')}")
+
+    return results
+
+
+async def check_domains_availability(
+    domains: List[str],
+) -> Dict[str, Tuple[bool, Optional[Dict]]]:
+    """
+    Check many domains at once using GoDaddy's bulk endpoint.
+
+    Domains are deduplicated, split into chunks of BULK_CHUNK_SIZE and checked
+    concurrently over one session. Any domain the bulk call could not answer is
+    retried with check_domain_availability.
+
+    Args:
+        domains: Full domain names (e.g. ["example.com", "example.net"])
+
+    Returns:
+        Dict mapping each lowercased domain to (is_available, price_info)
+    """
+    unique_domains = list(dict.fromkeys(domain.lower() for domain in domains))
+    if not unique_domains:
+        return {}
+
+    if not GODADDY_API_KEY or not GODADDY_API_SECRET:
+        logger.error("GoDaddy API credentials not configured")
+        return {domain: (False, None) for domain in unique_domains}
+
+    logger.info(f"Bulk checking availability for {len(unique_domains)} domains")
+    semaphore = asyncio.Semaphore(BULK_CONCURRENCY)
+    results = {}
+
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=_create_ssl_context())) as session:
+
+        async def run_chunk(chunk):
+            async with semaphore:
+                try:
+                    return await _check_bulk_chunk(session, chunk)
+                except Exception as e:
+                    logger.error(f"Error bulk checking {len(chunk)} domains: {str(e)}")
+                    return {}
+
+        chunks = [
+            unique_domains[i : i + BULK_CHUNK_SIZE]
+            for i in range(0, len(unique_domains), BULK_CHUNK_SIZE)
+        ]
+        for chunk_results in await asyncio.gather(*(run_chunk(chunk) for chunk in chunks)):
+            results.update(chunk_results)
+
+    # Fall back to single checks for anything the bulk endpoint didn't answer
+    missing = [domain for domain in unique_domains if domain not in results]
+    if missing and not godaddy_scheduler.available():
+        # GoDaddy is down or out of budget, leave them unanswered so callers retry later
+        logger.warning(f"GoDaddy unavailable, {len(missing)} domains left unchecked")
+    elif missing:
+        logger.info(f"Falling back to single checks for {len(missing)} domains")
+
+        async def run_single(domain):
+            async with semaphore:
+                name, _, extension = domain.partition(".")
+                return domain, await check_domain_availability(name, extension)
+
+        for domain, result in await asyncio.gather(*(run_single(domain) for domain in missing)):
+            results[domain] = result
+
+    return results
@@ -1,5 +1,4 @@
 import openai
-import whois
 import requests
 import aiohttp
 import asyncio
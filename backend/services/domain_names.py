@@ -0,0 +1,103 @@
+# Canonical form of domain names. Names arrive from LLM output, URLs and
+# forms in any case and script, so "BrandName.com", "brandname.com." and
+# "Bücher.de" vs "xn--bcher-kva.de" would otherwise be different cache keys
+# and different provider calls. Everything that keys on or checks a domain
+# goes through canonical_domain() first: case folded, IDNA (UTS #46) mapped
+# and converted to punycode, which is also the form the registrar APIs take.
+#
+# Suffixes are matched against a bundled list of multi-label public
+# suffixes instead of the full Public Suffix List, which would need a
+# download. It covers the suffixes registrars sell; anything else is
+# treated as a single-label TLD.
+
+from functools import lru_cache
+from typing import Tuple
+
+import idna
+
+# Multi-label public suffixes registrars sell second-level domains under
+MULTI_LABEL_SUFFIXES = frozenset(
+    {
+        "co.uk", "org.uk", "me.uk", "ltd.uk", "plc.uk", "net.uk",
+        "com.au", "net.au", "org.au", "id.au",
+        "co.nz", "net.nz", "org.nz",
+        "co.za", "org.za", "web.za",
+        "co.jp", "ne.jp", "or.jp",
+        "co.kr", "or.kr",
+        "co.in", "net.in", "org.in", "firm.in", "gen.in", "ind.in",
+        "com.br", "net.br", "org.br",
+        "com.mx", "org.mx",
+        "com.ar", "com.co", "net.co", "nom.co",
+        "com.cn", "net.cn", "org.cn",
+        "com.hk", "com.tw", "com.sg", "com.my", "com.ph", "com.vn",
+        "com.tr", "com.ua", "com.pl", "com.es", "com.pt",
+        "co.il", "co.id", "co.th",
+    }
+)
+
+
+class InvalidDomain(ValueError):
+    """The name can't be turned into a valid domain name."""
+
+
+@lru_cache(maxsize=65536)
+def canonical_domain(domain: str) -> str:
+    """
+    Canonical form of a domain name, used as cache and lookup key.
+
+    Args:
+        domain: Domain name as entered, e.g. "BrandName.com" or "Bücher.de"
+
+    Returns:
+        Lowercase ASCII name with IDN labels in punycode, e.g.
+        "brandname.com" or "xn--bcher-kva.de"
+
+    Raises:
+        InvalidDomain: Empty labels, invalid characters or too long
+    """
+    name = domain.strip().rstrip(".")
+    if not name:
+        raise InvalidDomain(f"Invalid domain name: {domain!r}")
+    if name.isascii():
+        name = name.lower()
+    try:
+        # UTS #46 mapping also folds case and full-width characters
+        canonical = idna.encode(name, uts46=True).decode("ascii")
+    except idna.IDNAError as e:
+        raise InvalidDomain(f"Invalid domain name {domain!r}: {str(e)}") from e
+    if "." not in canonical:
+        raise InvalidDomain(f"Domain name has no extension: {domain!r}")
+    return canonical
+
+
+def join_domain(name: str, extension: str) -> str:
+    """Canonical domain for a name and an extension, e.g. ("Brand", ".CO.UK")."""
+    return canonical_domain(f"{name.strip().rstrip('.')}.{extension.strip().lstrip('.')}")
+
+
+def split_domain(domain: str) -> Tuple[str, str]:
+    """
+    Split a domain into its registrable label and public suffix.
+
+    Args:
+        domain: Domain name in any form canonical_domain() accepts
+
+    Returns:
+        Tuple of (name, extension) in canonical form, e.g.
+        "www.Brand.co.uk" -> ("brand", "co.uk")
+
+    Raises:
+        InvalidDomain: The name isn't a valid domain name
+    """
+    labels = canonical_domain(domain).split(".")
+    if len(labels) > 2 and ".".join(labels[-2:]) in MULTI_LABEL_SUFFIXES:
+        return labels[-3], ".".join(labels[-2:])
+    return labels[-2], labels[-1]
+
+
+def display_domain(domain: str) -> str:
+    """Unicode form of a canonical domain, for showing to users."""
+    try:
+        return idna.decode(domain)
+    except idna.IDNAError:
+        return domain
@@ -0,0 +1,169 @@
+import os
+import asyncio
+import logging
+from datetime import timedelta
+from typing import Awaitable, Callable, Dict, Optional
+
+import aiohttp
+
+from .domain_checker_forEmail import (
+    check_domain_availability,
+    GODADDY_API_URL,
+    _create_ssl_context,
+)
+from .registrar_scheduler import Lane, godaddy_scheduler, registrar_priority
+
+logger = logging.getLogger(__name__)
+
+# Drop-watch polling settings
+DROP_WATCH_POLL_SECONDS = float(os.getenv("DROP_WATCH_POLL_SECONDS", "5"))
+DROP_WATCH_CALL_BUDGET = int(os.getenv("DROP_WATCH_CALL_BUDGET", "2000"))
+DROP_WATCH_MAX_DOMAINS = int(os.getenv("DROP_WATCH_MAX_DOMAINS", "20"))
+
+# Pending delete lasts 5 days, burst polling starts this long before the
+# estimated drop time
+PENDING_DELETE_PERIOD = timedelta(days=5)
+DROP_WATCH_LEAD = timedelta(hours=2)
+
+# Keep-alive must outlive the poll interval so connections stay warm
+DROP_WATCH_KEEPALIVE_SECONDS = 60
+
+# Called as on_drop(domain, price_info) the moment a domain becomes available
+DropCallback = Callable[[str, Optional[Dict]], Awaitable[None]]
+
+# Called as is_wanted(domain) before every poll, False stops the poller
+WantedCheck = Callable[[str], Awaitable[bool]]
+
+# A drop is over within seconds, so polls queue ahead of background sweeps
+DROP_WATCH_LANE = Lane.ON_DEMAND
+
+
+class DropWatcher:
+    """
+    High-frequency poller for drop-watched domains in pending delete.
+
+    Every domain gets its own polling task on a dedicated keep-alive session
+    that is warmed up before the first poll. Checks go straight to the
+    provider, never through the availability cache, and each domain has a
+    hard call budget shared across all of its polling runs. Before every
+    poll the is_wanted callback confirms someone still drop-watches the
+    domain, otherwise the poller stops.
+    """
+
+    def __init__(
+        self,
+        on_drop: DropCallback,
+        is_wanted: Optional[WantedCheck] = None,
+        poll_seconds: float = DROP_WATCH_POLL_SECONDS,
+        call_budget: int = DROP_WATCH_CALL_BUDGET,
+        max_domains: int = DROP_WATCH_MAX_DOMAINS,
+    ):
+        self.on_drop = on_drop
+        self.is_wanted = is_wanted
+        self.poll_seconds = poll_seconds
+        self.call_budget = call_budget
+        self.max_domains = max_domains
+        self.calls_used: Dict[str, int] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def active_domains(self):
+        return set(self._tasks)
+
+    def remaining_budget(self, domain: str) -> int:
+        return self.call_budget - self.calls_used.get(domain, 0)
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    ssl=_create_ssl_context(),
+                    limit=self.max_domains,
+                    keepalive_timeout=DROP_WATCH_KEEPALIVE_SECONDS,
+                ),
+                timeout=aiohttp.ClientTimeout(total=5),
+            )
+        return self._session
+
+    async def _warm_up(self, session: aiohttp.ClientSession) -> None:
+        # Open the TLS connection ahead of the first real poll
+        try:
+            async with session.head(GODADDY_API_URL) as response:
+                await response.release()
+        except Exception as e:
+            logger.debug(f"Drop-watch warm-up request failed: {str(e)}")
+
+    def start(self, domain: str, calls_used: int = 0) -> bool:
+        """
+        Start burst polling a domain unless it is already polling, out of
+        budget, or the watcher is at capacity. Returns True if polling started.
+        """
+        if domain in self._tasks:
+            return False
+        self.calls_used[domain] = max(self.calls_used.get(domain, 0), calls_used)
+        if self.remaining_budget(domain) <= 0:
+            return False
+        if len(self._tasks) >= self.max_domains:
+            logger.warning(f"Drop watcher at capacity, not polling {domain}")
+            return False
+
+        self._tasks[domain] = asyncio.create_task(self._poll(domain))
+        logger.info(
+            f"Started drop-watch polling for {domain} ({self.remaining_budget(domain)} calls left)"
+        )
+        return True
+
+    def stop(self, domain: str) -> None:
+        task = self._tasks.pop(domain, None)
+        if task:
+            task.cancel()
+            logger.info(f"Stopped drop-watch polling for {domain}")
+
+    def retain(self, domains) -> None:
+        """Stop polling every active domain not in domains."""
+        for domain in self.active_domains - set(domains):
+            self.stop(domain)
+
+    async def _poll(self, domain: str) -> None:
+        name, _, extension = domain.partition(".")
+        try:
+            with registrar_priority(DROP_WATCH_LANE, owner="drop_watcher"):
+                session = await self._get_session()
+                await self._warm_up(session)
+
+                while self.remaining_budget(domain) > 0:
+                    if self.is_wanted and not await self.is_wanted(domain):
+                        logger.info(f"Drop-watch no longer wanted for {domain}, stopping")
+                        return
+                    if not godaddy_scheduler.available():
+                        # GoDaddy is down or out of budget, wait without spending the call budget
+                        await asyncio.sleep(self.poll_seconds)
+                        continue
+                    self.calls_used[domain] = self.calls_used.get(domain, 0) + 1
+                    is_available, price_info = await check_domain_availability(
+                        name, extension, session=session
+                    )
+                    if is_available:
+                        logger.info(
+                            f"Drop-watch caught {domain} after {self.calls_used[domain]} calls"
+                        )
+                        await self.on_drop(domain, price_info)
+                        return
+                    await asyncio.sleep(self.poll_seconds)
+
+                logger.info(f"Drop-watch call budget exhausted for {domain}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error in drop-watch polling for {domain}: {str(e)}")
+        finally:
+            if self._tasks.get(domain) is asyncio.current_task():
+                self._tasks.pop(domain, None)
+
+    async def close(self) -> None:
+        for domain in list(self._tasks):
+            self.stop(domain)
+        if self._session and not self._session.closed:
+            await self._session.close()
+            self._session = None
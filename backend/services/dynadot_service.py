@@ -6,6 +6,7 @@ import asyncio
 import time
 import re
 from typing import Dict, List, Optional
+from .registrar_scheduler import dynadot_scheduler, CircuitOpen, RegistrarBusy
 
 logger = logging.getLogger(__name__)
 
@@ -129,7 +130,7 @@ async def get_dynadot_pricing(requested_tlds=None) -> Dict:
 
                 try:
                     logger.debug(f"Sending request to Dynadot API for .{tld} pricing")
-                    async with session.get(
+                    async with dynadot_scheduler.slot() as call, session.get(
                         DYNADOT_API_URL, params=params, timeout=10
                     ) as response:
                         if response.status == 200:
@@ -176,14 +177,20 @@ async def get_dynadot_pricing(requested_tlds=None) -> Dict:
                                 logger.error(
                                     f"JSON decode error for .{tld}: {str(json_err)}"
                                 )
+                        elif response.status == 429:
+                            dynadot_scheduler.throttled(3)
+                            logger.warning(f"Rate limited fetching Dynadot pricing for .{tld}")
                         else:
+                            if response.status >= 500:
+                                call.failed()
                             logger.error(
                                 f"Dynadot API error for .{tld}: {response.status}"
                             )
 
-                        # Add a small delay to avoid rate limiting
-                        await asyncio.sleep(DELAY_BETWEEN_REQUESTS)
-
+                except CircuitOpen as e:
+                    # The remaining TLDs would fail the same way
+                    logger.warning(f"Stopping Dynadot pricing refresh: {str(e)}")
+                    break
                 except Exception as e:
                     logger.error(f"Error fetching Dynadot pricing for .{tld}: {str(e)}")
 
@@ -231,7 +238,7 @@ async def check_dynadot_domain(domain: str, retries: int = 0) -> Dict:
     }
 
     try:
-        async with aiohttp.ClientSession() as session:
+        async with dynadot_scheduler.slot() as call, aiohttp.ClientSession() as session:
             logger.debug(f"Sending request to Dynadot API for domain: {domain}")
             async with session.get(
                 DYNADOT_API_URL, params=params, timeout=10
@@ -268,6 +275,7 @@ async def check_dynadot_domain(domain: str, retries: int = 0) -> Dict:
                                 "error": "No response from API",
                             }
                     except json.JSONDecodeError as json_err:
+                        call.failed()
                         logger.error(f"JSON decode error for {domain}: {str(json_err)}")
                         return {
                             "available": False,
@@ -281,10 +289,12 @@ async def check_dynadot_domain(domain: str, retries: int = 0) -> Dict:
                     logger.warning(
                         f"Rate limited for {domain}. Retrying in 3 seconds..."
                     )
-                    await asyncio.sleep(3)
-                    return await check_dynadot_domain(domain, retries + 1)
+                    # Pauses every queued Dynadot request, not just this one
+                    dynadot_scheduler.throttled(3)
 
                 else:
+                    if response.status >= 500:
+                        call.failed()
                     logger.error(f"Dynadot API error for {domain}: {response.status}")
                     return {
                         "available": False,
@@ -292,9 +302,15 @@ async def check_dynadot_domain(domain: str, retries: int = 0) -> Dict:
                         "error": f"API error {response.status}",
                     }
 
+    except CircuitOpen as e:
+        logger.warning(f"Skipping Dynadot check for {domain}: {str(e)}")
+        return {"available": False, "price": None, "error": "Provider unavailable"}
+    except RegistrarBusy as e:
+        logger.warning(f"Skipping Dynadot check for {domain}: {str(e)}")
+        return {"available": False, "price": None, "error": "Provider busy"}
     except asyncio.TimeoutError:
         logger.error(f"Timeout error checking domain {domain}")
-        if retries < MAX_RETRIES:
+        if retries < MAX_RETRIES and dynadot_scheduler.available():
             logger.info(
                 f"Retrying domain {domain} after timeout (retry {retries+1}/{MAX_RETRIES})"
             )
@@ -303,7 +319,7 @@ async def check_dynadot_domain(domain: str, retries: int = 0) -> Dict:
         return {"available": False, "price": None, "error": "Request timed out"}
     except Exception as e:
         logger.error(f"Error checking domain {domain}: {str(e)}")
-        if retries < MAX_RETRIES:
+        if retries < MAX_RETRIES and dynadot_scheduler.available():
             logger.info(
                 f"Retrying domain {domain} after error (retry {retries+1}/{MAX_RETRIES})"
             )
@@ -311,6 +327,10 @@ async def check_dynadot_domain(domain: str, retries: int = 0) -> Dict:
             return await check_dynadot_domain(domain, retries + 1)
         return {"available": False, "price": None, "error": f"Request failed: {str(e)}"}
 
+    # Retried after the slot is released, the scheduler holds it back until
+    # the provider's pause is over
+    return await check_dynadot_domain(domain, retries + 1)
+
 
 async def check_dynadot_domains(domains: List[str]) -> Dict[str, Dict]:
     """
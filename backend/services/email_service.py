@@ -1,7 +1,17 @@
 import os
+import json
+import random
+import asyncio
 import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
 from mailersend import emails
 from dotenv import load_dotenv
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..database import AsyncSessionLocal
+from ..job_queue import job_handler
+from ..models import EmailOutbox, AlertHistory
 
 # Load environment variables
 load_dotenv()
@@ -15,6 +25,173 @@ SENDER_EMAIL = os.getenv("SENDER_EMAIL", "notifications@yourdomain.com")
 REPLY_TO_EMAIL = os.getenv("REPLY_TO_EMAIL", SENDER_EMAIL)
 REPLY_TO_NAME = os.getenv("REPLY_TO_NAME", SENDER_NAME)
 
+# Outbox sending
+# MailerSend accepts up to 500 messages per bulk request
+EMAIL_BATCH_SIZE = 500
+EMAIL_OUTBOX_POLL_SECONDS = float(os.getenv("EMAIL_OUTBOX_POLL_SECONDS", "5"))
+EMAIL_MAX_ATTEMPTS = 5
+EMAIL_RETRY_BASE_SECONDS = 60
+EMAIL_RETRY_MAX_SECONDS = 3600
+# Concurrent single sends when a bulk request is rejected
+EMAIL_SINGLE_SEND_CONCURRENCY = 5
+# Claimed emails are hidden from other senders this long, an email whose
+# sender died is sent again afterwards
+EMAIL_CLAIM_SECONDS = 300
+
+
+def _dollars(price) -> float:
+    # Convert price from GoDaddy format if needed (from integer in millionths to decimal)
+    if isinstance(price, int) and price > 1000:
+        return price / 1000000
+    return price or 0
+
+
+def _base_message(recipient_email: str, subject: str, html_content: str, text_content: str) -> Dict:
+    """Build a MailerSend message dict with the shared sender and reply-to."""
+    mailer = emails.NewEmail(MAILERSEND_API_KEY)
+    mail_body = {}
+
+    mail_from = {
+        "name": SENDER_NAME,
+        "email": SENDER_EMAIL,
+    }
+    recipients = [
+        {
+            "name": recipient_email.split('@')[0],  # Use part before @ as name
+            "email": recipient_email,
+        }
+    ]
+    reply_to = {
+        "name": REPLY_TO_NAME,
+        "email": REPLY_TO_EMAIL,
+    }
+
+    mailer.set_mail_from(mail_from, mail_body)
+    mailer.set_mail_to(recipients, mail_body)
+    mailer.set_subject(subject, mail_body)
+    mailer.set_html_content(html_content, mail_body)
+    mailer.set_plaintext_content(text_content, mail_body)
+    mailer.set_reply_to(reply_to, mail_body)
+    return mail_body
+
+
+def build_availability_message(recipient_email: str, domain_name: str, price_info: dict) -> Dict:
+    """Message telling a user one watched domain became available."""
+    purchase_price = _dollars(price_info.get('purchase', 0))
+    renewal_price = _dollars(price_info.get('renewal', 0))
+    logger.debug(f"Domain: {domain_name}, Prices: Purchase=${purchase_price:.2f}, Renewal=${renewal_price:.2f}")
+
+    html_content = f"""
+    <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto; padding: 20px; border: 1px solid #eee; border-radius: 10px; box-shadow: 0 2px 10px rgba(0,0,0,0.1);">
+        <h2 style="color: #4361ee;">Good news! The domain {domain_name} is now available!</h2>
+        <p>We've been monitoring this domain for you, and it's now available for registration.</p>
+
+        <div style="background-color: #f8f9fa; padding: 15px; border-radius: 5px; margin: 20px 0;">
+            <h3 style="margin-top: 0; color: #3a0ca3;">Price Information:</h3>
+            <ul>
+                <li><strong>Purchase Price:</strong> ${purchase_price:.2f}</li>
+                <li><strong>Renewal Price:</strong> ${renewal_price:.2f}</li>
+            </ul>
+        </div>
+        <a href="https://www.godaddy.com/domainsearch/find?domainToCheck={domain_name}"
+                                               target="_blank"
+                                               class="btn btn-sm btn-success flex-grow-1">Register Now</a>
+        <p>You can register this domain now before someone else does!</p>
+
+        <p>Best regards,<br>
+        Your Domain Watcher</p>
+    </div>
+    """
+
+    text_content = f"""
+    Good news! The domain {domain_name} is now available for registration.
+
+    Price Information:
+    - Purchase Price: ${purchase_price:.2f}
+    - Renewal Price: ${renewal_price:.2f}
+
+    You can register this domain now before someone else does!
+
+    Best regards,
+    Your Domain Watcher
+    """
+
+    return _base_message(
+        recipient_email, f"Domain {domain_name} is now available!", html_content, text_content
+    )
+
+
+def build_digest_message(recipient_email: str, domains: List[Tuple[str, dict]]) -> Dict:
+    """Message listing several watched domains that became available in one check cycle."""
+    html_items = []
+    text_items = []
+    for domain_name, price_info in domains:
+        purchase_price = _dollars(price_info.get('purchase', 0))
+        renewal_price = _dollars(price_info.get('renewal', 0))
+        html_items.append(
+            f"""<li><strong><a href="https://www.godaddy.com/domainsearch/find?domainToCheck={domain_name}" target="_blank">{domain_name}</a></strong>
+                - Purchase ${purchase_price:.2f}, Renewal ${renewal_price:.2f}</li>"""
+        )
+        text_items.append(
+            f"- {domain_name}: Purchase ${purchase_price:.2f}, Renewal ${renewal_price:.2f}"
+        )
+
+    html_content = f"""
+    <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto; padding: 20px; border: 1px solid #eee; border-radius: 10px; box-shadow: 0 2px 10px rgba(0,0,0,0.1);">
+        <h2 style="color: #4361ee;">Good news! {len(domains)} of your watched domains are now available!</h2>
+        <p>We've been monitoring these domains for you, and they're now available for registration.</p>
+
+        <div style="background-color: #f8f9fa; padding: 15px; border-radius: 5px; margin: 20px 0;">
+            <ul>
+                {"".join(html_items)}
+            </ul>
+        </div>
+        <p>You can register these domains now before someone else does!</p>
+
+        <p>Best regards,<br>
+        Your Domain Watcher</p>
+    </div>
+    """
+
+    text_items = "\n".join(text_items)
+    text_content = f"""
+    Good news! {len(domains)} of your watched domains are now available for registration.
+
+    {text_items}
+
+    You can register these domains now before someone else does!
+
+    Best regards,
+    Your Domain Watcher
+    """
+
+    return _base_message(
+        recipient_email,
+        f"{len(domains)} of your watched domains are now available!",
+        html_content,
+        text_content,
+    )
+
+
+def _parse_response(response: str) -> Tuple[int, str]:
+    # The MailerSend client returns "<status code>\n<body>"
+    status, _, body = str(response).partition("\n")
+    try:
+        return int(status), body
+    except ValueError:
+        return 0, str(response)
+
+
+def _send_message(mail_body: Dict) -> Tuple[int, str]:
+    # Blocking HTTP call, run it in a worker thread
+    return _parse_response(emails.NewEmail(MAILERSEND_API_KEY).send(mail_body))
+
+
+def _send_bulk(messages: List[Dict]) -> Tuple[int, str]:
+    # Blocking HTTP call, run it in a worker thread
+    return _parse_response(emails.NewEmail(MAILERSEND_API_KEY).send_bulk(messages))
+
+
 async def send_domain_availability_email(
     recipient_email: str, domain_name: str, price_info: dict
 ) -> bool:
@@ -23,112 +200,241 @@ async def send_domain_availability_email(
     Returns True if email was sent successfully, False otherwise
     """
     logger.info(f"Preparing to send email to {recipient_email} for domain {domain_name}")
-    
-    # Convert price from GoDaddy format if needed (from integer in millionths to decimal)
-    purchase_price = price_info.get('purchase', 0)
-    renewal_price = price_info.get('renewal', 0)
-    
-    # Check if prices need conversion (from GoDaddy's microdollars format)
-    if isinstance(purchase_price, int) and purchase_price > 1000:
-        purchase_price = purchase_price / 1000000
-        logger.debug(f"Converted purchase price to: ${purchase_price:.2f}")
-    
-    if isinstance(renewal_price, int) and renewal_price > 1000:
-        renewal_price = renewal_price / 1000000
-        logger.debug(f"Converted renewal price to: ${renewal_price:.2f}")
-    
+
     try:
         if not MAILERSEND_API_KEY:
             logger.error("MailerSend API key not configured")
             return False
 
-        # Initialize MailerSend
-        mailer = emails.NewEmail(MAILERSEND_API_KEY)
-        mail_body = {}
-
-        # Set sender information
-        mail_from = {
-            "name": SENDER_NAME,
-            "email": SENDER_EMAIL,
-        }
-
-        # Set recipient
-        recipients = [
-            {
-                "name": recipient_email.split('@')[0],  # Use part before @ as name
-                "email": recipient_email,
-            }
-        ]
-
-        # Set reply-to
-        reply_to = {
-            "name": REPLY_TO_NAME,
-            "email": REPLY_TO_EMAIL,
-        }
+        mail_body = build_availability_message(recipient_email, domain_name, price_info)
 
-        # Log configuration
-        logger.debug(f"Sender: {SENDER_NAME} <{SENDER_EMAIL}>")
-        logger.debug(f"Recipient: {recipients[0]['name']} <{recipients[0]['email']}>")
-        logger.debug(f"Reply-To: {REPLY_TO_NAME} <{REPLY_TO_EMAIL}>")
-        logger.debug(f"Domain: {domain_name}, Prices: Purchase=${purchase_price:.2f}, Renewal=${renewal_price:.2f}")
-
-        # Create email body
-        html_content = f"""
-        <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto; padding: 20px; border: 1px solid #eee; border-radius: 10px; box-shadow: 0 2px 10px rgba(0,0,0,0.1);">
-            <h2 style="color: #4361ee;">Good news! The domain {domain_name} is now available!</h2>
-            <p>We've been monitoring this domain for you, and it's now available for registration.</p>
-            
-            <div style="background-color: #f8f9fa; padding: 15px; border-radius: 5px; margin: 20px 0;">
-                <h3 style="margin-top: 0; color: #3a0ca3;">Price Information:</h3>
-                <ul>
-                    <li><strong>Purchase Price:</strong> ${purchase_price:.2f}</li>
-                    <li><strong>Renewal Price:</strong> ${renewal_price:.2f}</li>
-                </ul>
-            </div>
-            <a href="https://www.godaddy.com/domainsearch/find?domainToCheck={{ domain_name }}"
-                                                   target="_blank" 
-                                                   class="btn btn-sm btn-success flex-grow-1">Register Now</a>
-            <p>You can register this domain now before someone else does!</p>
-            
-            <p>Best regards,<br>
-            Your Domain Watcher</p>
-        </div>
-        """
-        
-        text_content = f"""
-        Good news! The domain {domain_name} is now available for registration.
-
-        Price Information:
-        - Purchase Price: ${purchase_price:.2f}
-        - Renewal Price: ${renewal_price:.2f}
-
-        You can register this domain now before someone else does!
-
-        Best regards,
-        Your Domain Watcher
-        """
-
-        # Construct the email
-        mailer.set_mail_from(mail_from, mail_body)
-        mailer.set_mail_to(recipients, mail_body)
-        mailer.set_subject(f"Domain {domain_name} is now available!", mail_body)
-        mailer.set_html_content(html_content, mail_body)
-        mailer.set_plaintext_content(text_content, mail_body)
-        mailer.set_reply_to(reply_to, mail_body)
-
-        # Send the email
+        # Send the email without blocking the event loop
         logger.info(f"Sending email through MailerSend API...")
-        response = mailer.send(mail_body)
-        
+        status, details = await asyncio.to_thread(_send_message, mail_body)
+
         # Check if email was sent successfully
-        if response[0] == 202:  # 202 Accepted status code
+        if status == 202:  # 202 Accepted status code
             logger.info(f"✅ Domain availability notification sent to {recipient_email} for {domain_name}")
             return True
         else:
-            logger.error(f"❌ Failed to send email notification: Status code {response[0]}")
-            logger.error(f"Response details: {response[1] if len(response) > 1 else 'No details'}")
+            logger.error(f"❌ Failed to send email notification: Status code {status}")
+            logger.error(f"Response details: {details or 'No details'}")
             return False
 
     except Exception as e:
         logger.error(f"❌ Error sending email notification: {str(e)}")
         return False
+
+
+def queue_availability_email(
+    db: AsyncSession,
+    recipient_email: str,
+    domains: List[Tuple[str, dict]],
+    alert_ids: Optional[List[int]] = None,
+) -> EmailOutbox:
+    """
+    Add an availability email to the outbox in the caller's transaction.
+    Several domains are sent as a single digest message.
+
+    Args:
+        db: Open database session, committed by the caller
+        recipient_email: Address to notify
+        domains: (full domain, price info) pairs
+        alert_ids: AlertHistory rows marked delivered once the email is sent
+    """
+    email = EmailOutbox(
+        recipient=recipient_email,
+        kind="digest" if len(domains) > 1 else "availability",
+        payload=json.dumps(
+            {"domains": [{"domain": domain, "price_info": price_info} for domain, price_info in domains]}
+        ),
+        alert_ids=json.dumps(alert_ids or []),
+        status="pending",
+        attempts=0,
+        next_attempt_at=datetime.utcnow(),
+    )
+    db.add(email)
+    return email
+
+
+async def enqueue_domain_availability_email(recipient_email: str, domain_name: str, price_info: dict) -> None:
+    """Queue a one-off availability email in its own transaction."""
+    async with AsyncSessionLocal() as db:
+        queue_availability_email(db, recipient_email, [(domain_name, price_info)])
+        await db.commit()
+
+
+def _build_outbox_message(email: EmailOutbox) -> Dict:
+    domains = [
+        (entry["domain"], entry["price_info"] or {})
+        for entry in json.loads(email.payload)["domains"]
+    ]
+    if len(domains) > 1:
+        return build_digest_message(email.recipient, domains)
+    return build_availability_message(email.recipient, *domains[0])
+
+
+async def _mark_sent(
+    db: AsyncSession, email: EmailOutbox, now: datetime, provider_id: Optional[str] = None
+) -> None:
+    email.status = "sent"
+    email.sent_at = now
+    email.provider_id = provider_id
+    email.attempts += 1
+    alert_ids = json.loads(email.alert_ids or "[]")
+    if alert_ids:
+        await db.execute(
+            update(AlertHistory)
+            .where(AlertHistory.id.in_(alert_ids))
+            .values(delivered=True)
+            .execution_options(synchronize_session=False)
+        )
+
+
+def _mark_failed_attempt(email: EmailOutbox, now: datetime, error: str) -> None:
+    email.attempts += 1
+    email.last_error = error
+    if email.attempts >= EMAIL_MAX_ATTEMPTS:
+        email.status = "failed"
+        logger.error(f"❌ Giving up on email {email.id} to {email.recipient}: {error}")
+    else:
+        delay = min(EMAIL_RETRY_BASE_SECONDS * 2 ** (email.attempts - 1), EMAIL_RETRY_MAX_SECONDS)
+        email.next_attempt_at = now + timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+async def _claim_due_emails(
+    db: AsyncSession, now: datetime, batch_size: int, email_ids: Optional[List[int]] = None
+) -> List[EmailOutbox]:
+    """
+    Claim due outbox emails by pushing their next attempt past the send.
+    The claim is a conditional update, so the outbox loop and a priority
+    send job can't both send the same email.
+    """
+    due = (
+        select(EmailOutbox.id)
+        .where(EmailOutbox.status == "pending", EmailOutbox.next_attempt_at <= now)
+        .order_by(EmailOutbox.created_at)
+        .limit(batch_size)
+    )
+    if email_ids is not None:
+        due = due.where(EmailOutbox.id.in_(email_ids))
+    claimed_ids = (
+        await db.scalars(
+            update(EmailOutbox)
+            .where(
+                EmailOutbox.id.in_(due.scalar_subquery()),
+                EmailOutbox.status == "pending",
+                EmailOutbox.next_attempt_at <= now,
+            )
+            .values(next_attempt_at=now + timedelta(seconds=EMAIL_CLAIM_SECONDS))
+            .returning(EmailOutbox.id)
+            .execution_options(synchronize_session=False)
+        )
+    ).all()
+    await db.commit()
+    if not claimed_ids:
+        return []
+    return (
+        await db.scalars(
+            select(EmailOutbox)
+            .where(EmailOutbox.id.in_(claimed_ids))
+            .order_by(EmailOutbox.created_at)
+        )
+    ).all()
+
+
+async def flush_email_outbox(
+    batch_size: int = EMAIL_BATCH_SIZE, email_ids: Optional[List[int]] = None
+) -> int:
+    """
+    Send due outbox emails in one bulk request. If the provider rejects the
+    batch, each email is retried on its own so one bad message can't hold
+    back the rest.
+
+    Args:
+        batch_size: Most emails to send
+        email_ids: Only send these emails, None for any due ones
+
+    Returns:
+        Number of emails sent
+    """
+    if not MAILERSEND_API_KEY:
+        logger.error("MailerSend API key not configured")
+        return 0
+
+    now = datetime.utcnow()
+    async with AsyncSessionLocal() as db:
+        pending = await _claim_due_emails(db, now, batch_size, email_ids)
+        if not pending:
+            return 0
+
+        messages = {}
+        for email in pending:
+            try:
+                messages[email.id] = _build_outbox_message(email)
+            except Exception as e:
+                email.status = "failed"
+                email.last_error = f"Could not build message: {str(e)}"
+                logger.error(f"❌ Dropping malformed email {email.id}: {str(e)}")
+        pending = [email for email in pending if email.id in messages]
+
+        sent = 0
+        if len(pending) > 1:
+            logger.info(f"Sending {len(pending)} emails through the MailerSend bulk API...")
+            status, details = await asyncio.to_thread(
+                _send_bulk, [messages[email.id] for email in pending]
+            )
+            if status == 202:
+                try:
+                    provider_id = json.loads(details).get("bulk_email_id")
+                except ValueError:
+                    provider_id = None
+                for email in pending:
+                    await _mark_sent(db, email, now, provider_id)
+                sent = len(pending)
+                pending = []
+            else:
+                logger.warning(f"Bulk email request failed with status {status}: {details}")
+
+        if pending:
+            semaphore = asyncio.Semaphore(EMAIL_SINGLE_SEND_CONCURRENCY)
+
+            async def send_one(email):
+                async with semaphore:
+                    try:
+                        return await asyncio.to_thread(_send_message, messages[email.id])
+                    except Exception as e:
+                        return 0, str(e)
+
+            results = await asyncio.gather(*(send_one(email) for email in pending))
+            for email, (status, details) in zip(pending, results):
+                if status == 202:
+                    await _mark_sent(db, email, now)
+                    sent += 1
+                else:
+                    _mark_failed_attempt(email, now, f"Status {status}: {details}")
+
+        await db.commit()
+        logger.info(f"✅ Sent {sent} notification emails")
+        return sent
+
+
+@job_handler("send_outbox_emails", concurrency=2, visibility_timeout=120)
+async def send_outbox_emails(payload: Dict) -> None:
+    """
+    Job that sends specific outbox emails right away instead of waiting for
+    the next outbox poll, used for time-critical alerts such as drops.
+    """
+    await flush_email_outbox(email_ids=payload.get("email_ids"))
+
+
+async def run_email_outbox():
+    """Background task that drains the email outbox every EMAIL_OUTBOX_POLL_SECONDS."""
+    while True:
+        try:
+            # Keep going while full batches are waiting
+            while await flush_email_outbox() >= EMAIL_BATCH_SIZE:
+                pass
+        except Exception as e:
+            logger.error(f"Error sending outbox emails: {str(e)}")
+        await asyncio.sleep(EMAIL_OUTBOX_POLL_SECONDS)
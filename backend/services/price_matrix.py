@@ -0,0 +1,323 @@
+# Registration prices of every TLD at the providers that publish TLD price
+# lists (Porkbun, Dynadot, Namesilo), merged into one matrix. TLDs are
+# interned to small integer ids; each row holds the providers' prices as
+# integer micro-dollars, the same unit as GoDaddy prices, with the cheapest
+# offer worked out in advance. Pricing a checked domain is then one row
+# lookup instead of parsing three provider tables per domain.
+#
+# The provider modules keep their own pricing caches; the matrix is rebuilt
+# from them whenever they change and swapped in as a whole, so readers never
+# see a half-built matrix. A background task refreshes the provider caches
+# as their TTL runs out.
+
+import os
+import time
+import asyncio
+import logging
+from decimal import Decimal, InvalidOperation
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from . import dynadot_service, namesilo_service, porkbun_service
+from .porkbun_service import get_porkbun_pricing
+from .dynadot_service import get_dynadot_pricing
+from .namesilo_service import get_namesilo_pricing
+from .registrar_scheduler import Lane, registrar_priority
+
+logger = logging.getLogger(__name__)
+
+# Column order of the matrix rows
+PRICING_PROVIDERS = ("porkbun", "dynadot", "namesilo")
+
+# How often the background task checks the provider caches
+PRICE_MATRIX_REFRESH_SECONDS = int(os.getenv("PRICE_MATRIX_REFRESH_SECONDS", "900"))
+
+# Dynadot prices one TLD per call, these are kept warm in the background
+DYNADOT_REFRESH_TLDS = ["com", "net", "org", "io", "ai", "app", "dev", "tech"]
+
+# TLD interning, ids only ever grow so rows of older matrices stay valid
+_tld_ids: Dict[str, int] = {}
+_tld_names: List[str] = []
+
+
+def tld_id(tld: str) -> int:
+    """Interned id of a TLD, e.g. "com" or "co.uk", assigned on first use."""
+    tld = tld.strip().lstrip(".").lower()
+    id_ = _tld_ids.get(tld)
+    if id_ is None:
+        id_ = _tld_ids[tld] = len(_tld_names)
+        _tld_names.append(tld)
+    return id_
+
+
+def to_micros(price) -> Optional[int]:
+    """
+    Provider price in micro-dollars.
+
+    Args:
+        price: Dollar amount as the provider sends it, e.g. "9.73", 12.99 or "N/A"
+
+    Returns:
+        Integer micro-dollars, None if the price is missing or not a positive amount
+    """
+    if price is None or isinstance(price, bool):
+        return None
+    try:
+        micros = int(Decimal(str(price).replace(",", "").strip()) * 1000000)
+    except (InvalidOperation, ValueError):
+        return None
+    return micros if micros > 0 else None
+
+
+def _registration_prices(provider: str, pricing: Dict) -> Dict[str, Optional[int]]:
+    """Registration price per TLD from a provider's pricing cache."""
+    if "error" in pricing:
+        return {}
+    if provider == "dynadot":
+        # Dynadot caches the bare price per TLD
+        return {
+            tld: to_micros(price) for tld, price in pricing.items() if not isinstance(price, dict)
+        }
+    return {
+        tld: to_micros(details.get("registration"))
+        for tld, details in pricing.items()
+        if isinstance(details, dict)
+    }
+
+
+class PriceMatrix:
+    """
+    Immutable snapshot of provider prices per TLD id.
+
+    Args:
+        rows: Per provider, micro-dollar price by TLD, see PRICING_PROVIDERS
+    """
+
+    def __init__(self, rows: Dict[str, Dict[str, Optional[int]]]):
+        for prices in rows.values():
+            for tld in prices:
+                tld_id(tld)
+        size = len(_tld_names)
+        self.built_at = time.time()
+        self.prices: List[Tuple[Optional[int], ...]] = [(None,) * len(PRICING_PROVIDERS)] * size
+        self._offers: List[Dict[str, int]] = [{}] * size
+        self._best: List[Optional[Tuple[str, int]]] = [None] * size
+
+        for id_ in range(size):
+            tld = _tld_names[id_]
+            prices = tuple(rows.get(provider, {}).get(tld) for provider in PRICING_PROVIDERS)
+            offers = {
+                provider: price
+                for provider, price in zip(PRICING_PROVIDERS, prices)
+                if price is not None
+            }
+            if not offers:
+                continue
+            self.prices[id_] = prices
+            self._offers[id_] = offers
+            self._best[id_] = min(offers.items(), key=lambda offer: offer[1])
+
+    def offers(self, tld: str) -> Dict[str, int]:
+        """Micro-dollar price per provider for a TLD. Shared, don't modify."""
+        id_ = _tld_ids.get(tld)
+        if id_ is None or id_ >= len(self._offers):
+            return {}
+        return self._offers[id_]
+
+    def best(self, tld: str) -> Optional[Tuple[str, int]]:
+        """Cheapest (provider, micro-dollar price) for a TLD, None if nobody prices it."""
+        id_ = _tld_ids.get(tld)
+        if id_ is None or id_ >= len(self._best):
+            return None
+        return self._best[id_]
+
+    def tld_count(self) -> int:
+        return sum(1 for offers in self._offers if offers)
+
+
+def _provider_caches() -> Dict[str, Tuple[object, str]]:
+    # Looked up on every use, the provider modules rebind their caches
+    return {
+        "porkbun": (porkbun_service, "PORKBUN_PRICING_CACHE"),
+        "dynadot": (dynadot_service, "DYNADOT_PRICING_CACHE"),
+        "namesilo": (namesilo_service, "NAMESILO_PRICING_CACHE"),
+    }
+
+
+def _provider_cache(provider: str) -> Dict:
+    module, attr = _provider_caches()[provider]
+    return getattr(module, attr)
+
+
+def _sources_version() -> Tuple:
+    """Changes whenever a provider cache is replaced, refreshed or grows."""
+    return tuple(
+        (id(getattr(module, attr)), len(getattr(module, attr)), module.CACHE_TIMESTAMP)
+        for module, attr in _provider_caches().values()
+    )
+
+
+_matrix = PriceMatrix({})
+_matrix_version: Optional[Tuple] = None
+
+
+def current() -> PriceMatrix:
+    """The price matrix in use. Hold on to the returned snapshot for a whole request."""
+    return _matrix
+
+
+def rebuild(force: bool = False) -> PriceMatrix:
+    """
+    Build a new matrix from the provider caches and swap it in, if they
+    changed since the last build.
+    """
+    global _matrix, _matrix_version
+    version = _sources_version()
+    if version == _matrix_version and not force:
+        return _matrix
+    matrix = PriceMatrix(
+        {provider: _registration_prices(provider, _provider_cache(provider)) for provider in PRICING_PROVIDERS}
+    )
+    _matrix, _matrix_version = matrix, version
+    logger.info(f"Rebuilt price matrix: {matrix.tld_count()} TLDs priced")
+    return matrix
+
+
+async def ensure_prices(tlds: Iterable[str]) -> PriceMatrix:
+    """
+    Fetch provider pricing missing for any of the TLDs, then return the
+    current matrix. Provider caches that are still fresh aren't refetched.
+
+    Args:
+        tlds: Canonical TLDs about to be priced
+
+    Returns:
+        The price matrix including whatever the providers returned
+    """
+    tlds = sorted(set(tlds))
+    fetches = []
+    if any(tld not in porkbun_service.PORKBUN_PRICING_CACHE for tld in tlds):
+        fetches.append(get_porkbun_pricing())
+    dynadot_missing = [tld for tld in tlds if tld not in dynadot_service.DYNADOT_PRICING_CACHE]
+    if dynadot_missing:
+        fetches.append(get_dynadot_pricing(dynadot_missing))
+    if any(tld not in namesilo_service.NAMESILO_PRICING_CACHE for tld in tlds):
+        fetches.append(get_namesilo_pricing(tlds))
+
+    if fetches:
+        results = await asyncio.gather(*fetches, return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"Error fetching provider pricing: {str(result)}")
+    return rebuild()
+
+
+async def refresh_price_matrix() -> None:
+    """Refresh provider caches whose TTL ran out and rebuild the matrix."""
+    now = time.time()
+    fetches = []
+    for provider, (module, attr) in _provider_caches().items():
+        if getattr(module, attr) and now - module.CACHE_TIMESTAMP < module.CACHE_TTL:
+            continue
+        if provider == "porkbun":
+            fetches.append(get_porkbun_pricing())
+        elif provider == "dynadot":
+            tlds = sorted(set(DYNADOT_REFRESH_TLDS) | set(dynadot_service.DYNADOT_PRICING_CACHE))
+            fetches.append(get_dynadot_pricing(tlds))
+        else:
+            fetches.append(get_namesilo_pricing())
+
+    if fetches:
+        # Yields to interactive checks when the registrar quotas run low
+        with registrar_priority(Lane.BACKGROUND, owner="price_matrix"):
+            results = await asyncio.gather(*fetches, return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"Error refreshing provider pricing: {str(result)}")
+    rebuild()
+
+
+async def _run_refresher() -> None:
+    while True:
+        try:
+            await refresh_price_matrix()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error refreshing price matrix: {str(e)}")
+        await asyncio.sleep(PRICE_MATRIX_REFRESH_SECONDS)
+
+
+_refresher: Optional[asyncio.Task] = None
+
+
+def start_price_matrix_refresher() -> None:
+    """Keep this process's price matrix current in the background."""
+    global _refresher
+    if _refresher is None or _refresher.done():
+        _refresher = asyncio.create_task(_run_refresher())
+
+
+async def stop_price_matrix_refresher() -> None:
+    """Cancel the background refresh and wait for it, so it doesn't outlive
+    the HTTP sessions it fetches through."""
+    global _refresher
+    refresher, _refresher = _refresher, None
+    if refresher is None:
+        return
+    refresher.cancel()
+    try:
+        await refresher
+    except asyncio.CancelledError:
+        pass
+
+
+def pricing_cache_stats() -> Dict[str, Dict]:
+    """TLD count and age of each provider's pricing cache, and of the matrix."""
+    now = time.time()
+    matrix = current()
+    stats = {}
+    for provider, (module, attr) in _provider_caches().items():
+        pricing = getattr(module, attr)
+        refreshed_at = module.CACHE_TIMESTAMP
+        stats[provider] = {
+            "entries": len([tld for tld in pricing if tld != "error"]),
+            "error": pricing.get("error") if isinstance(pricing, dict) else None,
+            "age_seconds": round(now - refreshed_at) if refreshed_at else None,
+            "ttl_seconds": module.CACHE_TTL,
+        }
+    stats["matrix"] = {
+        "tlds": matrix.tld_count(),
+        "interned_tlds": len(_tld_names),
+        "age_seconds": round(now - matrix.built_at),
+    }
+    return stats
+
+
+def invalidate_pricing(provider: Optional[str] = None, tld: Optional[str] = None) -> int:
+    """
+    Drop cached TLD pricing so it's fetched again on next use.
+
+    Args:
+        provider: One of PRICING_PROVIDERS, or None for all of them
+        tld: Only this TLD, or None for the provider's whole table
+
+    Returns:
+        Number of TLD prices dropped
+    """
+    if tld is not None:
+        tld = tld.strip().lstrip(".").lower()
+    removed = 0
+    for name, (module, attr) in _provider_caches().items():
+        if provider is not None and name != provider:
+            continue
+        pricing = getattr(module, attr)
+        if tld is not None:
+            removed += pricing.pop(tld, None) is not None
+        else:
+            removed += len(pricing)
+            pricing.clear()
+        # The provider refetches instead of trusting its timestamp
+        module.CACHE_TIMESTAMP = 0
+    rebuild(force=True)
+    logger.info(f"Invalidated {removed} cached prices (provider={provider}, tld={tld})")
+    return removed
@@ -0,0 +1,251 @@
+# Daily call budgets for the registrar APIs. Every call that reaches a
+# provider is counted per provider and credential in a small SQLite file,
+# so the count survives restarts and is shared by all worker processes.
+#
+# Counts are batched in memory and written every few seconds, in a thread
+# when called from the event loop, so a worker's view of the total lags by
+# at most QUOTA_SYNC_SECONDS of the other workers' traffic.
+# Rather than a hard cutoff, the remaining budget is turned into a pressure
+# level that callers use to cache longer and shed low-priority work first.
+
+import os
+import time
+import asyncio
+import sqlite3
+import hashlib
+import logging
+import threading
+from datetime import datetime, timezone
+from enum import IntEnum
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+QUOTA_LEDGER_PATH = os.getenv("QUOTA_LEDGER_PATH", "./provider_quota.db")
+
+# Pending counts are written when either threshold is reached
+QUOTA_SYNC_SECONDS = 5
+QUOTA_SYNC_CALLS = 50
+
+
+class QuotaLevel(IntEnum):
+    NORMAL = 0  # On pace for the day
+    CONSERVE = 1  # Spending faster than the budget allows, cache longer
+    SCARCE = 2  # Serve stale cache entries, shed background work
+    CRITICAL = 3  # Only interactive requests reach the provider
+    EXHAUSTED = 4  # Nothing reaches the provider until the day rolls over
+
+
+# Minimum headroom for each level, see ProviderQuota.headroom()
+LEVEL_HEADROOM = [
+    (QuotaLevel.NORMAL, 1.0),
+    (QuotaLevel.CONSERVE, 0.6),
+    (QuotaLevel.SCARCE, 0.3),
+    (QuotaLevel.CRITICAL, 0.0),
+]
+
+
+def credential_id(secret: Optional[str]) -> str:
+    """Short stable id for an API key, so rotated keys get their own budget."""
+    if not secret:
+        return "default"
+    return hashlib.sha256(secret.encode()).hexdigest()[:12]
+
+
+def _today() -> str:
+    return datetime.now(timezone.utc).date().isoformat()
+
+
+def _day_fraction() -> float:
+    now = datetime.now(timezone.utc)
+    return (now.hour * 3600 + now.minute * 60 + now.second) / 86400
+
+
+class QuotaLedger:
+    """Calls per provider, credential and UTC day, in a SQLite file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread, sqlite3 connections aren't shareable
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS provider_quota_usage ("
+                "provider TEXT NOT NULL, credential TEXT NOT NULL, day TEXT NOT NULL, "
+                "calls INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (provider, credential, day))"
+            )
+            self._local.conn = conn
+        return conn
+
+    def add(self, provider: str, credential: str, day: str, calls: int) -> int:
+        """Add calls to a day's count and return the new total."""
+        return self._connection().execute(
+            "INSERT INTO provider_quota_usage (provider, credential, day, calls) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(provider, credential, day) DO UPDATE SET calls = calls + excluded.calls "
+            "RETURNING calls",
+            (provider, credential, day, calls),
+        ).fetchone()[0]
+
+    def history(self, provider: str, days: int = 7) -> List[Dict]:
+        """
+        Daily call counts for a provider, newest first.
+
+        Args:
+            provider: Provider name
+            days: Number of days to return
+
+        Returns:
+            List of dicts with credential, day and calls
+        """
+        rows = self._connection().execute(
+            "SELECT credential, day, calls FROM provider_quota_usage "
+            "WHERE provider = ? ORDER BY day DESC LIMIT ?",
+            (provider, days),
+        ).fetchall()
+        return [{"credential": credential, "day": day, "calls": calls} for credential, day, calls in rows]
+
+
+class ProviderQuota:
+    """
+    Daily budget of one provider credential.
+
+    Args:
+        provider: Provider name
+        credential: Credential id, see credential_id()
+        daily_budget: Calls allowed per UTC day, 0 for unlimited
+        ledger: Shared ledger the counts are written to
+    """
+
+    def __init__(self, provider: str, credential: str, daily_budget: int, ledger: QuotaLedger):
+        self.provider = provider
+        self.credential = credential
+        self.daily_budget = daily_budget
+        self.ledger = ledger
+        self._day = _today()
+        self._shared_used = 0
+        self._pending = 0
+        self._flushing = 0  # Calls being written to the ledger right now
+        self._synced_at = 0.0
+        self._level = QuotaLevel.NORMAL
+        self._flushes = set()
+
+    def _sync(self, force: bool = False) -> None:
+        now = time.monotonic()
+        today = _today()
+        if today != self._day:
+            # Yesterday's leftovers still belong to yesterday
+            day = self._day
+            self._day, self._shared_used = today, 0
+            self._flush(day)
+        elif force or self._pending >= QUOTA_SYNC_CALLS or now - self._synced_at >= QUOTA_SYNC_SECONDS:
+            self._flush(today)
+        else:
+            return
+        self._synced_at = now
+
+    def _flush(self, day: str) -> None:
+        """
+        Write pending counts to the ledger. On the event loop the write runs
+        in a thread, a busy ledger file mustn't stall every request.
+        """
+        calls, self._pending = self._pending, 0
+        if not calls and day != self._day:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._write(day, calls)
+            return
+
+        self._flushing += calls
+        task = loop.create_task(asyncio.to_thread(self.ledger.add, self.provider, self.credential, day, calls))
+        self._flushes.add(task)
+        task.add_done_callback(lambda task: self._flushed(task, day, calls))
+
+    def _write(self, day: str, calls: int) -> None:
+        try:
+            total = self.ledger.add(self.provider, self.credential, day, calls)
+        except sqlite3.Error as e:
+            self._write_failed(calls, e)
+        else:
+            self._update_total(day, total)
+
+    def _flushed(self, task: asyncio.Task, day: str, calls: int) -> None:
+        self._flushes.discard(task)
+        self._flushing -= calls
+        if task.cancelled():
+            self._pending += calls
+        elif task.exception() is not None:
+            self._write_failed(calls, task.exception())
+        else:
+            self._update_total(day, task.result())
+
+    def _write_failed(self, calls: int, error: BaseException) -> None:
+        # Counted again on the next sync
+        self._pending += calls
+        logger.error(f"Failed to update {self.provider} quota ledger: {str(error)}")
+
+    def _update_total(self, day: str, total: int) -> None:
+        if day != self._day:
+            return
+        # Writes may finish out of order, the day's total only grows
+        self._shared_used = max(self._shared_used, total)
+        level = self.level()
+        if level != self._level:
+            log = logger.warning if level > self._level else logger.info
+            log(f"{self.provider} quota level {self._level.name} -> {level.name} ({self.used()}/{self.daily_budget} calls)")
+            self._level = level
+
+    def record(self, calls: int = 1) -> None:
+        """Count calls that reached the provider."""
+        self._pending += calls
+        self._sync()
+
+    def used(self) -> int:
+        """Calls made today by all workers, as of the last sync, plus ours since."""
+        return self._shared_used + self._flushing + self._pending
+
+    def headroom(self) -> float:
+        """
+        Remaining budget relative to what the rest of the day needs at an
+        even pace: 1.0 or more is on pace, 0 means exhausted.
+        """
+        if not self.daily_budget:
+            return float("inf")
+        remaining = max(self.daily_budget - self.used(), 0)
+        # The last hour of the day counts as at least 5%, a tiny remainder
+        # of the day shouldn't make any leftover budget look plentiful
+        return remaining / (self.daily_budget * max(1 - _day_fraction(), 0.05))
+
+    def level(self) -> QuotaLevel:
+        if self._day != _today():
+            self._sync()
+        if self.daily_budget and self.used() >= self.daily_budget:
+            return QuotaLevel.EXHAUSTED
+        headroom = self.headroom()
+        for level, minimum in LEVEL_HEADROOM:
+            if headroom >= minimum:
+                return level
+        return QuotaLevel.CRITICAL
+
+    def snapshot(self) -> Dict:
+        """Today's usage and pressure level, for monitoring."""
+        self._sync()
+        headroom = self.headroom()
+        return {
+            "credential": self.credential,
+            "day": self._day,
+            "used": self.used(),
+            "daily_budget": self.daily_budget or None,
+            "headroom": round(headroom, 2) if headroom != float("inf") else None,
+            "level": self.level().name.lower(),
+        }
+
+
+quota_ledger = QuotaLedger(QUOTA_LEDGER_PATH)
@@ -0,0 +1,518 @@
+# Arbitration of registrar API capacity. Every GoDaddy and Dynadot request
+# takes a slot from its provider's scheduler first. The scheduler caps
+# in-flight requests and the request rate, and when callers have to wait it
+# hands out slots by priority lane and, inside a lane, round-robin per owner,
+# so one heavy user or a background sweep can't starve everyone else.
+#
+# Callers don't pass the lane around, they set it once for the surrounding
+# work with registrar_priority(); tasks spawned inside inherit it.
+#
+# The request rate is shared by every process: slots are paid for with
+# tokens from a bucket per provider credential in the SQLite rate limit
+# store. Higher lanes get a reserve in that bucket, so a background sweep in
+# the worker process can't use up the burst that interactive requests in the
+# web processes need. The in-flight cap can't be shared that way, each of the
+# REGISTRAR_PROCESSES processes gets its share of it. Without the shared
+# store, or while it fails, the rate is split the same way.
+#
+# Tokens are taken from the shared bucket in a thread, one request at a time
+# per provider, so a busy store never blocks the event loop. The store's busy
+# timeout is short: a token the store is too busy to give comes from this
+# process's share instead, and a store that fails otherwise is left alone
+# for SHARED_BUCKET_RETRY_SECONDS.
+#
+# Each provider also has a circuit breaker. While it is open, slot() fails
+# straight away with CircuitOpen instead of queueing callers for a provider
+# that is down.
+#
+# Granted slots are counted against the provider's daily quota. As the
+# budget runs low, lower lanes are refused with QuotaExhausted, background
+# work first.
+
+import os
+import time
+import asyncio
+import logging
+import sqlite3
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Deque, Dict, Optional
+from ..rate_limit_storage import SQLiteStorage
+from .circuit_breaker import CircuitBreaker
+from .quota_ledger import ProviderQuota, QuotaLevel, credential_id, quota_ledger
+
+logger = logging.getLogger(__name__)
+
+
+class Lane(IntEnum):
+    INTERACTIVE = 0  # /api/generate, a user is waiting on the page
+    ON_DEMAND = 1  # Explicit follow-ups like check-more-extensions, drop-watch polls
+    BACKGROUND = 2  # Watchlist sweeps, cache preloading
+
+
+# Share of slots each lane gets while all of them have work waiting
+LANE_WEIGHTS = {Lane.INTERACTIVE: 8, Lane.ON_DEMAND: 3, Lane.BACKGROUND: 1}
+
+# Share of the shared bucket's burst a lane has to leave for the lanes above
+LANE_RESERVE = {Lane.INTERACTIVE: 0.0, Lane.ON_DEMAND: 0.25, Lane.BACKGROUND: 0.5}
+
+# How long a request may queue before giving up, in seconds
+LANE_MAX_WAIT = {Lane.INTERACTIVE: 5.0, Lane.ON_DEMAND: 10.0, Lane.BACKGROUND: 60.0}
+
+# Lowest lane still admitted at each quota level, nothing when exhausted
+QUOTA_LOWEST_LANE = {
+    QuotaLevel.NORMAL: Lane.BACKGROUND,
+    QuotaLevel.CONSERVE: Lane.BACKGROUND,
+    QuotaLevel.SCARCE: Lane.ON_DEMAND,
+    QuotaLevel.CRITICAL: Lane.INTERACTIVE,
+}
+
+# Processes calling the registrars, the web workers plus the background worker
+REGISTRAR_PROCESSES = max(1, int(os.getenv("REGISTRAR_PROCESSES", "1")))
+
+# Token buckets shared across processes, empty to keep the rate per process
+REGISTRAR_RATE_STORAGE_URI = os.getenv("REGISTRAR_RATE_STORAGE_URI", "sqlite:///./rate_limits.db")
+
+# How long taking a token waits for another process's write lock, in seconds
+REGISTRAR_RATE_BUSY_TIMEOUT = float(os.getenv("REGISTRAR_RATE_BUSY_TIMEOUT", "0.05"))
+
+# After the shared store fails, the local bucket is used for this long
+SHARED_BUCKET_RETRY_SECONDS = 5
+
+_current_lane: ContextVar[Lane] = ContextVar("registrar_lane", default=Lane.ON_DEMAND)
+_current_owner: ContextVar[str] = ContextVar("registrar_owner", default="anonymous")
+
+
+class RegistrarBusy(Exception):
+    """No slot for the provider freed up within the lane's maximum wait."""
+
+
+class CircuitOpen(RegistrarBusy):
+    """The provider's circuit breaker is open, the call wasn't attempted."""
+
+
+class QuotaExhausted(RegistrarBusy):
+    """The provider's daily budget is too low for this lane's work."""
+
+
+@contextmanager
+def registrar_priority(lane: Lane, owner: Optional[str] = None):
+    """
+    Run the enclosed registrar calls in the given lane, queued fairly
+    against other owners in the same lane.
+
+    Args:
+        lane: Priority lane
+        owner: Fairness key, e.g. "user:42" or "ip:1.2.3.4"
+    """
+    lane_token = _current_lane.set(lane)
+    owner_token = _current_owner.set(owner or _current_owner.get())
+    try:
+        yield
+    finally:
+        _current_lane.reset(lane_token)
+        _current_owner.reset(owner_token)
+
+
+class ProviderScheduler:
+    """
+    Slots for one provider: at most `concurrency` requests in flight and
+    `rate_per_second` started per second, with bursts up to `burst`, all
+    three across all REGISTRAR_PROCESSES processes.
+
+    Waiting lanes are served by stride scheduling on LANE_WEIGHTS, owners
+    inside a lane round-robin.
+
+    Args:
+        shared_bucket: Store holding the rate's token bucket, None to split
+            the rate between the processes instead
+    """
+
+    def __init__(
+        self,
+        name: str,
+        concurrency: int,
+        rate_per_second: float,
+        burst: Optional[int] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        quota: Optional[ProviderQuota] = None,
+        shared_bucket: Optional[SQLiteStorage] = None,
+    ):
+        self.name = name
+        self.breaker = breaker or CircuitBreaker(name)
+        self.quota = quota or ProviderQuota(name, credential_id(None), 0, quota_ledger)
+        self.rate_per_second = rate_per_second
+        self.burst = burst or max(1, int(rate_per_second))
+        self.concurrency = max(1, concurrency // REGISTRAR_PROCESSES)
+        self.shared_bucket = shared_bucket
+        self._bucket_key = f"registrar:{name}:{self.quota.credential}"
+        self._shared_failed_at: Optional[float] = None
+        # Shared tokens taken but not yet handed to a waiter
+        self._spare_tokens = 0
+        self._pump: Optional[asyncio.Task] = None
+        # This process's share, used without the shared bucket
+        self._local_rate = rate_per_second / REGISTRAR_PROCESSES
+        self._local_burst = max(1.0, self.burst / REGISTRAR_PROCESSES)
+        self._tokens = self._local_burst
+        self._refilled_at = time.monotonic()
+        self._paused_until = 0.0
+        self._in_flight = 0
+        # {lane: {owner: deque of waiting futures}}, owners in round-robin order
+        self._waiting: Dict[Lane, "OrderedDict[str, Deque[asyncio.Future]]"] = {
+            lane: OrderedDict() for lane in Lane
+        }
+        self._pass = {lane: 0.0 for lane in Lane}
+        self._virtual_time = 0.0
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+        self.stats = {
+            "granted": 0, "queued": 0, "timed_out": 0, "throttled": 0, "short_circuited": 0, "shed": 0,
+            "shared_bucket_busy": 0, "shared_bucket_errors": 0,
+        }
+
+    def _take_local_token(self, floor: float, now: float) -> float:
+        self._tokens = min(self._local_burst, self._tokens + (now - self._refilled_at) * self._local_rate)
+        self._refilled_at = now
+        if self._tokens - 1 >= floor:
+            self._tokens -= 1
+            return 0.0
+        return (floor + 1 - self._tokens) / self._local_rate
+
+    def _take_token(self, lane: Lane, now: float) -> float:
+        """Pay for a slot in the lane from this process's share. 0.0 if
+        paid, else seconds to wait."""
+        floor = min(self._local_burst * LANE_RESERVE[lane], self._local_burst - 1)
+        return self._take_local_token(floor, now)
+
+    def _uses_shared_bucket(self, now: float) -> bool:
+        return self.shared_bucket is not None and (
+            self._shared_failed_at is None or now - self._shared_failed_at >= SHARED_BUCKET_RETRY_SECONDS
+        )
+
+    async def _take_shared_token(self, lane: Lane) -> Optional[float]:
+        """Like _take_token, from the shared bucket. None if the store failed."""
+        floor = min(self.burst * LANE_RESERVE[lane], self.burst - 1)
+        try:
+            wait = await asyncio.to_thread(
+                self.shared_bucket.take_token, self._bucket_key, self.rate_per_second, self.burst, floor
+            )
+        except sqlite3.OperationalError as e:
+            if "locked" not in str(e) and "busy" not in str(e):
+                return self._shared_bucket_failed(e)
+            # Busy past the timeout, this token comes from the local share
+            self.stats["shared_bucket_busy"] += 1
+            return self._take_token(lane, time.monotonic())
+        except sqlite3.Error as e:
+            return self._shared_bucket_failed(e)
+        if self._shared_failed_at is not None:
+            logger.info(f"{self.name} shared rate bucket is back")
+            self._shared_failed_at = None
+        return wait
+
+    def _shared_bucket_failed(self, error: Exception) -> None:
+        self.stats["shared_bucket_errors"] += 1
+        if self._shared_failed_at is None:
+            logger.warning(f"{self.name} shared rate bucket failed, using this process's share: {str(error)}")
+        self._shared_failed_at = time.monotonic()
+
+    async def _pump_shared(self) -> None:
+        """Hand out slots paid for from the shared bucket while waiters and
+        capacity remain."""
+        try:
+            while self._in_flight < self.concurrency:
+                lane = self._next_lane()
+                if lane is None:
+                    return
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                if not self._spare_tokens:
+                    wait = await self._take_shared_token(lane)
+                    if wait is None:
+                        return
+                    if wait:
+                        await asyncio.sleep(wait)
+                        continue
+                    self._spare_tokens += 1
+                # Waiters may have given up while the token was taken, a
+                # token nobody is left for is kept for the next one
+                lane = self._next_lane()
+                if lane is None or self._in_flight >= self.concurrency:
+                    return
+                self._spare_tokens -= 1
+                self._start()
+                self._next_waiter(lane).set_result(None)
+        finally:
+            self._pump = None
+            if self._shared_failed_at is not None and self._wakeup is None:
+                # Serve whoever is left from this process's share
+                self._dispatch()
+
+    def _has_waiters(self) -> bool:
+        return any(self._waiting[lane] for lane in Lane)
+
+    def _start(self) -> None:
+        self._in_flight += 1
+        self.stats["granted"] += 1
+
+    def _next_lane(self) -> Optional[Lane]:
+        """Lane the next slot goes to, dropping waiters that gave up."""
+        # Lowest pass goes next, each grant advances it by 1 / weight
+        for lane in sorted((lane for lane in Lane if self._waiting[lane]), key=lambda lane: (self._pass[lane], lane)):
+            owners = self._waiting[lane]
+            while owners:
+                owner, waiters = next(iter(owners.items()))
+                # Abandoned by a caller that timed out or was cancelled
+                while waiters and waiters[0].done():
+                    waiters.popleft()
+                if waiters:
+                    return lane
+                del owners[owner]
+        return None
+
+    def _next_waiter(self, lane: Lane) -> asyncio.Future:
+        self._virtual_time = self._pass[lane]
+        self._pass[lane] += 1 / LANE_WEIGHTS[lane]
+
+        owners = self._waiting[lane]
+        owner, waiters = next(iter(owners.items()))
+        future = waiters.popleft()
+        if waiters:
+            owners.move_to_end(owner)
+        else:
+            del owners[owner]
+        return future
+
+    def _dispatch(self) -> None:
+        self._wakeup = None
+        now = time.monotonic()
+        if self._uses_shared_bucket(now):
+            if self._pump is None:
+                self._pump = asyncio.get_running_loop().create_task(self._pump_shared())
+            return
+
+        delay = None
+        while self._in_flight < self.concurrency:
+            lane = self._next_lane()
+            if lane is None:
+                break
+            if now < self._paused_until:
+                delay = self._paused_until - now
+                break
+            # Paid for before the waiter is picked, as each lane has its
+            # own reserve
+            delay = self._take_token(lane, now)
+            if delay:
+                break
+            self._start()
+            self._next_waiter(lane).set_result(None)
+
+        if delay:
+            # Waiting on the rate or a provider pause, not on a release
+            self._wakeup = asyncio.get_running_loop().call_later(max(delay, 0.001), self._dispatch)
+
+    def _release(self) -> None:
+        self._in_flight -= 1
+        if self._wakeup is None:
+            self._dispatch()
+
+    def throttled(self, retry_after: float = 1.0) -> None:
+        """The provider answered 429, hold back new requests for a while."""
+        self.stats["throttled"] += 1
+        self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+        logger.warning(f"{self.name} throttled us, pausing requests for {retry_after:.1f}s")
+
+    def admits(self, lane: Optional[Lane] = None) -> bool:
+        """Whether the quota leaves room for the lane's work (default: the current lane)."""
+        lowest = QUOTA_LOWEST_LANE.get(self.quota.level())
+        return lowest is not None and (lane if lane is not None else _current_lane.get()) <= lowest
+
+    def available(self, lane: Optional[Lane] = None) -> bool:
+        """Whether a call in the lane would be attempted right now."""
+        return self.admits(lane) and self.breaker.available()
+
+    @asynccontextmanager
+    async def slot(self, measure_latency: bool = True):
+        """
+        Hold one request slot for the enclosed provider call.
+
+        Yields a ProviderCall. The call counts as failed for the circuit
+        breaker if the block raises or calls failed(), e.g. on a 5xx.
+
+        Args:
+            measure_latency: False for calls that are slow by nature, like
+                bulk checks, so they don't count towards the slow-call rate
+
+        Raises:
+            QuotaExhausted: The daily budget is reserved for higher lanes
+            CircuitOpen: The provider is considered down
+            RegistrarBusy: No slot within the lane's maximum wait
+        """
+        lane, owner = _current_lane.get(), _current_owner.get()
+
+        if not self.admits(lane):
+            self.stats["shed"] += 1
+            raise QuotaExhausted(f"{self.name} quota is {self.quota.level().name.lower()}, {lane.name.lower()} work shed")
+        if not self.breaker.allow():
+            self.stats["short_circuited"] += 1
+            raise CircuitOpen(f"{self.name} is unavailable, circuit open")
+
+        try:
+            await self._acquire(lane, owner)
+        except BaseException:
+            self.breaker.abandon()
+            raise
+
+        self.quota.record()
+        call = ProviderCall()
+        try:
+            yield call
+        except RegistrarBusy:
+            # Raised by a nested slot, not an outcome of this provider
+            self.breaker.abandon()
+            raise
+        except Exception:
+            self.breaker.record(True, call.elapsed() if measure_latency else None)
+            raise
+        except BaseException:
+            # Cancelled, the provider's answer is unknown
+            self.breaker.abandon()
+            raise
+        else:
+            self.breaker.record(call.is_failed, call.elapsed() if measure_latency else None)
+        finally:
+            self._release()
+
+    async def _acquire(self, lane: Lane, owner: str) -> None:
+        now = time.monotonic()
+        if not self._has_waiters() and self._in_flight < self.concurrency and now >= self._paused_until:
+            if not self._uses_shared_bucket(now):
+                paid = not self._take_token(lane, now)
+            else:
+                # Shared tokens are only taken off the event loop, by the pump
+                paid = self._spare_tokens > 0
+                self._spare_tokens -= paid
+        else:
+            paid = False
+        if paid:
+            self._start()
+        else:
+            future = asyncio.get_running_loop().create_future()
+            owners = self._waiting[lane]
+            if not owners:
+                # A lane coming back from idle can't spend credit it saved up
+                self._pass[lane] = max(self._pass[lane], self._virtual_time)
+            owners.setdefault(owner, deque()).append(future)
+            self.stats["queued"] += 1
+            if self._wakeup is None:
+                self._dispatch()
+
+            try:
+                await asyncio.wait_for(asyncio.shield(future), LANE_MAX_WAIT[lane])
+            except asyncio.TimeoutError:
+                # A slot granted right at the deadline is still taken
+                if not future.done():
+                    future.cancel()
+                    self.stats["timed_out"] += 1
+                    raise RegistrarBusy(f"No {self.name} capacity within {LANE_MAX_WAIT[lane]}s")
+            except asyncio.CancelledError:
+                # Granted just as the caller went away, give the slot back
+                if future.done() and not future.cancelled():
+                    self._release()
+                else:
+                    future.cancel()
+                raise
+
+    def snapshot(self) -> Dict:
+        """Current queue depths, counters and breaker health, for monitoring."""
+        return {
+            "health": self.breaker.health(),
+            "quota": self.quota.snapshot(),
+            "in_flight": self._in_flight,
+            "waiting": {
+                lane.name.lower(): sum(
+                    not future.done()
+                    for waiters in self._waiting[lane].values()
+                    for future in waiters
+                )
+                for lane in Lane
+            },
+            **self.stats,
+        }
+
+
+class ProviderCall:
+    """Outcome of one provider call, reported to the circuit breaker."""
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.is_failed = False
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    def failed(self) -> None:
+        """Count the call as failed even though it returned, e.g. on a 5xx."""
+        self.is_failed = True
+
+
+def retry_after_seconds(headers, default: float = 1.0) -> float:
+    """Seconds from a 429 response's Retry-After header, or the default."""
+    try:
+        return max(float(headers.get("Retry-After", default)), 0.0)
+    except (TypeError, ValueError):
+        return default
+
+
+registrar_rate_storage = (
+    SQLiteStorage(REGISTRAR_RATE_STORAGE_URI, busy_timeout=REGISTRAR_RATE_BUSY_TIMEOUT)
+    if REGISTRAR_RATE_STORAGE_URI
+    else None
+)
+
+godaddy_scheduler = ProviderScheduler(
+    "GoDaddy",
+    concurrency=int(os.getenv("GODADDY_MAX_CONCURRENCY", "20")),
+    rate_per_second=float(os.getenv("GODADDY_RATE_PER_SECOND", "20")),
+    burst=int(os.getenv("GODADDY_RATE_BURST", "40")),
+    # Availability checks time out after 10s, 4s is already unusually slow
+    breaker=CircuitBreaker("GoDaddy", slow_call_seconds=4),
+    quota=ProviderQuota(
+        "GoDaddy",
+        credential_id(os.getenv("GODADDY_API_KEY")),
+        daily_budget=int(os.getenv("GODADDY_DAILY_QUOTA", "0")),
+        ledger=quota_ledger,
+    ),
+    shared_bucket=registrar_rate_storage,
+)
+
+dynadot_scheduler = ProviderScheduler(
+    "Dynadot",
+    concurrency=int(os.getenv("DYNADOT_MAX_CONCURRENCY", "10")),
+    rate_per_second=float(os.getenv("DYNADOT_RATE_PER_SECOND", "10")),
+    breaker=CircuitBreaker("Dynadot", slow_call_seconds=5),
+    quota=ProviderQuota(
+        "Dynadot",
+        credential_id(os.getenv("DYNADOT_API_KEY")),
+        daily_budget=int(os.getenv("DYNADOT_DAILY_QUOTA", "0")),
+        ledger=quota_ledger,
+    ),
+    shared_bucket=registrar_rate_storage,
+)
+
+
+def quota_level() -> QuotaLevel:
+    """Highest quota pressure across providers. Every check path asks
+    GoDaddy and most ask Dynadot too, so caches stretch as soon as either
+    budget runs low. Providers without a budget are always NORMAL."""
+    return max(scheduler.quota.level() for scheduler in (godaddy_scheduler, dynadot_scheduler))
+
+
+def provider_health() -> Dict[str, Dict]:
+    """Circuit breaker health of every registrar provider."""
+    return {
+        scheduler.name.lower(): scheduler.breaker.health()
+        for scheduler in (godaddy_scheduler, dynadot_scheduler)
+    }
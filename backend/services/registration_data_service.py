@@ -0,0 +1,219 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import aiohttp
+import whois
+
+logger = logging.getLogger(__name__)
+
+# RDAP configuration
+# The IANA bootstrap file maps each TLD to its registry's RDAP server
+RDAP_BOOTSTRAP_URL = "https://data.iana.org/rdap/dns.json"
+RDAP_FALLBACK_URL = "https://rdap.org/domain/{}"
+BOOTSTRAP_TTL = 86400  # 24 hours in seconds
+
+# In-memory cache shared by all watchers of a domain
+# Expiry dates are also persisted on the watchlist rows, which act as the
+# long-lived cache between refreshes
+# Format: {domain: (result, timestamp)}
+REGISTRATION_CACHE = {}
+REGISTRATION_CACHE_TTL = 86400  # 24 hours in seconds
+
+# Concurrency for bulk lookups
+LOOKUP_CONCURRENCY = 5
+
+# Bootstrap data: {tld: rdap_base_url}
+_RDAP_SERVERS = {}
+_BOOTSTRAP_TIMESTAMP = 0
+
+# Shared session for RDAP requests, created on first use
+_SESSION = None
+
+# Normalized EPP status of a domain in its last days before deletion
+PENDING_DELETE = "pendingdelete"
+
+
+async def get_session():
+    """Get or create the shared aiohttp ClientSession used for RDAP lookups"""
+    global _SESSION
+    if _SESSION is None or _SESSION.closed:
+        _SESSION = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=20, keepalive_timeout=60),
+            timeout=aiohttp.ClientTimeout(total=15),
+            headers={"Accept": "application/rdap+json"},
+        )
+    return _SESSION
+
+
+async def close_session():
+    """Close the RDAP session if it exists"""
+    global _SESSION
+    if _SESSION and not _SESSION.closed:
+        await _SESSION.close()
+        _SESSION = None
+        logger.debug("Closed RDAP session")
+
+
+def _to_naive_utc(value: datetime) -> datetime:
+    # Database timestamps are stored as naive UTC
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def normalize_status(status) -> str:
+    """
+    Normalize a domain status to its bare EPP code, so RDAP and WHOIS
+    spellings compare equal.
+
+    Args:
+        status: RDAP status, e.g. "pending delete", or WHOIS status, e.g.
+            "pendingDelete https://icann.org/epp#pendingDelete"
+
+    Returns:
+        Lowercase status without spaces, underscores or the ICANN link,
+        e.g. "pendingdelete"
+    """
+    status = str(status).strip()
+    # WHOIS statuses carry a link to the ICANN EPP status description
+    link = status.find("http")
+    if link > 0:
+        status = status[:link]
+    return "".join(char for char in status.lower() if char not in " \t_-")
+
+
+def _parse_rdap_date(value: str) -> Optional[datetime]:
+    try:
+        return _to_naive_utc(datetime.fromisoformat(value.replace("Z", "+00:00")))
+    except (ValueError, AttributeError):
+        logger.warning(f"Could not parse RDAP date: {value}")
+        return None
+
+
+async def _get_rdap_server(tld: str) -> Optional[str]:
+    """Look up the RDAP base URL for a TLD, refreshing the bootstrap file daily"""
+    global _RDAP_SERVERS, _BOOTSTRAP_TIMESTAMP
+
+    if not _RDAP_SERVERS or time.time() - _BOOTSTRAP_TIMESTAMP > BOOTSTRAP_TTL:
+        try:
+            session = await get_session()
+            async with session.get(RDAP_BOOTSTRAP_URL) as response:
+                if response.status == 200:
+                    data = await response.json(content_type=None)
+                    servers = {}
+                    for tlds, urls in data.get("services", []):
+                        for service_tld in tlds:
+                            servers[service_tld.lower()] = urls[0].rstrip("/")
+                    _RDAP_SERVERS = servers
+                    _BOOTSTRAP_TIMESTAMP = time.time()
+                    logger.info(f"Loaded RDAP bootstrap data for {len(servers)} TLDs")
+                else:
+                    logger.error(f"RDAP bootstrap error: Status {response.status}")
+        except Exception as e:
+            logger.error(f"Error loading RDAP bootstrap data: {str(e)}")
+
+    return _RDAP_SERVERS.get(tld.lower())
+
+
+async def lookup_rdap(domain: str) -> Optional[Dict]:
+    """
+    Fetch registration data for a domain over RDAP.
+    Returns None if the registry could not be reached or has no record.
+    """
+    tld = domain.rsplit(".", 1)[-1]
+    server = await _get_rdap_server(tld)
+    url = f"{server}/domain/{domain}" if server else RDAP_FALLBACK_URL.format(domain)
+
+    try:
+        session = await get_session()
+        async with session.get(url) as response:
+            if response.status != 200:
+                logger.debug(f"RDAP lookup for {domain} returned status {response.status}")
+                return None
+            data = await response.json(content_type=None)
+    except Exception as e:
+        logger.error(f"Error during RDAP lookup for {domain}: {str(e)}")
+        return None
+
+    expires_at = None
+    for event in data.get("events", []):
+        if event.get("eventAction") == "expiration":
+            expires_at = _parse_rdap_date(event.get("eventDate"))
+            break
+
+    return {
+        "expires_at": expires_at,
+        "statuses": [normalize_status(status) for status in data.get("status", [])],
+        "source": "rdap",
+    }
+
+
+async def lookup_whois(domain: str) -> Optional[Dict]:
+    """
+    Fetch registration data for a domain over WHOIS.
+    The whois client is blocking, so it runs in a worker thread.
+    """
+    try:
+        result = await asyncio.to_thread(whois.query, domain)
+    except Exception as e:
+        logger.error(f"Error during WHOIS lookup for {domain}: {str(e)}")
+        return None
+
+    if not result:
+        return None
+
+    expires_at = getattr(result, "expiration_date", None)
+    return {
+        "expires_at": _to_naive_utc(expires_at) if isinstance(expires_at, datetime) else None,
+        "statuses": [normalize_status(status) for status in getattr(result, "statuses", []) or []],
+        "source": "whois",
+    }
+
+
+async def get_registration_data(domain: str, max_age: Optional[float] = None) -> Optional[Dict]:
+    """
+    Get registration data for a domain, trying RDAP first and WHOIS second.
+
+    Args:
+        domain: Full domain name
+        max_age: Ignore cached results older than this many seconds
+
+    Returns:
+        Dict with "expires_at" (naive UTC datetime or None), "statuses"
+        (see normalize_status) and "source", or None if neither protocol
+        returned a record
+    """
+    domain = domain.lower()
+    if domain in REGISTRATION_CACHE:
+        result, timestamp = REGISTRATION_CACHE[domain]
+        age = time.time() - timestamp
+        if age < REGISTRATION_CACHE_TTL and (max_age is None or age < max_age):
+            return result
+        del REGISTRATION_CACHE[domain]
+
+    result = await lookup_rdap(domain)
+    if result is None or result["expires_at"] is None:
+        logger.debug(f"Falling back to WHOIS for {domain}")
+        whois_result = await lookup_whois(domain)
+        if whois_result is not None:
+            result = whois_result
+
+    if result is not None:
+        REGISTRATION_CACHE[domain] = (result, time.time())
+    return result
+
+
+async def get_registration_data_bulk(
+    domains: List[str], max_age: Optional[float] = None
+) -> Dict[str, Optional[Dict]]:
+    """Look up registration data for several domains with bounded concurrency"""
+    semaphore = asyncio.Semaphore(LOOKUP_CONCURRENCY)
+
+    async def lookup(domain):
+        async with semaphore:
+            return domain, await get_registration_data(domain, max_age)
+
+    return dict(await asyncio.gather(*(lookup(domain) for domain in domains)))
@@ -2,24 +2,56 @@ import aiohttp
 import asyncio
 import requests
 import logging
-from typing import Dict, Optional, List
+import time
+import weakref
+from typing import AsyncIterator, Dict, Optional, List
 
 logger = logging.getLogger(__name__)
 
 # Social media platforms with profile URLs and unique text to detect username availability
+# Each platform declares a probe strategy:
+#   "status" - decide from the status code alone, the body is never downloaded
+#   "marker" - stream the body in chunks and stop as soon as the not_found marker
+#              is seen or max_bytes have been read
+# "concurrency" and "min_interval" bound the request rate each platform sees
+# from this process, shared by all single and batch checks running in it.
 
 SOCIAL_MEDIA_PLATFORMS = {
     "Twitter": {
         "url": "https://lightbrd.com/{}",
         "status_code": 404,
+        "probe": "status",
+        "concurrency": 2,
+        "min_interval": 0.5,
     },  # 404 means available
-    "YouTube": {"url": "https://www.youtube.com/{}", "status_code": 404},
+    "YouTube": {
+        "url": "https://www.youtube.com/{}",
+        "status_code": 404,
+        "probe": "status",
+        "concurrency": 4,
+        "min_interval": 0.1,
+    },
     "Reddit": {
         "url": "https://www.reddit.com/user/{}",
         "not_found": "Sorry, nobody on Reddit goes by that name",
+        "probe": "marker",
+        "max_bytes": 256 * 1024,
+        "concurrency": 2,
+        "min_interval": 0.5,
     },
 }
 
+# Streaming probe settings
+PROBE_CHUNK_SIZE = 8192
+DEFAULT_MAX_PROBE_BYTES = 128 * 1024
+
+# Batch check settings
+DEFAULT_PLATFORM_CONCURRENCY = 2
+DEFAULT_PLATFORM_MIN_INTERVAL = 0.25
+MAX_BATCH_USERNAMES = 50
+
+BROWSER_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36"
+
 
 class SocialMediaCheckError(Exception):
     def __init__(
@@ -36,24 +68,53 @@ class SocialMediaCheckError(Exception):
         super().__init__(message)
 
 
+async def stream_contains_marker(response, marker: str, max_bytes: int) -> bool:
+    """
+    Read the response body in chunks until the marker is found or max_bytes is hit.
+    Matching is case-insensitive and handles markers split across chunk boundaries.
+    """
+    needle = marker.lower().encode("utf-8")
+    overlap = len(needle) - 1
+    tail = b""
+    bytes_read = 0
+
+    async for chunk in response.content.iter_chunked(PROBE_CHUNK_SIZE):
+        bytes_read += len(chunk)
+        window = tail + chunk.lower()
+        if needle in window:
+            return True
+        if bytes_read >= max_bytes:
+            logger.debug(f"Marker probe stopped after {bytes_read} bytes for {response.url}")
+            break
+        tail = window[-overlap:] if overlap > 0 else b""
+
+    return False
+
+
 async def check_single_platform(session, platform, data, username):
     """checks username availability on a single platform."""
     url = data["url"].format(username)
     headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36",
+        "User-Agent": BROWSER_USER_AGENT,
         "Accept-Language": "en-US,en;q=0.9",
         "Referer": "https://nitter.net/",
     }
+    probe = data.get("probe", "marker" if "not_found" in data else "status")
 
     try:
         async with session.get(url, headers=headers, timeout=5, ssl=False) as response:
-            page_content = await response.text()
-
+            # Decide from the status code whenever the platform allows it
             if "status_code" in data and response.status == data["status_code"]:
                 return platform, {"available": True, "status": "Available"}
-            elif (
-                "not_found" in data
-                and data["not_found"].lower() in page_content.lower()
+
+            if (
+                probe == "marker"
+                and "not_found" in data
+                and await stream_contains_marker(
+                    response,
+                    data["not_found"],
+                    data.get("max_bytes", DEFAULT_MAX_PROBE_BYTES),
+                )
             ):
                 return platform, {"available": True, "status": "Available"}
             elif response.status == 200:
@@ -69,82 +130,105 @@ async def check_single_platform(session, platform, data, username):
         return platform, {"available": None, "status": "Error", "error": str(e)}
 
 
+def clean_username(username: str) -> str:
+    """Validate a username and strip everything except letters, digits and underscores."""
+    if not username or not username.strip():
+        raise SocialMediaCheckError(
+            message="Invalid username for social media check",
+            username=username,
+            error_code="INVALID_USERNAME",
+        )
+
+    # Clean the username - remove special characters
+    cleaned = "".join(e for e in username if e.isalnum() or e == "_")
+
+    if not cleaned:
+        raise SocialMediaCheckError(
+            message="Username contains no valid characters",
+            username=username,
+            error_code="INVALID_USERNAME",
+        )
+    return cleaned
+
+
+def check_twitter(http, username: str) -> Dict:
+    """
+    Check Twitter/X with `requests` instead of `aiohttp` (to avoid 403 errors).
+    `http` is either the requests module or a shared requests.Session.
+    """
+    twitter_url = SOCIAL_MEDIA_PLATFORMS["Twitter"]["url"].format(username)
+    try:
+        response = http.get(
+            twitter_url,
+            headers={"User-Agent": BROWSER_USER_AGENT},
+            timeout=5,
+            stream=True,  # Status code is enough, don't download the page
+        )
+        response.close()
+        if response.status_code == 404:
+            return {"available": True, "status": "Available"}
+        elif response.status_code == 200:
+            return {"available": False, "status": "Taken"}
+        else:
+            return {
+                "available": True,
+                "status": f"Available",
+            }
+    except requests.RequestException as e:
+        logger.error(f"Error checking Twitter for username {username}: {str(e)}")
+        return {"available": None, "status": "Error", "error": str(e)}
+
+
+def format_platform_results(username: str, results: Dict) -> Dict:
+    """Build the per-username response with availability counts."""
+    return {
+        "username": username,
+        "platforms": results,
+        "available_count": sum(
+            1 for platform in results.values() if platform.get("available") is True
+        ),
+        "taken_count": sum(
+            1 for platform in results.values() if platform.get("available") is False
+        ),
+        "error_count": sum(
+            1 for platform in results.values() if platform.get("available") is None
+        ),
+    }
+
+
 async def check_social_media(username: str) -> Dict:
     """
     Checks username availability across multiple social media platforms
     Returns availability status for each platform
     """
     try:
-        if not username or not username.strip():
-            raise SocialMediaCheckError(
-                message="Invalid username for social media check",
-                username=username,
-                error_code="INVALID_USERNAME",
-            )
-
-        # Clean the username - remove special characters
-        clean_username = "".join(e for e in username if e.isalnum() or e == "_")
-
-        if not clean_username:
-            raise SocialMediaCheckError(
-                message="Username contains no valid characters",
-                username=username,
-                error_code="INVALID_USERNAME",
-            )
+        clean_name = clean_username(username)
 
         results = {}
 
         # Force HTTP/1.1 instead of HTTP/2 to avoid bot detection
         connector = aiohttp.TCPConnector(force_close=True)
 
+        gates = _platform_gates()
+
+        async def check_platform(session, platform, data):
+            async with gates[platform]:
+                return await check_single_platform(session, platform, data, clean_name)
+
         async with aiohttp.ClientSession(connector=connector) as session:
             tasks = [
-                check_single_platform(session, platform, data, clean_username)
+                check_platform(session, platform, data)
                 for platform, data in SOCIAL_MEDIA_PLATFORMS.items()
                 if platform != "Twitter"  # Handle Twitter separately
             ]
             results_list = await asyncio.gather(*tasks)
             results.update(dict(results_list))
 
-        # Use `requests` for Twitter/X instead of `aiohttp` (to avoid 403 errors)
-        twitter_url = SOCIAL_MEDIA_PLATFORMS["Twitter"]["url"].format(clean_username)
-        try:
-            response = requests.get(
-                twitter_url,
-                headers={
-                    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36"
-                },
-                timeout=5,
-            )
-            if response.status_code == 404:
-                results["Twitter"] = {"available": True, "status": "Available"}
-            elif response.status_code == 200:
-                results["Twitter"] = {"available": False, "status": "Taken"}
-            else:
-                results["Twitter"] = {
-                    "available": True,
-                    "status": f"Available",
-                }
-        except requests.RequestException as e:
-            logger.error(
-                f"Error checking Twitter for username {clean_username}: {str(e)}"
-            )
-            results["Twitter"] = {"available": None, "status": "Error", "error": str(e)}
+        async with gates["Twitter"]:
+            results["Twitter"] = await asyncio.to_thread(check_twitter, requests, clean_name)
 
         # Format the response
-        return {
-            "username": clean_username,
-            "platforms": results,
-            "available_count": sum(
-                1 for platform in results.values() if platform.get("available") is True
-            ),
-            "taken_count": sum(
-                1 for platform in results.values() if platform.get("available") is False
-            ),
-            "error_count": sum(
-                1 for platform in results.values() if platform.get("available") is None
-            ),
-        }
+        return format_platform_results(clean_name, results)
 
     except SocialMediaCheckError:
         raise
@@ -155,3 +239,113 @@ async def check_social_media(username: str) -> Dict:
             error_code="UNEXPECTED_ERROR",
             details={"error": str(e)},
         )
+
+
+class PlatformGate:
+    """Bounds concurrent requests to one platform and spaces out their start times."""
+
+    def __init__(self, concurrency: int, min_interval: float):
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._spacing_lock = asyncio.Lock()
+        self._min_interval = min_interval
+        self._next_start = 0.0
+
+    async def __aenter__(self):
+        await self._semaphore.acquire()
+        try:
+            async with self._spacing_lock:
+                now = time.monotonic()
+                if self._next_start > now:
+                    await asyncio.sleep(self._next_start - now)
+                    now = self._next_start
+                self._next_start = now + self._min_interval
+        except BaseException:
+            # Cancelled while waiting for our start time (e.g. the client
+            # disconnected), __aexit__ won't run to give the permit back
+            self._semaphore.release()
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._semaphore.release()
+
+
+# {event loop: {platform: gate}}, asyncio primitives belong to one loop
+_gates = weakref.WeakKeyDictionary()
+
+
+def _platform_gates() -> Dict[str, PlatformGate]:
+    """The gates every check in this process goes through, made on first use."""
+    loop = asyncio.get_running_loop()
+    gates = _gates.get(loop)
+    if gates is None:
+        gates = _gates[loop] = {
+            platform: PlatformGate(
+                data.get("concurrency", DEFAULT_PLATFORM_CONCURRENCY),
+                data.get("min_interval", DEFAULT_PLATFORM_MIN_INTERVAL),
+            )
+            for platform, data in SOCIAL_MEDIA_PLATFORMS.items()
+        }
+    return gates
+
+
+async def check_social_media_batch(usernames: List[str]) -> AsyncIterator[Dict]:
+    """
+    Check every platform for a whole list of usernames.
+
+    All names share one keep-alive connection pool, each platform is protected by
+    its process-wide PlatformGate, and results are yielded per username as soon as all of
+    its platforms have answered. Invalid usernames yield an error entry.
+    """
+    seen = set()
+    names = []
+    for username in usernames[:MAX_BATCH_USERNAMES]:
+        try:
+            clean_name = clean_username(username)
+        except SocialMediaCheckError as e:
+            yield {"username": username, "error": e.message, "error_code": e.error_code}
+            continue
+        if clean_name.lower() not in seen:
+            seen.add(clean_name.lower())
+            names.append(clean_name)
+
+    if not names:
+        return
+
+    gates = _platform_gates()
+    logger.info(f"Checking social media availability for {len(names)} usernames")
+
+    connector = aiohttp.TCPConnector(
+        limit_per_host=max(
+            data.get("concurrency", DEFAULT_PLATFORM_CONCURRENCY)
+            for data in SOCIAL_MEDIA_PLATFORMS.values()
+        )
+    )
+    http = requests.Session()
+
+    async def check_platform(session, platform, data, name):
+        async with gates[platform]:
+            if platform == "Twitter":
+                return platform, await asyncio.to_thread(check_twitter, http, name)
+            return await check_single_platform(session, platform, data, name)
+
+    async def check_name(session, name):
+        results_list = await asyncio.gather(
+            *(
+                check_platform(session, platform, data, name)
+                for platform, data in SOCIAL_MEDIA_PLATFORMS.items()
+            )
+        )
+        return format_platform_results(name, dict(results_list))
+
+    try:
+        async with aiohttp.ClientSession(connector=connector) as session:
+            tasks = [asyncio.create_task(check_name(session, name)) for name in names]
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    yield await next_done
+            finally:
+                for task in tasks:
+                    task.cancel()
+    finally:
+        http.close()
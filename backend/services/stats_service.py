@@ -1,49 +1,100 @@
 
 # Stats service for tracking domain generation statistics
 
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
 from fastapi import Depends
 from ..models import StatsCounter
 from ..database import get_db
+from ..write_behind import writer
+from collections import defaultdict
+import asyncio
 import logging
+import time
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Increments are summed in memory and flushed this often as one atomic
+# counter_value = counter_value + n per counter
+STATS_FLUSH_INTERVAL = 5  # seconds
+
+# Counter reads are served from memory for this long
+STATS_CACHE_TTL = 10  # seconds
+
+# Unflushed increments in this process: {counter_name: n}
+_PENDING_INCREMENTS = defaultdict(int)
+
+# Cached database values: {counter_name: (value, timestamp)}
+_COUNTER_CACHE = {}
+
+_FLUSH_TASK = None
+
+
+async def flush_counters():
+    """Hand the pending increments to the write-behind writer."""
+    global _PENDING_INCREMENTS
+    # Swap before the first await so no increment lands in a flushed dict
+    pending, _PENDING_INCREMENTS = _PENDING_INCREMENTS, defaultdict(int)
+    for counter_name, increment_by in pending.items():
+        await writer.increment_counter(counter_name, increment_by)
+    if pending:
+        await writer.flush()
+    # Cached values no longer include these increments once they are flushed
+    for counter_name in pending:
+        _COUNTER_CACHE.pop(counter_name, None)
+
+
+async def _flush_periodically():
+    while True:
+        await asyncio.sleep(STATS_FLUSH_INTERVAL)
+        try:
+            await flush_counters()
+        except Exception as e:
+            logger.error(f"Error flushing stats counters: {str(e)}")
+
+
+def _ensure_flusher():
+    global _FLUSH_TASK
+    loop = asyncio.get_running_loop()
+    if _FLUSH_TASK is None or _FLUSH_TASK.done() or _FLUSH_TASK.get_loop() is not loop:
+        _FLUSH_TASK = loop.create_task(_flush_periodically())
+
+
 class StatsService:
-    def __init__(self, db: Session = Depends(get_db)):
+    def __init__(self, db: AsyncSession = Depends(get_db)):
         self.db = db
     
     async def increment_counter(self, counter_name: str, increment_by: int = 1):
-        """Increment a counter by the specified amount"""
-        try:
-            # Try to get the counter first
-            counter = self.db.query(StatsCounter).filter(StatsCounter.counter_name == counter_name).first()
-            
-            if counter:
-                # Counter exists, increment it
-                counter.counter_value += increment_by
-            else:
-                # Counter doesn't exist, create it
-                counter = StatsCounter(counter_name=counter_name, counter_value=increment_by)
-                self.db.add(counter)
-            
-            self.db.commit()
-            logger.info(f"Incremented counter '{counter_name}' by {increment_by}, new value: {counter.counter_value}")
-            return counter.counter_value
-        
-        except SQLAlchemyError as e:
-            self.db.rollback()
-            logger.error(f"Error incrementing counter: {str(e)}")
-            return None
+        """
+        Increment a counter by the specified amount. Only the in-memory
+        total changes here, it is flushed to the database every
+        STATS_FLUSH_INTERVAL seconds.
+        """
+        _ensure_flusher()
+        _PENDING_INCREMENTS[counter_name] += increment_by
+        logger.debug(f"Incremented counter '{counter_name}' by {increment_by} in memory")
     
     async def get_counter_value(self, counter_name: str):
-        """Get the current value of a counter"""
+        """
+        Get the current value of a counter, from a cache refreshed every
+        STATS_CACHE_TTL seconds. Unflushed increments from this process are included.
+        """
+        pending = _PENDING_INCREMENTS.get(counter_name, 0)
+        if counter_name in _COUNTER_CACHE:
+            value, timestamp = _COUNTER_CACHE[counter_name]
+            if time.time() - timestamp < STATS_CACHE_TTL:
+                return value + pending
+
         try:
-            counter = self.db.query(StatsCounter).filter(StatsCounter.counter_name == counter_name).first()
-            return counter.counter_value if counter else 0
+            counter = await self.db.scalar(
+                select(StatsCounter).where(StatsCounter.counter_name == counter_name)
+            )
+            value = counter.counter_value if counter else 0
+            _COUNTER_CACHE[counter_name] = (value, time.time())
+            return value + pending
         
         except SQLAlchemyError as e:
             logger.error(f"Error getting counter value: {str(e)}")
@@ -52,15 +103,19 @@ class StatsService:
     async def reset_counter(self, counter_name: str):
         """Reset a counter to zero"""
         try:
-            counter = self.db.query(StatsCounter).filter(StatsCounter.counter_name == counter_name).first()
+            counter = await self.db.scalar(
+                select(StatsCounter).where(StatsCounter.counter_name == counter_name)
+            )
+            _PENDING_INCREMENTS.pop(counter_name, None)
+            _COUNTER_CACHE.pop(counter_name, None)
             if counter:
                 counter.counter_value = 0
-                self.db.commit()
+                await self.db.commit()
                 logger.info(f"Reset counter '{counter_name}' to 0")
                 return True
             return False
         
         except SQLAlchemyError as e:
-            self.db.rollback()
+            await self.db.rollback()
             logger.error(f"Error resetting counter: {str(e)}")
             return False 
\ No newline at end of file
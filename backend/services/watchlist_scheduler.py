@@ -0,0 +1,200 @@
+import os
+import heapq
+import math
+import random
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..models import WatchlistItem, User
+from .domain_names import InvalidDomain, join_domain
+
+logger = logging.getLogger(__name__)
+
+# Provider budget for watchlist checks, spread evenly over the hour
+WATCHLIST_CHECK_BUDGET_PER_HOUR = int(os.getenv("WATCHLIST_CHECK_BUDGET_PER_HOUR", "600"))
+
+# Check interval bounds
+BASE_CHECK_INTERVAL = timedelta(hours=6)
+MIN_CHECK_INTERVAL = timedelta(minutes=15)
+MAX_CHECK_INTERVAL = timedelta(days=7)
+RETRY_INTERVAL = timedelta(minutes=15)  # Used when a check got no answer
+
+# Domains that flipped status recently are checked more often
+RECENT_FLIP_WINDOW = timedelta(days=3)
+RECENT_FLIP_FACTOR = 0.25
+
+# Random spread applied to every interval so checks don't line up
+INTERVAL_JITTER = 0.1
+
+# Expiry-aware scheduling
+# An expired gTLD domain goes through auto-renew grace (up to 45 days),
+# redemption (30 days) and pending delete (5 days) before it drops
+EXPIRY_MAX_INTERVAL = timedelta(days=30)
+GRACE_PERIOD = timedelta(days=30)
+GRACE_CHECK_INTERVAL = timedelta(hours=12)
+DROP_WINDOW_END = timedelta(days=80)
+DROP_WINDOW_INTERVAL = timedelta(minutes=30)
+
+# Registration data is refreshed weekly, and daily once the domain has expired
+# because a renewal moves the expiry date
+REGISTRATION_REFRESH_INTERVAL = timedelta(days=7)
+EXPIRED_REFRESH_INTERVAL = timedelta(days=1)
+# Drop-watched domains need to notice pending delete promptly
+DROP_WATCH_REFRESH_INTERVAL = timedelta(hours=1)
+
+
+def registration_data_is_stale(
+    expires_at: Optional[datetime],
+    registration_checked_at: Optional[datetime],
+    now: datetime,
+    drop_watch: bool = False,
+) -> bool:
+    """Whether a watched domain's registration data should be looked up again."""
+    if registration_checked_at is None:
+        return True
+    age = now - registration_checked_at
+    if expires_at is not None and expires_at < now:
+        if drop_watch:
+            return age >= DROP_WATCH_REFRESH_INTERVAL
+        return age >= EXPIRED_REFRESH_INTERVAL
+    return age >= REGISTRATION_REFRESH_INTERVAL
+
+
+def compute_check_interval(
+    watchers: int,
+    status_changed_at: Optional[datetime],
+    now: datetime,
+    expires_at: Optional[datetime] = None,
+) -> timedelta:
+    """
+    Work out how long to wait before checking a watched domain again.
+
+    Args:
+        watchers: Number of watchlist items watching this domain
+        status_changed_at: Last time the domain's status flipped, if ever
+        now: Current UTC time
+        expires_at: Registration expiry date, if known
+
+    Returns:
+        Interval clamped to [MIN_CHECK_INTERVAL, the phase's maximum], with jitter
+    """
+    max_interval = MAX_CHECK_INTERVAL
+    if expires_at is None or now >= expires_at + DROP_WINDOW_END:
+        # Unknown expiry, or the domain was renewed and the data is stale
+        seconds = BASE_CHECK_INTERVAL.total_seconds()
+    elif now < expires_at:
+        # Nothing can happen before expiry, sleep until then
+        seconds = (expires_at - now).total_seconds()
+        max_interval = EXPIRY_MAX_INTERVAL
+    elif now < expires_at + GRACE_PERIOD:
+        seconds = GRACE_CHECK_INTERVAL.total_seconds()
+    else:
+        seconds = DROP_WINDOW_INTERVAL.total_seconds()
+
+    # More watchers means a missed drop disappoints more people
+    seconds /= 1 + math.log2(max(watchers, 1))
+
+    if status_changed_at and now - status_changed_at < RECENT_FLIP_WINDOW:
+        seconds *= RECENT_FLIP_FACTOR
+
+    # Jitter only ever brings a check forward, so it never lands past expiry
+    seconds = min(seconds, max_interval.total_seconds())
+    seconds *= random.uniform(1 - INTERVAL_JITTER, 1)
+    return timedelta(seconds=max(seconds, MIN_CHECK_INTERVAL.total_seconds()))
+
+
+def watched_rows_query():
+    """Alert-enabled, still taken watchlist rows with the columns a check cycle needs."""
+    return (
+        select(
+            WatchlistItem.id,
+            WatchlistItem.domain_name,
+            WatchlistItem.domain_extension,
+            WatchlistItem.next_check_at,
+            WatchlistItem.status_changed_at,
+            WatchlistItem.expires_at,
+            WatchlistItem.registration_checked_at,
+            WatchlistItem.pending_delete_since,
+            WatchlistItem.drop_watch,
+            User.email,
+            User.email_digest,
+        )
+        .join(User, User.id == WatchlistItem.user_id)
+        .where(
+            WatchlistItem.notify_when_available == True,
+            WatchlistItem.status == "taken",
+        )
+    )
+
+
+def group_by_domain(rows) -> Dict[str, List]:
+    """Group watchlist rows by their full domain name."""
+    grouped = defaultdict(list)
+    for row in rows:
+        try:
+            domain = join_domain(row.domain_name, row.domain_extension)
+        except InvalidDomain:
+            domain = f"{row.domain_name}.{row.domain_extension}".lower()
+        grouped[domain].append(row)
+    return grouped
+
+
+class WatchlistScheduler:
+    """
+    Priority queue of watched domains ordered by their next_check_at.
+
+    The database column is the source of truth: load() pulls the items that
+    become due within a horizon using the next_check_at index, and pop_due()
+    hands out due domains no faster than the configured hourly budget.
+    """
+
+    def __init__(
+        self,
+        budget_per_hour: int = WATCHLIST_CHECK_BUDGET_PER_HOUR,
+        tick_seconds: float = 60,
+    ):
+        self.budget_per_tick = budget_per_hour * tick_seconds / 3600
+        self._allowance = 0.0
+        self._heap = []  # (due_at, domain)
+        self._targets: Dict[str, List] = {}
+
+    def __len__(self) -> int:
+        return len(self._targets)
+
+    async def load(self, db: AsyncSession, now: datetime, horizon: timedelta) -> int:
+        """Queue every watched domain that becomes due before now + horizon."""
+        result = await db.execute(
+            watched_rows_query()
+            .where(WatchlistItem.next_check_at <= now + horizon)
+            .order_by(WatchlistItem.next_check_at)
+        )
+        grouped = group_by_domain(result.all())
+
+        for domain, domain_rows in grouped.items():
+            if domain not in self._targets:
+                due_at = min(row.next_check_at or now for row in domain_rows)
+                heapq.heappush(self._heap, (due_at, domain))
+            # Refresh the watcher list even if the domain is already queued
+            self._targets[domain] = domain_rows
+
+        logger.debug(f"Watchlist scheduler queued {len(self._targets)} domains")
+        return len(grouped)
+
+    def pop_due(self, now: datetime) -> Dict[str, List]:
+        """Pop due domains, at most the budget accumulated since the last call."""
+        self._allowance = min(
+            self._allowance + self.budget_per_tick, max(self.budget_per_tick * 2, 1)
+        )
+
+        due = {}
+        while self._heap and self._heap[0][0] <= now and self._allowance >= 1:
+            _, domain = heapq.heappop(self._heap)
+            due[domain] = self._targets.pop(domain)
+            self._allowance -= 1
+
+        if self._heap and self._heap[0][0] <= now:
+            logger.info("Watchlist check budget reached, deferring overdue domains")
+        return due
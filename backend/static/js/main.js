@@ -336,6 +336,10 @@ document.addEventListener('DOMContentLoaded', function() {
                 // Store the data globally for CSV export
                 window.currentBrandData = data;
 
+                // Social handles are checked for the whole result set in one
+                // request, once the user first asks for any of them
+                resetSocialMedia(data.map(brand => brand.name));
+
                 // Remove the additional loading indicator if it exists
                 const moreLoading = document.getElementById('moreLoading');
                 if (moreLoading) {
@@ -698,32 +702,17 @@ document.addEventListener('DOMContentLoaded', function() {
                     }
                 });
 
-                console.log('Response status:', response.status);
                 const responseText = await response.text();
-                console.log('Response text length:', responseText.length);
-                console.log('First 500 characters of response:', responseText.substring(0, 500));
 
                 if (response.ok) {
                     // Replace the current page content with the favorites page
                     document.documentElement.innerHTML = responseText;
                     console.log('Page content updated');
                     
-                    // Check if watchlist tab and content exist
-                    const watchlistTab = document.getElementById('watchlist-tab');
-                    const watchlistContent = document.getElementById('watchlist');
-                    console.log('Watchlist tab exists:', !!watchlistTab);
-                    console.log('Watchlist content exists:', !!watchlistContent);
-                    
-                    if (watchlistContent) {
-                        const watchlistItems = watchlistContent.querySelectorAll('.watchlist-list > div');
-                        console.log('Number of watchlist items found:', watchlistItems.length);
-                        watchlistItems.forEach((item, index) => {
-                            console.log(`Watchlist item ${index + 1}:`, item.dataset);
-                        });
-                    }
-                    
-                 
-                    
+                    // Scripts in the new markup don't run, so start the
+                    // paginated lists from here
+                    initializeFavoritesPage();
+
                     // Reinitialize any necessary scripts
                     updateAuthUI();
                     
@@ -1448,6 +1437,87 @@ function toggleComScoreDetails(button) {
     }
 }
 
+// Social media results streamed from the batch endpoint, keyed by cleaned username
+window.socialMediaResults = {};
+// Names of the current result set, and the batch request for them once started
+let socialMediaNames = [];
+let socialMediaBatch = null;
+// Callers waiting for a name's batch result, keyed like socialMediaResults
+let socialMediaWaiters = {};
+
+function socialMediaKey(name) {
+    return name.replace(/[^A-Za-z0-9_]/g, '').toLowerCase();
+}
+
+// Forget the previous result set's social media results
+function resetSocialMedia(names) {
+    window.socialMediaResults = {};
+    socialMediaNames = names || [];
+    socialMediaBatch = null;
+    socialMediaWaiters = {};
+}
+
+// Batch result for a name, starting the batch for the whole result set on
+// first use. Resolves to undefined if the batch doesn't return the name.
+function getBatchSocialMedia(name) {
+    const key = socialMediaKey(name);
+    const results = window.socialMediaResults;
+    if (results[key]) return Promise.resolve(results[key]);
+    if (!socialMediaBatch) {
+        socialMediaBatch = prefetchSocialMedia(socialMediaNames, results, socialMediaWaiters);
+    }
+    const batch = socialMediaBatch;
+    const waiters = socialMediaWaiters;
+    return new Promise(resolve => {
+        (waiters[key] = waiters[key] || []).push(resolve);
+        batch.then(() => resolve(results[key]));
+    });
+}
+
+// Check social media availability for all generated names with a single request
+async function prefetchSocialMedia(names, results, waiters) {
+    if (!names || names.length === 0) return;
+
+    try {
+        const response = await fetch('/api/check-social-media/batch', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({ names: names })
+        });
+
+        if (!response.ok || !response.body) {
+            console.warn('Batch social media check unavailable:', response.status);
+            return;
+        }
+
+        // Results arrive as newline-delimited JSON, one line per username
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffered = '';
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffered += decoder.decode(value, { stream: true });
+
+            const lines = buffered.split('\n');
+            buffered = lines.pop();
+            lines.filter(line => line.trim()).forEach(line => {
+                const result = JSON.parse(line);
+                if (result.platforms) {
+                    const key = socialMediaKey(result.username);
+                    results[key] = result;
+                    (waiters[key] || []).forEach(resolve => resolve(result));
+                }
+            });
+        }
+    } catch (error) {
+        console.error('Error prefetching social media results:', error);
+    }
+}
+
 // Check social media availability for a username
 async function checkSocialMedia(event, brandName) {
     event.preventDefault();
@@ -1497,14 +1567,17 @@ async function checkSocialMedia(event, brandName) {
    
     
     try {
-        // Call the API
-        const response = await fetch(`/check-social-media/${brandName}`);
-        
-        if (!response.ok) {
-            throw new Error(`Error: ${response.status}`);
+        // Use the batch result, otherwise call the API for this name alone
+        let data = await getBatchSocialMedia(brandName);
+        if (!data) {
+            const response = await fetch(`/check-social-media/${brandName}`);
+            
+            if (!response.ok) {
+                throw new Error(`Error: ${response.status}`);
+            }
+            
+            data = await response.json();
         }
-        
-        const data = await response.json();
         console.log('Social media check result:', data);
         
         // Create the result HTML
@@ -1814,6 +1887,228 @@ function updateRegisterButtonIcon(button, provider) {
 
 // Favorites Page JavaScript
 
+// Favorites and watchlist are fetched page by page from the JSON API.
+// Sorting and filtering happen on the server, so changing either starts
+// the list over from the first page.
+const listState = {
+    favorites: { url: '/api/favorites', sort: 'date', filters: {}, cursor: null, done: false, controller: null },
+    watchlist: { url: '/api/watchlist', sort: 'date', filters: {}, cursor: null, done: false, controller: null }
+};
+
+function escapeHtml(value) {
+    return String(value ?? '').replace(/[&<>"']/g, c => ({
+        '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'
+    })[c]);
+}
+
+// Dates come back as UTC ISO strings, shown as "YYYY-MM-DD HH:MM"
+function formatListDate(value) {
+    return value ? value.slice(0, 16).replace('T', ' ') : '';
+}
+
+function renderFavoriteCard(favorite) {
+    const domain = `${escapeHtml(favorite.domain_name)}.${escapeHtml(favorite.domain_extension)}`;
+    const scoreItem = (score, label) => `
+        <div class="score-item d-flex align-items-center mb-1">
+            <div class="score-bar-container flex-grow-1">
+                <div class="score-bar" data-score="${score}"></div>
+            </div>
+            <small class="ms-2">${label}</small>
+        </div>`;
+    return `
+        <div class="col-md-6 mb-4"
+             data-favorite-id="${favorite.id}"
+             data-name="${escapeHtml(favorite.domain_name)}"
+             data-score="${favorite.total_score}"
+             data-date="${formatListDate(favorite.created_at)}">
+            <div class="domain-card">
+                <div class="d-flex justify-content-between align-items-center mb-3">
+                    <h5 class="mb-0">${domain}</h5>
+                    <span class="badge bg-primary">${escapeHtml(favorite.price)}</span>
+                </div>
+                <div class="domain-score">
+                    <div class="score-circle-container d-flex justify-content-center align-items-center mb-3">
+                        <div class="score-circle" style="--score-value: ${favorite.total_score}">
+                            <div class="score-circle-inner">
+                                <span class="score-value">${favorite.total_score}</span>
+                            </div>
+                        </div>
+                    </div>
+                    <div class="score-details">
+                        ${scoreItem(favorite.length_score, 'Length')}
+                        ${scoreItem(favorite.dictionary_score, 'Dictionary')}
+                        ${scoreItem(favorite.pronounceability_score, 'Pronounceability')}
+                        ${scoreItem(favorite.repetition_score, 'Repetition')}
+                        ${scoreItem(favorite.tld_score, 'TLD')}
+                    </div>
+                </div>
+                <div class="mt-3">
+                    <a href="https://www.godaddy.com/domainsearch/find?domainToCheck=${domain}"
+                       target="_blank"
+                       class="btn btn-sm btn-outline-primary w-100">Register Domain</a>
+                </div>
+                <button class="btn btn-sm btn-outline-danger w-100 mt-2"
+                        onclick="deleteFavorite('${favorite.id}')">
+                    Remove from Favorites
+                </button>
+            </div>
+        </div>`;
+}
+
+function renderWatchlistCard(item) {
+    const domain = `${escapeHtml(item.domain_name)}.${escapeHtml(item.domain_extension)}`;
+    const status = escapeHtml(item.status);
+    const notify = Boolean(item.notify_when_available);
+    return `
+        <div class="col-md-6 mb-4"
+             data-watchlist-id="${item.id}"
+             data-name="${escapeHtml(item.domain_name)}"
+             data-date="${formatListDate(item.created_at)}"
+             data-status="${status}">
+            <div class="domain-card">
+                <div class="d-flex justify-content-between align-items-center mb-3">
+                    <h5 class="mb-0">${domain}</h5>
+                    <span class="badge ${item.status === 'available' ? 'bg-success' : 'bg-secondary'}">
+                        ${status.charAt(0).toUpperCase() + status.slice(1)}
+                    </span>
+                </div>
+                <div class="text-muted small mb-3">
+                    <div>Added: ${formatListDate(item.created_at)}</div>
+                    <div>Last checked: ${formatListDate(item.last_checked)}</div>
+                </div>
+                <div class="d-flex gap-2">
+                    ${item.status === 'available' ? `
+                    <a href="https://www.godaddy.com/domainsearch/find?domainToCheck=${domain}"
+                       target="_blank"
+                       class="btn btn-sm btn-success flex-grow-1">Register Now</a>` : ''}
+                    <button class="btn btn-sm btn-outline-danger"
+                            onclick="removeFromWatchlist('${item.id}')">
+                        Remove
+                    </button>
+                    <button class="btn btn-sm alert-toggle ${notify ? 'active' : ''}"
+                            onclick="toggleAlert('${item.id}', this)"
+                            data-notify="${notify}"
+                            data-bs-toggle="tooltip"
+                            data-bs-placement="top"
+                            title="${notify ? 'Notifications enabled' : 'Get notified when available'}">
+                        <i class="bi bi-bell${notify ? '' : '-slash'}"></i>
+                    </button>
+                </div>
+            </div>
+        </div>`;
+}
+
+async function loadListPage(listName, reset = false) {
+    const state = listState[listName];
+    const container = document.querySelector(`.${listName}-list[data-list]`);
+    const loadMore = document.querySelector(`.load-more[data-list="${listName}"]`);
+    if (!container || (!reset && (state.controller || state.done))) {
+        return;
+    }
+    if (reset) {
+        // A new sort or filter wins over the page still loading
+        if (state.controller) state.controller.abort();
+        state.cursor = null;
+        state.done = false;
+        container.innerHTML = '';
+    }
+
+    const params = new URLSearchParams({ sort: state.sort });
+    Object.entries(state.filters).forEach(([key, value]) => {
+        if (value) params.set(key, value);
+    });
+    if (state.cursor) params.set('cursor', state.cursor);
+
+    const controller = new AbortController();
+    state.controller = controller;
+    try {
+        const response = await fetch(`${state.url}?${params}`, {
+            headers: { 'Authorization': `Bearer ${localStorage.getItem('authToken')}` },
+            signal: controller.signal
+        });
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}`);
+        }
+        const page = await response.json();
+        if (controller.signal.aborted) {
+            return;
+        }
+        const render = listName === 'favorites' ? renderFavoriteCard : renderWatchlistCard;
+        container.insertAdjacentHTML('beforeend', page.items.map(render).join(''));
+
+        state.cursor = page.next_cursor;
+        state.done = !page.next_cursor;
+        if (loadMore) loadMore.classList.toggle('d-none', state.done);
+
+        if (!container.children.length) {
+            container.innerHTML = listName === 'favorites'
+                ? '<div class="col-12 text-center py-5"><p class="text-muted">You have no saved domains yet.</p></div>'
+                : '<div class="col-12 text-center py-5"><p class="text-muted">No watched domains match.</p></div>';
+        }
+
+        if (typeof bootstrap !== 'undefined') {
+            container.querySelectorAll('[data-bs-toggle="tooltip"]').forEach(el => bootstrap.Tooltip.getOrCreateInstance(el));
+        }
+    } catch (error) {
+        if (controller.signal.aborted) {
+            return;
+        }
+        console.error(`Error loading ${listName}:`, error);
+        showToast(`Failed to load ${listName}`, 'error');
+    } finally {
+        if (state.controller === controller) {
+            state.controller = null;
+        }
+    }
+}
+
+function initializeFavoritesPage() {
+    Object.keys(listState).forEach(listName => {
+        const pane = document.getElementById(listName);
+        if (!pane || !pane.querySelector('[data-list]')) {
+            return;
+        }
+        const state = listState[listName];
+
+        pane.querySelectorAll('.btn-group button[data-sort]').forEach(button => {
+            button.addEventListener('click', () => {
+                pane.querySelectorAll('.btn-group button[data-sort]').forEach(btn => btn.classList.remove('active'));
+                button.classList.add('active');
+                state.sort = button.getAttribute('data-sort');
+                loadListPage(listName, true);
+            });
+        });
+
+        pane.querySelectorAll('[data-filter]').forEach(input => {
+            input.addEventListener('change', () => {
+                state.filters[input.getAttribute('data-filter')] = input.value.trim();
+                loadListPage(listName, true);
+            });
+        });
+
+        // Next page loads when the button scrolls into view, or on click
+        const loadMore = pane.querySelector('.load-more');
+        if (loadMore) {
+            loadMore.addEventListener('click', () => loadListPage(listName));
+            if ('IntersectionObserver' in window) {
+                new IntersectionObserver(entries => {
+                    if (entries.some(entry => entry.isIntersecting)) {
+                        loadListPage(listName);
+                    }
+                }, { rootMargin: '200px' }).observe(loadMore);
+            }
+        }
+
+        loadListPage(listName, true);
+    });
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    if (document.querySelector('.favorites-list[data-list]')) {
+        initializeFavoritesPage();
+    }
+});
+
 // Make sure deleteFavorite is defined in the global scope
 function deleteFavorite(favoriteId) {
     if (!confirm('Are you sure you want to remove this domain from your favorites?')) {
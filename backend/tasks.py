@@ -1,113 +1,449 @@
 from datetime import datetime, timedelta
 import asyncio
-from sqlalchemy.orm import Session
-from sqlalchemy import select
-from .database import SessionLocal
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import select, update, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from .database import AsyncSessionLocal
 from .models import WatchlistItem, AlertHistory, User
-from .services.domain_checker_forEmail import check_domain_availability
-from .services.email_service import send_domain_availability_email
+from .services.domain_checker_forEmail import (
+    check_domain_availability,
+    check_domains_availability,
+)
+from .services.email_service import send_domain_availability_email, queue_availability_email
+from .job_queue import enqueue, job_handler, PRIORITY_HIGH, PRIORITY_LOW
+from .services.registration_data_service import PENDING_DELETE, get_registration_data_bulk
+from .services.watchlist_scheduler import (
+    WatchlistScheduler,
+    watched_rows_query,
+    group_by_domain,
+    compute_check_interval,
+    registration_data_is_stale,
+    RETRY_INTERVAL,
+    DROP_WATCH_REFRESH_INTERVAL,
+)
+from .services.drop_watcher import DropWatcher, PENDING_DELETE_PERIOD, DROP_WATCH_LEAD
+from .services.domain_names import split_domain
 import logging
 
 logger = logging.getLogger(__name__)
 
 
-async def check_watchlist_domains():
-    """Background task to check watchlist domains and send alerts."""
-    while True:
-        try:
-            logger.info("Starting watchlist domain check cycle")
-            db = SessionLocal()
-            # Get all watchlist items with notifications enabled
-            watchlist_items = (
-                db.query(WatchlistItem)
-                .filter(
-                    WatchlistItem.notify_when_available == True,
-                    WatchlistItem.status == "taken",
+# Number of watchlist rows updated per transaction
+WATCHLIST_COMMIT_CHUNK = 200
+
+# How often the scheduler hands out due domains and reloads upcoming ones
+WATCHLIST_TICK_SECONDS = 60
+WATCHLIST_RELOAD_SECONDS = 300
+
+# Seconds a claimed watchlist check job stays hidden before it is retried
+WATCHLIST_JOB_VISIBILITY_TIMEOUT = 900
+
+# How often the drop watcher looks for domains entering their burst window
+DROP_WATCH_RELOAD_SECONDS = 60
+
+
+def _chunks(items: List, size: int):
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+async def publish_availability(
+    db: AsyncSession,
+    available: Dict[str, Optional[Dict]],
+    available_rows: List[Tuple[str, Any]],
+    checked_at: datetime,
+    send_priority: Optional[int] = None,
+) -> None:
+    """
+    Flip every watcher of a newly available domain to "available", record an
+    alert for each and queue the notification emails, all in one transaction.
+
+    Emails are grouped per recipient, so users with digest mode get a single
+    message for all domains that became available in this cycle.
+
+    Args:
+        db: Open database session
+        available: Mapping of full domain name to its price info
+        available_rows: (domain, watchlist row) pairs, rows need id, email
+            and email_digest
+        checked_at: Time the availability was observed
+        send_priority: Job priority to send the emails with right away,
+            None to leave them to the outbox poll
+    """
+    await db.execute(
+        update(WatchlistItem),
+        [
+            {
+                "id": row.id,
+                "last_checked": checked_at,
+                "status": "available",
+                "status_changed_at": checked_at,
+            }
+            for _, row in available_rows
+        ],
+    )
+
+    # {email: [(domain, alert_id)]}
+    notifications = defaultdict(list)
+    digest = {}
+    for chunk in _chunks(available_rows, WATCHLIST_COMMIT_CHUNK):
+        alerts = []
+        for domain, row in chunk:
+            alerts.append(
+                AlertHistory(
+                    watchlist_item_id=row.id,
+                    alert_type="available",
+                    message=f"Domain {domain} is now available!",
+                    sent_at=checked_at,
+                    delivered=False,
                 )
-                .all()
             )
+        db.add_all(alerts)
+        await db.flush()  # Assigns alert ids
+
+        for alert, (domain, row) in zip(alerts, chunk):
+            if available[domain] and row.email:
+                notifications[row.email].append((domain, alert.id))
+                digest[row.email] = bool(row.email_digest)
+            else:
+                logger.info(f"Email notification skipped for {domain}")
+
+    outbox = []
+    for email, items in notifications.items():
+        groups = [items] if digest[email] else [[item] for item in items]
+        for group in groups:
+            outbox.append(
+                queue_availability_email(
+                    db,
+                    email,
+                    [(domain, available[domain]) for domain, _ in group],
+                    [alert_id for _, alert_id in group],
+                )
+            )
+    queued = len(outbox)
+
+    if outbox and send_priority is not None:
+        await db.flush()  # Assigns outbox ids
+        # Committed with the emails, so the job can't run before they exist
+        enqueue(
+            "send_outbox_emails",
+            {"email_ids": [email.id for email in outbox]},
+            priority=send_priority,
+            db=db,
+        )
+    await db.commit()
 
-            logger.info(f"Checking {len(watchlist_items)} watchlist domains")
-
-            for item in watchlist_items:
-                try:
-                    # Get the user's email address
-                    user = db.query(User).filter(User.id == item.user_id).first()
-                    if not user or not user.email:
-                        logger.error(f"User info missing for watchlist item {item.id}")
-                        continue
-                        
-                    # Check if domain is available
-                    domain_name = f"{item.domain_name}.{item.domain_extension}"
-                    logger.info(f"Checking domain: {domain_name} for user: {user.email}")
-                    
-                    # Call domain availability checker
-                    is_available, price_info = await check_domain_availability(
-                        item.domain_name, item.domain_extension
+    logger.info(
+        f"{len(available)} domains became available for {len(available_rows)} watchlist items, "
+        f"queued {queued} email notifications"
+    )
+
+
+async def run_watchlist_check_cycle(targets: Dict[str, List]) -> None:
+    """
+    Check a batch of due watched domains as a set-based pipeline:
+    check each unique domain once, reschedule every item, apply status
+    changes and alerts in bulk, then send the emails.
+
+    Args:
+        targets: Mapping of full domain name to the watchlist rows watching it
+    """
+    watcher_count = sum(len(rows) for rows in targets.values())
+    logger.info(
+        f"Checking {len(targets)} unique domains for {watcher_count} watchlist items"
+    )
+    if not targets:
+        return
+
+    results = await check_domains_availability(list(targets.keys()))
+    checked_at = datetime.utcnow()
+
+    async with AsyncSessionLocal() as db:
+        # Items may have been removed or muted since they were queued
+        queued_ids = [row.id for rows in targets.values() for row in rows]
+        live_ids = set()
+        for chunk in _chunks(queued_ids, WATCHLIST_COMMIT_CHUNK):
+            live_ids.update(
+                await db.scalars(
+                    select(WatchlistItem.id).where(
+                        WatchlistItem.id.in_(chunk),
+                        WatchlistItem.notify_when_available == True,
+                        WatchlistItem.status == "taken",
                     )
-                    
-                    # Update the last checked timestamp
-                    item.last_checked = datetime.utcnow()
-
-                    if is_available and item.status == "taken":
-                        # Domain has become available
-                        logger.info(f"Domain {domain_name} is now available!")
-                        item.status = "available"
-
-                        # Create alert
-                        alert = AlertHistory(
-                            watchlist_item_id=item.id,
-                            alert_type="available",
-                            message=f"Domain {domain_name} is now available!",
-                            sent_at=datetime.utcnow(),
+                )
+            )
+
+        updates = []
+        available = {}
+        available_rows = []
+        still_taken = {}
+        for domain, rows in targets.items():
+            rows = [row for row in rows if row.id in live_ids]
+            if not rows:
+                continue
+
+            if domain not in results:
+                # No answer this time, try again soon
+                next_check_at = checked_at + RETRY_INTERVAL
+                updates.extend({"id": row.id, "next_check_at": next_check_at} for row in rows)
+                continue
+
+            is_available, price_info = results[domain]
+            if is_available:
+                available[domain] = price_info
+                available_rows.extend((domain, row) for row in rows)
+            else:
+                still_taken[domain] = rows
+
+        # Refresh expiry dates that are missing or stale, then schedule each
+        # taken domain around its expiry
+        stale_domains = {
+            domain: any(row.drop_watch for row in rows)
+            for domain, rows in still_taken.items()
+            if registration_data_is_stale(
+                rows[0].expires_at,
+                rows[0].registration_checked_at,
+                checked_at,
+                drop_watch=any(row.drop_watch for row in rows),
+            )
+        }
+        registration_data = {}
+        drop_watched = [domain for domain, drop_watch in stale_domains.items() if drop_watch]
+        others = [domain for domain, drop_watch in stale_domains.items() if not drop_watch]
+        if drop_watched:
+            registration_data.update(
+                await get_registration_data_bulk(
+                    drop_watched, max_age=DROP_WATCH_REFRESH_INTERVAL.total_seconds()
+                )
+            )
+        if others:
+            registration_data.update(await get_registration_data_bulk(others))
+        if stale_domains:
+            logger.info(f"Refreshed registration data for {len(stale_domains)} domains")
+
+        for domain, rows in still_taken.items():
+            registration_fields = {}
+            expires_at = rows[0].expires_at
+            if domain in registration_data:
+                registration_fields["registration_checked_at"] = checked_at
+                if registration_data[domain] is not None:
+                    expires_at = registration_data[domain]["expires_at"]
+                    registration_fields["expires_at"] = expires_at
+                    # Drop-watch starts burst polling from this timestamp
+                    if PENDING_DELETE in registration_data[domain]["statuses"]:
+                        registration_fields["pending_delete_since"] = (
+                            rows[0].pending_delete_since or checked_at
                         )
-                        db.add(alert)
-
-                        # Send email notification if notify_when_available is enabled
-                        if item.notify_when_available and price_info:
-                            try:
-                                logger.info(f"Sending email to {user.email} for domain {domain_name}")
-                                email_sent = await send_domain_availability_email(
-                                    user.email, 
-                                    domain_name, 
-                                    price_info
-                                )
-                                
-                                # Update alert delivery status
-                                alert.delivered = email_sent
-                                logger.info(f"Email notification sent: {email_sent}")
-                                
-                            except Exception as email_error:
-                                logger.error(f"Failed to send email notification: {str(email_error)}")
-                                alert.delivered = False
-                        else:
-                            logger.info(f"Email notification disabled for {domain_name}")
-                            alert.delivered = False
-
-                    elif not is_available and item.status == "available":
-                        # Domain has become unavailable again
-                        logger.info(f"Domain {domain_name} is no longer available")
-                        item.status = "taken"
-
-                except Exception as e:
-                    logger.error(
-                        f"Error checking domain {item.domain_name}.{item.domain_extension}: {str(e)}"
-                    )
-                    continue
+                    else:
+                        registration_fields["pending_delete_since"] = None
+
+            status_changed_at = max(
+                (row.status_changed_at for row in rows if row.status_changed_at),
+                default=None,
+            )
+            next_check_at = checked_at + compute_check_interval(
+                len(rows), status_changed_at, checked_at, expires_at
+            )
+            updates.extend(
+                {
+                    "id": row.id,
+                    "last_checked": checked_at,
+                    "next_check_at": next_check_at,
+                    **registration_fields,
+                }
+                for row in rows
+            )
+
+        for chunk in _chunks(updates, WATCHLIST_COMMIT_CHUNK):
+            await db.execute(update(WatchlistItem), chunk)
+            await db.commit()
+
+        if available_rows:
+            await publish_availability(db, available, available_rows, checked_at)
+
 
-            # Commit changes to database
-            db.commit()
-            logger.info("Completed watchlist domain check cycle")
+@job_handler("check_watchlist_batch", visibility_timeout=WATCHLIST_JOB_VISIBILITY_TIMEOUT)
+async def check_watchlist_batch(payload: Dict) -> None:
+    """
+    Job that checks one batch of due watchlist items handed out by the
+    scheduler. Rows are loaded fresh, so items removed or muted since the
+    batch was queued are skipped.
+    """
+    rows = []
+    async with AsyncSessionLocal() as db:
+        for chunk in _chunks(payload.get("item_ids") or [], WATCHLIST_COMMIT_CHUNK):
+            result = await db.execute(watched_rows_query().where(WatchlistItem.id.in_(chunk)))
+            rows.extend(result.all())
+    await run_watchlist_check_cycle(group_by_domain(rows))
+
+
+async def enqueue_watchlist_check(due: Dict[str, List], now: datetime) -> None:
+    """
+    Queue a check_watchlist_batch job for the due domains.
 
+    Their next_check_at moves RETRY_INTERVAL ahead in the same transaction,
+    so a scheduler reload doesn't queue them again while the job waits. The
+    job sets the real next check, and a job that never runs leaves the
+    items due again after RETRY_INTERVAL.
+    """
+    item_ids = [row.id for rows in due.values() for row in rows]
+    async with AsyncSessionLocal() as db:
+        for chunk in _chunks(item_ids, WATCHLIST_COMMIT_CHUNK):
+            await db.execute(
+                update(WatchlistItem)
+                .where(WatchlistItem.id.in_(chunk))
+                .values(next_check_at=now + RETRY_INTERVAL)
+                .execution_options(synchronize_session=False)
+            )
+        enqueue("check_watchlist_batch", {"item_ids": item_ids}, priority=PRIORITY_LOW, db=db)
+        await db.commit()
+    logger.info(f"Queued watchlist check for {len(due)} domains ({len(item_ids)} items)")
+
+
+async def check_watchlist_domains():
+    """
+    Background task that schedules watchlist checks onto the job queue.
+
+    Each watched domain has its own next_check_at. The scheduler reloads
+    upcoming domains from the database every WATCHLIST_RELOAD_SECONDS and
+    every tick queues the due ones, within the provider budget, as a
+    check_watchlist_batch job for any worker to run.
+    """
+    scheduler = WatchlistScheduler(tick_seconds=WATCHLIST_TICK_SECONDS)
+    last_reload = None
+
+    while True:
+        try:
+            now = datetime.utcnow()
+            if last_reload is None or now - last_reload >= timedelta(seconds=WATCHLIST_RELOAD_SECONDS):
+                async with AsyncSessionLocal() as db:
+                    await scheduler.load(db, now, timedelta(seconds=WATCHLIST_RELOAD_SECONDS))
+                last_reload = now
+
+            due = scheduler.pop_due(now)
+            if due:
+                await enqueue_watchlist_check(due, now)
         except Exception as e:
             logger.error(f"Error in watchlist checker: {str(e)}")
 
-        finally:
-            db.close()
+        await asyncio.sleep(WATCHLIST_TICK_SECONDS)
+
+
+async def _watchers_of_domain(db: AsyncSession, domain: str) -> List:
+    """Alert-enabled, still taken watchlist rows for a domain with user emails."""
+    name, extension = split_domain(domain)
+    result = await db.execute(
+        select(WatchlistItem.id, User.email, User.email_digest)
+        .join(User, User.id == WatchlistItem.user_id)
+        .where(
+            func.lower(WatchlistItem.domain_name) == name,
+            func.lower(WatchlistItem.domain_extension) == extension,
+            WatchlistItem.notify_when_available == True,
+            WatchlistItem.status == "taken",
+        )
+    )
+    return result.all()
+
+
+async def publish_drop(domain: str, price_info: Optional[Dict]) -> None:
+    """Fast path for drop-watch: flip every watcher of the domain and alert them now."""
+    dropped_at = datetime.utcnow()
+    async with AsyncSessionLocal() as db:
+        rows = await _watchers_of_domain(db, domain)
+        if not rows:
+            return
+        # Drop alerts are sent right away, not on the next outbox poll
+        await publish_availability(
+            db,
+            {domain: price_info},
+            [(domain, row) for row in rows],
+            dropped_at,
+            send_priority=PRIORITY_HIGH,
+        )
+
+
+async def drop_watch_wanted(domain: str) -> bool:
+    """Whether any watchlist row still drop-watches a taken domain with alerts on."""
+    name, extension = split_domain(domain)
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(WatchlistItem.id)
+            .where(
+                func.lower(WatchlistItem.domain_name) == name,
+                func.lower(WatchlistItem.domain_extension) == extension,
+                WatchlistItem.drop_watch == True,
+                WatchlistItem.notify_when_available == True,
+                WatchlistItem.status == "taken",
+            )
+            .limit(1)
+        )
+        return result.first() is not None
+
+
+async def watch_pending_deletes():
+    """
+    Background task that burst-polls drop-watched domains in pending delete.
+
+    Every DROP_WATCH_RELOAD_SECONDS it persists the call budget used so far,
+    starts polling any domain whose estimated drop time is within
+    DROP_WATCH_LEAD and stops pollers whose domain left the candidate list.
+    Each poller also re-checks drop_watch_wanted before every call, so
+    turning drop-watch or alerts off, or deleting the item, stops it within
+    one poll interval.
+    """
+    watcher = DropWatcher(on_drop=publish_drop, is_wanted=drop_watch_wanted)
+
+    try:
+        while True:
+            try:
+                now = datetime.utcnow()
+                async with AsyncSessionLocal() as db:
+                    # Persist budget usage so it survives restarts
+                    for domain, calls in watcher.calls_used.items():
+                        name, extension = split_domain(domain)
+                        await db.execute(
+                            update(WatchlistItem)
+                            .where(
+                                func.lower(WatchlistItem.domain_name) == name,
+                                func.lower(WatchlistItem.domain_extension) == extension,
+                                WatchlistItem.drop_watch == True,
+                            )
+                            .values(drop_watch_calls=calls)
+                            .execution_options(synchronize_session=False)
+                        )
+                    await db.commit()
+
+                    candidates = (
+                        await db.execute(
+                            select(
+                                func.lower(WatchlistItem.domain_name),
+                                func.lower(WatchlistItem.domain_extension),
+                                func.max(WatchlistItem.drop_watch_calls),
+                            )
+                            .where(
+                                WatchlistItem.drop_watch == True,
+                                WatchlistItem.notify_when_available == True,
+                                WatchlistItem.status == "taken",
+                                WatchlistItem.pending_delete_since
+                                <= now - (PENDING_DELETE_PERIOD - DROP_WATCH_LEAD),
+                            )
+                            .group_by(
+                                func.lower(WatchlistItem.domain_name),
+                                func.lower(WatchlistItem.domain_extension),
+                            )
+                        )
+                    ).all()
+
+                watcher.retain(f"{name}.{extension}" for name, extension, _ in candidates)
+                for name, extension, calls_used in candidates:
+                    watcher.start(f"{name}.{extension}", calls_used or 0)
+            except Exception as e:
+                logger.error(f"Error in drop watcher: {str(e)}")
 
-        # Wait for 1 hour before next check
-        logger.info("Waiting 1 hour before next check")
-        await asyncio.sleep(3600)  # 3600 seconds = 1 hour
+            await asyncio.sleep(DROP_WATCH_RELOAD_SECONDS)
+    finally:
+        await watcher.close()
 
 
 # Add a function to manually test a single watchlist item
@@ -0,0 +1,172 @@
+# Standalone background worker, run with "python -m backend.worker".
+# Drains the job queue, schedules the watchlist checks onto it, runs the
+# drop watcher and sends queued emails, so web workers only have to enqueue
+# work and stay focused on request latency.
+
+import os
+import signal
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Dict
+
+from .database import engine
+from .migrations import require_current_schema
+from . import models
+from .job_queue import (
+    JOB_TYPES,
+    claim_job,
+    complete_job,
+    fail_job,
+    release_job,
+    load_payload,
+    purge_finished_jobs,
+    queue_depths,
+)
+from .leases import WORKER_ID, run_as_leader, release_all_leases
+from .tasks import check_watchlist_domains, watch_pending_deletes
+from .services.email_service import run_email_outbox
+from .services.registrar_scheduler import Lane, registrar_priority
+
+logger = logging.getLogger(__name__)
+
+# How long to sleep when no job could be claimed
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+
+# Seconds to let running jobs finish on shutdown before putting them back
+SHUTDOWN_GRACE_SECONDS = 20
+
+MAINTENANCE_INTERVAL_SECONDS = 3600
+
+
+class Worker:
+    """
+    Claims jobs from the queue and runs them, keeping each job type within
+    its concurrency limit. Jobs of all types with free slots compete on
+    priority, so a backlog of one type can't starve the others' slots.
+    """
+
+    def __init__(self, owner: str = WORKER_ID):
+        self.owner = owner
+        self._running: Dict[str, int] = defaultdict(int)
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._stopping = asyncio.Event()
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    def _free_types(self):
+        return [
+            name
+            for name, job_type in JOB_TYPES.items()
+            if self._running[name] < job_type.concurrency
+        ]
+
+    async def _run(self, job: models.Job) -> None:
+        try:
+            await JOB_TYPES[job.job_type].handler(load_payload(job))
+            await asyncio.to_thread(complete_job, job.id, self.owner)
+            logger.debug(f"Job {job.id} ({job.job_type}) done")
+        except asyncio.CancelledError:
+            await asyncio.to_thread(release_job, job.id, self.owner)
+            raise
+        except Exception as e:
+            await asyncio.to_thread(fail_job, job, self.owner, str(e))
+        finally:
+            self._running[job.job_type] -= 1
+            self._tasks.pop(job.id, None)
+
+    async def run(self) -> None:
+        logger.info(f"Worker {self.owner} started, job types: {sorted(JOB_TYPES)}")
+        while not self._stopping.is_set():
+            free_types = self._free_types()
+            job = None
+            if free_types:
+                try:
+                    job = await asyncio.to_thread(claim_job, free_types, self.owner)
+                except Exception as e:
+                    logger.error(f"Error claiming job: {str(e)}")
+
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), JOB_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self._running[job.job_type] += 1
+            # Jobs share background registrar capacity fairly by type
+            with registrar_priority(Lane.BACKGROUND, owner=f"job:{job.job_type}"):
+                self._tasks[job.id] = asyncio.create_task(self._run(job))
+
+        await self._drain()
+
+    async def _drain(self) -> None:
+        tasks = list(self._tasks.values())
+        if not tasks:
+            return
+        logger.info(f"Waiting for {len(tasks)} running jobs to finish")
+        _, pending = await asyncio.wait(tasks, timeout=SHUTDOWN_GRACE_SECONDS)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+async def run_maintenance():
+    """Purge old finished jobs and log queue depths every hour."""
+    while True:
+        try:
+            purged = await asyncio.to_thread(purge_finished_jobs)
+            if purged:
+                logger.info(f"Purged {purged} finished jobs")
+            for job_type, status, count in await asyncio.to_thread(queue_depths):
+                logger.info(f"Job queue: {count} {status} {job_type} jobs")
+        except Exception as e:
+            logger.error(f"Error in job queue maintenance: {str(e)}")
+        await asyncio.sleep(MAINTENANCE_INTERVAL_SECONDS)
+
+
+async def main():
+    # Migrations are applied by run.py or python -m backend.migrations
+    require_current_schema(engine)
+
+    worker = Worker()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stop)
+
+    # Periodic loops run in one worker process at a time. The watchlist
+    # checker only queues check_watchlist_batch jobs, the drop watcher keeps
+    # its pollers and warm connections in one process. Their registrar calls
+    # queue behind interactive traffic, each loop as its own owner, and
+    # drop-watch pollers move themselves up to DROP_WATCH_LANE.
+    background = []
+    for name, job in (
+        ("watchlist_checker", check_watchlist_domains),
+        ("drop_watcher", watch_pending_deletes),
+        ("email_outbox", run_email_outbox),
+        ("job_queue_maintenance", run_maintenance),
+    ):
+        with registrar_priority(Lane.BACKGROUND, owner=name):
+            background.append(asyncio.create_task(run_as_leader(name, job)))
+
+    try:
+        await worker.run()
+    finally:
+        for task in background:
+            task.cancel()
+        await asyncio.gather(*background, return_exceptions=True)
+        release_all_leases()
+
+        from .services.registration_data_service import close_session
+
+        await close_session()
+        logger.info(f"Worker {worker.owner} stopped")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    asyncio.run(main())
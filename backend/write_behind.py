@@ -0,0 +1,221 @@
+# Write-behind batching for small, high-frequency writes from request
+# handlers that nothing reads back right away: stats counters and alert
+# history rows. Each process runs one writer task that folds queued writes
+# into a single transaction every WRITE_BEHIND_INTERVAL seconds, or sooner
+# once WRITE_BEHIND_BATCH_SIZE writes are waiting. Callers don't wait for the
+# commit, so a write only shows up in reads after the next flush. A batch
+# that keeps failing is applied write by write, so only the writes that fail
+# on their own (e.g. a duplicate row) are dropped, each logged in full.
+
+import os
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from .database import AsyncSessionLocal, IS_SQLITE
+from .models import StatsCounter
+
+logger = logging.getLogger(__name__)
+
+WRITE_BEHIND_INTERVAL = float(os.getenv("WRITE_BEHIND_INTERVAL", "0.05"))
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "500"))
+# Writers block once this many writes are pending, which slows requests
+# down instead of letting memory grow without bound
+WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", "10000"))
+WRITE_BEHIND_MAX_RETRIES = 3
+
+
+class WriteBehindWriter:
+    """
+    Queue of pending writes drained by a background task in batches.
+
+    Counter increments to the same counter are summed, updates to the same
+    row are merged, and inserts to the same table are sent as one executemany.
+    """
+
+    def __init__(
+        self,
+        interval: float = WRITE_BEHIND_INTERVAL,
+        batch_size: int = WRITE_BEHIND_BATCH_SIZE,
+        max_pending: int = WRITE_BEHIND_MAX_PENDING,
+    ):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _ensure_started(self) -> asyncio.Queue:
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._queue = asyncio.Queue(maxsize=self.max_pending)
+            self._task = loop.create_task(self._run())
+        return self._queue
+
+    async def increment_counter(self, counter_name: str, increment_by: int = 1) -> None:
+        await self._ensure_started().put(("counter", counter_name, increment_by))
+
+    async def insert(self, model, values: Dict[str, Any]) -> None:
+        await self._ensure_started().put(("insert", model, values))
+
+    async def update(self, model, row_id: int, values: Dict[str, Any]) -> None:
+        await self._ensure_started().put(("update", model, row_id, values))
+
+    async def _collect(self) -> List:
+        """Wait for one write, then gather more until the interval or batch size is reached."""
+        batch = [await self._queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._collect()
+            try:
+                await self._apply_with_retries(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _apply_with_retries(self, batch: List) -> None:
+        writes = _fold(batch)
+        for attempt in range(1, WRITE_BEHIND_MAX_RETRIES + 1):
+            try:
+                await self._apply(writes)
+                logger.debug(f"Flushed {len(batch)} buffered writes as {len(writes)} statements")
+                return
+            except Exception as e:
+                # A constraint violation fails the same way every time
+                if attempt == WRITE_BEHIND_MAX_RETRIES or isinstance(e, IntegrityError):
+                    logger.warning(
+                        f"Batch of {len(batch)} buffered writes failed on attempt {attempt}, "
+                        f"applying them one by one: {str(e)}"
+                    )
+                    break
+                logger.warning(f"Error flushing buffered writes, retrying: {str(e)}")
+                await asyncio.sleep(self.interval * 2 ** attempt)
+        await self._apply_one_by_one(writes)
+
+    async def _apply(self, writes: List["BufferedWrite"]) -> None:
+        async with AsyncSessionLocal() as db:
+            for write in writes:
+                await write.execute(db)
+            await db.commit()
+
+    async def _apply_one_by_one(self, writes: List["BufferedWrite"]) -> None:
+        """
+        Apply each write in its own transaction, so one bad row (e.g. a
+        duplicate key) only loses itself. Insert groups are split into rows.
+        """
+        failed = 0
+        for write in [single for write in writes for single in write.split()]:
+            try:
+                await self._apply([write])
+            except Exception as e:
+                failed += 1
+                # Enough detail to replay the write by hand
+                logger.error(f"Dropping buffered write {write.describe()}: {str(e)}")
+        if failed:
+            logger.error(f"Dropped {failed} buffered writes that failed on their own")
+
+    async def flush(self) -> None:
+        """Wait until every write queued so far is committed."""
+        if self._queue is not None and self._task is not None and not self._task.done():
+            await self._queue.join()
+
+    async def close(self) -> None:
+        """Flush pending writes and stop the writer task, used on shutdown."""
+        await self.flush()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+class BufferedWrite:
+    """
+    One statement of a flush: a counter increment, a group of inserts into
+    one table, or the merged update of one row.
+    """
+
+    def __init__(self, kind: str, model, values: Any, row_id: Optional[int] = None):
+        self.kind = kind
+        self.model = model
+        self.values = values  # Increment, list of rows, or column values
+        self.row_id = row_id
+
+    async def execute(self, db) -> None:
+        if self.kind == "counter":
+            await db.execute(_counter_upsert(self.model, self.values, datetime.utcnow()))
+        elif self.kind == "insert":
+            await db.execute(insert(self.model), self.values)
+        else:
+            await db.execute(update(self.model).where(self.model.id == self.row_id).values(**self.values))
+
+    def split(self) -> List["BufferedWrite"]:
+        if self.kind == "insert" and len(self.values) > 1:
+            return [BufferedWrite("insert", self.model, [row]) for row in self.values]
+        return [self]
+
+    def describe(self) -> str:
+        if self.kind == "counter":
+            return f"counter {self.model} += {self.values}"
+        table = self.model.__tablename__
+        if self.kind == "insert":
+            return f"insert into {table} {self.values!r}"
+        return f"update {table} id={self.row_id} set {self.values!r}"
+
+
+def _fold(batch: List) -> List[BufferedWrite]:
+    """
+    Fold queued writes into statements: increments of a counter are summed,
+    inserts into a table grouped and updates of a row merged.
+    """
+    counters = defaultdict(int)
+    inserts = defaultdict(list)
+    updates = {}  # {(model, row_id): values}
+    for write in batch:
+        if write[0] == "counter":
+            counters[write[1]] += write[2]
+        elif write[0] == "insert":
+            inserts[write[1]].append(write[2])
+        else:
+            _, model, row_id, values = write
+            updates.setdefault((model, row_id), {}).update(values)
+
+    return (
+        [BufferedWrite("counter", name, increment_by) for name, increment_by in counters.items()]
+        + [BufferedWrite("insert", model, rows) for model, rows in inserts.items()]
+        + [BufferedWrite("update", model, values, row_id) for (model, row_id), values in updates.items()]
+    )
+
+
+def _counter_upsert(counter_name: str, increment_by: int, now: datetime):
+    # Atomic increment that also creates the counter, safe across processes
+    dialect_insert = sqlite_insert if IS_SQLITE else postgresql_insert
+    statement = dialect_insert(StatsCounter).values(
+        counter_name=counter_name, counter_value=increment_by, last_updated=now
+    )
+    return statement.on_conflict_do_update(
+        index_elements=[StatsCounter.counter_name],
+        set_={
+            "counter_value": StatsCounter.counter_value + increment_by,
+            "last_updated": now,
+        },
+    )
+
+
+# One writer per process
+writer = WriteBehindWriter()
@@ -1,30 +1,71 @@
 import uvicorn
 import os
+import sys
+import signal
+import subprocess
+from backend.migrations import migrate
 
 # Get environment
 env = os.getenv("ENVIRONMENT", "development")
 is_production = env == "production"
 
+# Watchlist checks, drop-watch and alert emails run in a separate worker
+# process (python -m backend.worker). Set RUN_WORKER=false when it's
+# started on its own, e.g. by systemd or on another host.
+run_worker = os.getenv("RUN_WORKER", "true").lower() == "true"
+
+# Number of web server processes
+web_workers = 4 if is_production else 1
+
+# The registrar schedulers split their in-flight caps between the web
+# processes and the worker, started here or on its own
+os.environ.setdefault("REGISTRAR_PROCESSES", str(web_workers + 1))
+
+
+def start_worker():
+    """Start the background worker next to the web server."""
+    return subprocess.Popen([sys.executable, "-m", "backend.worker"])
+
+
+def stop_worker(worker):
+    """Ask the worker to finish its running jobs, then make sure it exits."""
+    if worker.poll() is not None:
+        return
+    worker.send_signal(signal.SIGTERM)
+    try:
+        # The worker gives running jobs 20 seconds to finish
+        worker.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        worker.kill()
+
+
 if __name__ == "__main__":
-    # Production settings: multiple workers, no reload, production log level
-    if is_production:
-        # Number of workers based on CPU cores (2 * num_cores + 1) is a common formula
-        # For simplicity, setting to 4 workers, but adjust based on your server resources
-        uvicorn.run(
-            "backend.main:app", 
-            host="0.0.0.0", 
-            port=int(os.getenv("PORT", "8000")),
-            reload=False,
-            workers=4,
-            access_log=True,
-            log_level="info"
-        )
-    else:
-        # Development settings: reload enabled, single worker, debug log level
-        uvicorn.run(
-            "backend.main:app", 
-            host="0.0.0.0", 
-            port=8000, 
-            reload=True,
-            log_level="debug"
-        )
+    # Once, before any process that uses the database starts
+    migrate()
+    worker = start_worker() if run_worker else None
+    try:
+        # Production settings: multiple workers, no reload, production log level
+        if is_production:
+            # Number of workers based on CPU cores (2 * num_cores + 1) is a common formula
+            # For simplicity, setting to 4 workers, but adjust based on your server resources
+            uvicorn.run(
+                "backend.main:app",
+                host="0.0.0.0",
+                port=int(os.getenv("PORT", "8000")),
+                reload=False,
+                workers=web_workers,
+                access_log=True,
+                log_level="info"
+            )
+        else:
+            # Development settings: reload enabled, single worker, debug log level
+            uvicorn.run(
+                "backend.main:app",
+                host="0.0.0.0",
+                port=8000,
+                reload=True,
+                log_level="debug"
+            )
+    finally:
+        if worker is not None:
+            stop_worker(worker)